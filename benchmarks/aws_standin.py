@@ -0,0 +1,151 @@
+"""
+Local AWS Stand-In
+Answers boto3 calls in-process so the Lambda code can be benchmarked without an AWS account
+
+The stand-in hooks botocore's 'before-call' event on every session from the client
+registry in utils/aws_helpers.py. A handler returning a response short-circuits the
+HTTP request, so parameter validation, pagination and the calling code all run for
+real while the API itself is simulated.
+
+Latency and throttling can be injected per call. Injected throttles are returned as
+ThrottlingException errors; since the HTTP layer is skipped, botocore's own retries
+don't see them and they reach the calling code (and its AdaptiveThrottle) directly.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable
+
+from botocore.awsrequest import AWSResponse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+from utils.aws_helpers import register_event_handler
+
+# Environment that keeps boto3 from looking for real credentials or instance metadata
+STANDIN_ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'standin',
+    'AWS_SECRET_ACCESS_KEY': 'standin',
+    'AWS_SESSION_TOKEN': 'standin',
+    'AWS_EC2_METADATA_DISABLED': 'true',
+}
+
+
+class AwsStandIn:
+    """
+    In-process replacement for the AWS APIs the monitor calls.
+
+    Register a handler per operation with on(); it receives the API parameters and
+    returns the parsed response dict. Operations without a handler return {}.
+    The region and access key of the client making the call are available as
+    current_region() and current_access_key().
+    Every call is counted per (service, operation).
+
+    Args:
+        latency: Seconds added to every call
+        throttle_rate: Fraction of calls to throttle_operations answered with a
+            ThrottlingException instead
+        throttle_operations: Operations throttling is injected into (default: all)
+        seed: Seed for the throttling decisions, for repeatable runs
+    """
+
+    def __init__(self, latency: float = 0.0, throttle_rate: float = 0.0,
+                 throttle_operations: Iterable[str] = None, seed: int = 0):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.throttle_operations = set(throttle_operations) if throttle_operations else None
+        self.handlers = {}
+        self.call_counts = Counter()
+        self.throttled_counts = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def on(self, operation_name: str, handler: Callable[[Dict[str, any]], Dict[str, any]]):
+        """
+        Sets the handler for an API operation (e.g., 'DescribeVolumes').
+        """
+        self.handlers[operation_name] = handler
+        return self
+
+    def install(self):
+        """
+        Routes every boto3 client from the registry to this stand-in.
+        """
+        register_event_handler('before-parameter-build', self._capture_params)
+        register_event_handler('before-call', self._answer)
+        return self
+
+    def _capture_params(self, params, context, **kwargs):
+        # before-call only sees the serialized request, so keep the API parameters
+        context['standin_params'] = dict(params)
+
+    def current_region(self) -> str:
+        """
+        Region of the client whose call is being answered (for use inside handlers).
+        """
+        return getattr(self._local, 'region', None)
+
+    def current_access_key(self) -> str:
+        """
+        Access key of the client whose call is being answered, e.g. to tell accounts apart.
+        """
+        return getattr(self._local, 'access_key', None)
+
+    def _should_throttle(self, operation_name: str) -> bool:
+        if not self.throttle_rate:
+            return False
+        if self.throttle_operations is not None and operation_name not in self.throttle_operations:
+            return False
+        with self._lock:
+            return self._random.random() < self.throttle_rate
+
+    def _answer(self, model, context, request_signer=None, **kwargs):
+        service_name = model.service_model.service_name
+        with self._lock:
+            self.call_counts[(service_name, model.name)] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self._should_throttle(model.name):
+            with self._lock:
+                self.throttled_counts[(service_name, model.name)] += 1
+            parsed = {'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}
+        else:
+            handler = self.handlers.get(model.name)
+            self._local.region = getattr(request_signer, 'region_name', None)
+            self._local.access_key = getattr(getattr(request_signer, '_credentials', None), 'access_key', None)
+            parsed = handler(context.get('standin_params', {})) if handler else {}
+        status_code = 400 if 'Error' in parsed else 200
+        parsed.setdefault('ResponseMetadata', {'HTTPStatusCode': status_code})
+        return AWSResponse('https://standin.local', status_code, {}, None), parsed
+
+    def total_calls(self) -> int:
+        return sum(self.call_counts.values())
+
+    def reset_counts(self):
+        with self._lock:
+            self.call_counts.clear()
+            self.throttled_counts.clear()
+
+
+def page(items: list, params: Dict[str, any], result_key: str, page_size: int,
+         input_token: str = 'NextToken', output_token: str = 'NextToken',
+         more_results: str = None) -> Dict[str, any]:
+    """
+    Returns one page of items as a paginated list/describe response, using the
+    offset of the next page as the continuation token.
+    """
+    start = int(params.get(input_token) or 0)
+    end = start + page_size
+    response = {result_key: items[start:end]}
+    if end < len(items):
+        response[output_token] = str(end)
+    if more_results:
+        response[more_results] = end < len(items)
+    return response
@@ -0,0 +1,130 @@
+"""
+CloudTrail Ingestion Benchmark
+Measures records/second of the offline CloudTrail log ingestion engine
+
+Generates a fixture corpus of gzip CloudTrail log files in a temporary directory
+(laid out and named like a trail's S3 delivery) with a mix of ordinary API calls,
+console sign-ins, failed sign-in bursts and access-denied errors, then runs
+ingest_cloudtrail_logs() over it once per worker count.
+
+Usage:
+    python benchmarks/cloudtrail_ingest_benchmark.py --files 200 --records-per-file 2000 --workers 1,4
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+from metrics_collector.cloudtrail_logs import ingest_cloudtrail_logs
+
+ACCOUNT_ID = "123456789012"
+REGIONS = ("us-east-1", "us-west-2")
+ORDINARY_EVENTS = (
+    ("ec2.amazonaws.com", "DescribeInstances"),
+    ("s3.amazonaws.com", "GetObject"),
+    ("iam.amazonaws.com", "ListUsers"),
+    ("sts.amazonaws.com", "AssumeRole"),
+    ("kms.amazonaws.com", "Decrypt"),
+)
+
+
+def _record(rng: random.Random, event_time: datetime, region: str) -> dict:
+    user = f"user{rng.randrange(200)}"
+    record = {
+        "eventVersion": "1.08",
+        "userIdentity": {
+            "type": "IAMUser",
+            "principalId": f"AIDA{rng.randrange(10 ** 12):012d}",
+            "arn": f"arn:aws:iam::{ACCOUNT_ID}:user/{user}",
+            "accountId": ACCOUNT_ID,
+            "userName": user,
+        },
+        "eventTime": event_time.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        "awsRegion": region,
+        "sourceIPAddress": f"198.51.100.{rng.randrange(256)}",
+        "userAgent": "aws-cli/2.15.0 Python/3.11.6",
+        "requestParameters": {"maxResults": 1000},
+        "responseElements": None,
+        "requestID": f"{rng.getrandbits(64):016x}",
+        "eventID": f"{rng.getrandbits(64):016x}",
+        "eventType": "AwsApiCall",
+        "recipientAccountId": ACCOUNT_ID,
+    }
+    roll = rng.random()
+    if roll < 0.02:
+        # Failed sign-in, concentrated on a few targeted users and one source IP
+        record.update(
+            eventSource="signin.amazonaws.com", eventName="ConsoleLogin", eventType="AwsConsoleSignIn",
+            sourceIPAddress="203.0.113.66" if rng.random() < 0.5 else record["sourceIPAddress"],
+            responseElements={"ConsoleLogin": "Failure"}, errorMessage="Failed authentication",
+        )
+        record["userIdentity"]["userName"] = f"user{rng.randrange(5)}"
+    elif roll < 0.05:
+        record.update(
+            eventSource="signin.amazonaws.com", eventName="ConsoleLogin", eventType="AwsConsoleSignIn",
+            responseElements={"ConsoleLogin": "Success"},
+        )
+    elif roll < 0.07:
+        record.update(eventSource="s3.amazonaws.com", eventName="GetObject",
+                      errorCode="AccessDenied", errorMessage="Access Denied")
+    else:
+        record["eventSource"], record["eventName"] = rng.choice(ORDINARY_EVENTS)
+    return record
+
+
+def generate_corpus(directory: str, files: int, records_per_file: int, seed: int = 42) -> int:
+    """
+    Writes a fixture corpus of CloudTrail log files and returns the record count.
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for index in range(files):
+        region = REGIONS[index % len(REGIONS)]
+        delivered = start + timedelta(minutes=5 * (index // len(REGIONS)))
+        folder = os.path.join(directory, "AWSLogs", ACCOUNT_ID, "CloudTrail", region,
+                              delivered.strftime('%Y/%m/%d'))
+        os.makedirs(folder, exist_ok=True)
+        records = [
+            _record(rng, delivered - timedelta(seconds=rng.uniform(0, 300)), region)
+            for _ in range(records_per_file)
+        ]
+        records.sort(key=lambda record: record["eventTime"])
+        name = f"{ACCOUNT_ID}_CloudTrail_{region}_{delivered.strftime('%Y%m%dT%H%M')}Z_{index:08x}.json.gz"
+        with gzip.open(os.path.join(folder, name), 'wt') as f:
+            json.dump({"Records": records}, f)
+    return files * records_per_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=200, help='log files in the corpus')
+    parser.add_argument('--records-per-file', type=int, default=2000, help='records per log file')
+    parser.add_argument('--workers', default=f"1,{os.cpu_count() or 1}", help='comma-separated worker counts')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        total = generate_corpus(directory, args.files, args.records_per_file)
+        print(f"Generated {args.files} files, {total} records")
+
+        results = {}
+        for workers in sorted({int(count) for count in args.workers.split(',')}):
+            ingestion = ingest_cloudtrail_logs(directory, workers=workers)
+            stats = ingestion["ingestion"]
+            results[f"workers={workers}"] = {
+                "seconds": stats["seconds"],
+                "records_per_second": stats["records_per_second"],
+                "failed_logins": ingestion["login_attempts"]["failed_login_count"],
+                "brute_force_source_ips": len(ingestion["login_attempts"]["brute_force_suspects"]["source_ips"]),
+                "access_denied": ingestion["suspicious_activity"]["access_denied_count"],
+            }
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
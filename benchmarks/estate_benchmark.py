@@ -0,0 +1,184 @@
+"""
+Synthetic Estate Benchmark
+Runs each collector, the alert manager and the report generator against a generated account
+
+The estate is served by the local AWS stand-in, with optional latency per call and
+injected throttling on the per-resource probe APIs. For each step the benchmark
+reports wall time, AWS API calls (and injected throttles) per operation, and peak
+Python memory. Memory is measured in a second, traced pass so tracemalloc's overhead
+doesn't distort the timings. Every pass starts with empty inventory and S3 exposure
+caches, as in a cold container, unless --warm-caches is given.
+
+Usage:
+    python benchmarks/estate_benchmark.py --instances 10000 --buckets 5000 --users 20000 \\
+        --latency-ms 5 --throttle-rate 0.02 --only exposure,mfa_iam
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from aws_standin import STANDIN_ENVIRONMENT, AwsStandIn
+from synthetic_estate import ACCOUNT_ID, SyntheticEstate
+
+# Probe APIs whose throttling the checks absorb themselves (AdaptiveThrottle)
+DEFAULT_THROTTLED_OPERATIONS = "GetPublicAccessBlock,GetBucketAcl,GetBucketPolicyStatus,ListMFADevices"
+
+
+def benchmark_steps(findings_holder: dict):
+    """
+    Returns the benchmarked steps as (name, callable) pairs.
+    The full collection stores its findings for the alert and report steps.
+    """
+    from lambda_handler.alert_manager import check_thresholds_and_alert
+    from metrics_collector import metrics_collector as collector
+    from reporting.report_generator import generate_daily_report
+
+    def collect_all():
+        findings_holder["findings"] = collector.collect_security_metrics()
+        return findings_holder["findings"]
+
+    return [
+        ("encryption", collector.check_encryption),
+        ("exposure", collector.check_exposure),
+        ("mfa_iam", lambda: collector.check_mfa_iam("per_user")),
+        ("mfa_iam_credential_report", lambda: collector.check_mfa_iam("credential_report")),
+        ("security_groups", collector.check_security_groups),
+        ("login_attempts", collector.check_login_attempts),
+        ("collect_security_metrics", collect_all),
+        ("alert_manager", lambda: check_thresholds_and_alert(findings_holder.get("findings") or collect_all())),
+        ("report_generator", lambda: generate_daily_report(findings_holder.get("findings") or collect_all())),
+    ]
+
+
+def result_size(result) -> int:
+    """
+    Number of findings in a step's result, as a sanity check across runs.
+    """
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        if "check_timings" in result:
+            from metrics_collector.scan_state import finding_keys
+            return sum(len(keys) for keys in finding_keys(result).values())
+        if "failed_login_count" in result:
+            return result["failed_login_count"]
+        if "non_compliant_users" in result:
+            return len(result["non_compliant_users"])
+        return sum(len(value) for value in result.values() if isinstance(value, list))
+    return 0
+
+
+def clear_caches():
+    """
+    Empties the caches a warm container carries from one run to the next.
+    """
+    from metrics_collector.s3_exposure import clear_exposure_cache
+    from utils.inventory_cache import clear_inventory_cache
+    clear_inventory_cache()
+    clear_exposure_cache()
+
+
+def run_step(standin: AwsStandIn, func, trace_memory: bool, warm_caches: bool = False) -> dict:
+    if not warm_caches:
+        clear_caches()
+    standin.reset_counts()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        "seconds": round(elapsed, 3),
+        "api_calls": standin.total_calls(),
+        "calls_by_operation": {f"{service}:{op}": count for (service, op), count in sorted(standin.call_counts.items())},
+        "throttled": sum(standin.throttled_counts.values()),
+        "peak_memory_mb": round(peak / 2 ** 20, 2) if peak is not None else None,
+        "findings": result_size(result),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--instances', type=int, default=10000)
+    parser.add_argument('--volumes', type=int, default=10000)
+    parser.add_argument('--security-groups', type=int, default=2000)
+    parser.add_argument('--buckets', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--login-events', type=int, default=5000)
+    parser.add_argument('--regions', default='us-east-1', help='comma-separated regions for EC2 resources')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='latency added to every API call')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of probe calls throttled')
+    parser.add_argument('--throttle-operations', default=DEFAULT_THROTTLED_OPERATIONS)
+    parser.add_argument('--iam-rate-limit', default='1000',
+                        help='IAM_RATE_LIMIT for the run; the production default of 10/s makes 20k users take ~30 min')
+    parser.add_argument('--account-block', action='store_true',
+                        help='turn on account-level S3 Block Public Access')
+    parser.add_argument('--warm-caches', action='store_true',
+                        help='keep inventory and exposure caches between steps, as in a warm container')
+    parser.add_argument('--only', help='comma-separated step names to run')
+    parser.add_argument('--skip-memory', action='store_true', help='skip the traced pass measuring peak memory')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    regions = [region.strip() for region in args.regions.split(',') if region.strip()]
+    os.environ.update(STANDIN_ENVIRONMENT)
+    os.environ.update({
+        'SCAN_REGIONS': ','.join(regions),
+        'IAM_RATE_LIMIT': args.iam_rate_limit,
+        'SNS_TOPIC_ARN': f'arn:aws:sns:us-east-1:{ACCOUNT_ID}:security-alerts',
+    })
+    for name in ('INCREMENTAL_SCAN', 'SCAN_ACCOUNTS', 'REPORTS_BUCKET', 'STATE_BUCKET'):
+        os.environ.pop(name, None)
+
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+    from utils.aws_helpers import logger
+    logger.setLevel('WARNING')
+
+    estate = SyntheticEstate(
+        instances=args.instances, volumes=args.volumes, security_groups=args.security_groups,
+        buckets=args.buckets, users=args.users, login_events=args.login_events, regions=regions,
+        account_block=args.account_block,
+    )
+    standin = estate.install(AwsStandIn(
+        latency=args.latency_ms / 1000,
+        throttle_rate=args.throttle_rate,
+        throttle_operations=args.throttle_operations.split(',') if args.throttle_operations else None,
+    )).install()
+
+    findings_holder = {}
+    steps = benchmark_steps(findings_holder)
+    if args.only:
+        selected = set(args.only.split(','))
+        steps = [(name, func) for name, func in steps if name in selected]
+
+    results = {}
+    for name, func in steps:
+        results[name] = run_step(standin, func, trace_memory=False, warm_caches=args.warm_caches)
+        if not args.skip_memory:
+            results[name]["peak_memory_mb"] = run_step(standin, func, trace_memory=True,
+                                                       warm_caches=args.warm_caches)["peak_memory_mb"]
+
+    if args.json:
+        print(json.dumps({"estate": estate.counts, "regions": regions, "results": results}, indent=2))
+        return
+
+    print(f"Estate: {estate.counts} across {len(regions)} region(s), "
+          f"latency {args.latency_ms}ms, throttle rate {args.throttle_rate}")
+    print(f"{'step':<28}{'seconds':>10}{'api calls':>11}{'throttled':>11}{'peak MB':>10}{'findings':>10}")
+    for name, result in results.items():
+        peak = result['peak_memory_mb']
+        print(f"{name:<28}{result['seconds']:>10.3f}{result['api_calls']:>11}{result['throttled']:>11}"
+              f"{peak if peak is not None else '-':>10}{result['findings']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Findings Model Benchmark
+Measures the memory and build time of Finding records against plain dicts
+
+Generates a multi-account run's worth of findings (accounts x regions x categories),
+builds them once as FindingRecords through one FindingsBuilder per account and once
+as dicts with the same fields, and reports the traced Python memory per finding of
+each, plus the time to iterate the records as Finding objects. Resource
+IDs are generated up front and shared by both, as they are with the checks' results.
+
+Usage:
+    python benchmarks/findings_benchmark.py --findings 1000000 --accounts 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+from metrics_collector.findings import FindingsBuilder, merge_records
+
+REGIONS = ["us-east-1", "us-east-2", "us-west-2", "eu-west-1", "eu-central-1", "ap-southeast-2"]
+CATEGORIES = [
+    ("encryption", "encryption"),
+    ("exposure", "public_ec2_IPs"),
+    ("exposure", "public_s3_buckets"),
+    ("mfa_iam", "mfa_iam"),
+    ("security_groups", "security_groups"),
+]
+
+
+def generate_items(findings: int, accounts: int, seed: int = 42):
+    """
+    Returns {account: {(check, category): [(region, resource ID, detail), ...]}}.
+    Region and detail strings are built per finding, as parsed API responses are.
+    """
+    rng = random.Random(seed)
+    items = {}
+    for index in range(findings):
+        account = f"{100000000000 + index % accounts}"
+        check, category = CATEGORIES[index % len(CATEGORIES)]
+        # join() makes a new string object per finding, like a parsed API response
+        region = "".join(rng.choice(REGIONS)) if category not in ("public_s3_buckets", "mfa_iam") else ""
+        port = rng.choice((22, 443, 3389))
+        detail = f"tcp:{port}-{port}" if check == "security_groups" else ""
+        items.setdefault(account, {}).setdefault((check, category), []).append((region, f"res-{index:012x}", detail))
+    return items
+
+
+def build_records(items):
+    # One builder per account, merged as in a multi-account run
+    runs = []
+    for account, categories in items.items():
+        builder = FindingsBuilder(account, severities={"security_groups": "high", "mfa_iam": "high"})
+        for (check, category), category_items in categories.items():
+            builder.extend(check, category, category_items)
+        runs.append(builder.completed())
+    return merge_records(runs)
+
+
+def build_dicts(items):
+    records = []
+    for account, categories in items.items():
+        for (check, category), category_items in categories.items():
+            for region, resource_id, detail in category_items:
+                records.append({
+                    "account_id": account, "region": region, "check": check, "category": category,
+                    "resource_id": resource_id, "detail": detail, "severity": "high",
+                })
+    return records
+
+
+def measure(func, items):
+    start = time.perf_counter()
+    func(items)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    records = func(items)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return records, elapsed, used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--findings', type=int, default=1000000)
+    parser.add_argument('--accounts', type=int, default=50)
+    args = parser.parse_args()
+
+    items = generate_items(args.findings, args.accounts)
+    print(f"{args.findings} findings across {args.accounts} account(s)")
+    print(f"{'model':<10}{'seconds':>10}{'MB':>10}{'bytes/finding':>15}")
+    for name, func in (("records", build_records), ("dicts", build_dicts)):
+        records, elapsed, used = measure(func, items)
+        print(f"{name:<10}{elapsed:>10.3f}{used / 2 ** 20:>10.1f}{used / len(records):>15.0f}")
+        if name == "records":
+            start = time.perf_counter()
+            high = sum(1 for finding in records if finding.severity == "high")
+            print(f"iterating {len(records)} records: {time.perf_counter() - start:.3f}s ({high} high severity)")
+        del records
+
+
+if __name__ == '__main__':
+    main()
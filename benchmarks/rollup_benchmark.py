@@ -0,0 +1,183 @@
+"""
+Rollup Report Benchmark
+Measures weekly/monthly/90-day rollups built from stored daily reports
+
+Generates a history of daily reports with churn (findings appearing, persisting and
+being resolved), stores them in an in-memory bucket served through the local AWS
+stand-in, and times generate_rollup_report() per period with its S3 calls and peak
+Python memory, in each mode:
+
+- stream: ROLLUP_CACHE=false, every daily report is downloaded
+- cold:   the persisted rollup cache is loaded and synced (first run reads every report)
+- warm:   the warm container's cache, after one daily report was rewritten
+- trend:  daily and unique counts only (generate_trend)
+
+Usage:
+    python benchmarks/rollup_benchmark.py --days 90 --findings-per-day 20000 --latency-ms 20
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from botocore.response import StreamingBody
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from aws_standin import STANDIN_ENVIRONMENT, AwsStandIn, page
+
+BUCKET = "medtech-security-reports"
+
+
+class InMemoryBucket:
+    """
+    Objects of one S3 bucket, served through ListObjectsV2, GetObject and PutObject.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.etags = {}
+
+    def put(self, key: str, body: bytes):
+        self.objects[key] = body
+        self.etags[key] = f'"{hashlib.md5(body).hexdigest()}"'
+
+    def install(self, standin: AwsStandIn) -> AwsStandIn:
+        def list_objects(params):
+            keys = sorted(
+                key for key in self.objects
+                if key.startswith(params.get("Prefix", "")) and key > params.get("StartAfter", "")
+            )
+            response = page([{"Key": key, "Size": len(self.objects[key]), "ETag": self.etags[key]} for key in keys],
+                            params, "Contents", 1000,
+                            input_token="ContinuationToken", output_token="NextContinuationToken",
+                            more_results="IsTruncated")
+            response["KeyCount"] = len(response["Contents"])
+            return response
+
+        def get_object(params):
+            body = self.objects.get(params["Key"])
+            if body is None:
+                return {"Error": {"Code": "NoSuchKey", "Message": "The specified key does not exist."}}
+            return {"Body": StreamingBody(io.BytesIO(body), len(body)), "ContentLength": len(body)}
+
+        def put_object(params):
+            body = params.get("Body", b"")
+            self.put(params["Key"], body.read() if hasattr(body, "read") else body)
+            return {"ETag": '"standin"'}
+
+        return standin.on("ListObjectsV2", list_objects).on("GetObject", get_object).on("PutObject", put_object)
+
+
+def generate_history(bucket: InMemoryBucket, days: int, findings_per_day: int, end: date, seed: int = 42):
+    """
+    Stores daily reports for the days up to end. About 2% of the findings are
+    resolved each day and replaced by new ones.
+    """
+    from reporting.report_generator import daily_report_key, generate_daily_report
+
+    rng = random.Random(seed)
+    share = max(findings_per_day // 4, 1)
+    next_id = share
+    open_findings = {category: list(range(share)) for category in ("vol", "i", "bucket", "user")}
+    for offset in range(days - 1, -1, -1):
+        for category, ids in open_findings.items():
+            for index in range(len(ids)):
+                if rng.random() < 0.02:
+                    ids[index] = next_id
+                    next_id += 1
+        metrics = {
+            "mfa_iam": {"total_users": share * 10, "non_compliant_users": [f"user-{i}" for i in open_findings["user"]]},
+            "encryption": [f"vol-{i:017x}" for i in open_findings["vol"]],
+            "exposure": {
+                "public_ec2_IPs": [f"i-{i:017x}" for i in open_findings["i"]],
+                "public_s3_buckets": [f"bucket-{i}" for i in open_findings["bucket"]],
+            },
+            "security_groups": [
+                {"SecurityGroupId": f"sg-{i:017x}", "SecurityGroupName": f"sg-{i}", "FromPort": 22, "ToPort": 22,
+                 "Protocol": "tcp", "Cidrs": ["0.0.0.0/0"]}
+                for i in range(50)
+            ],
+        }
+        day = (end - timedelta(days=offset)).isoformat()
+        bucket.put(daily_report_key(day), json.dumps(generate_daily_report(metrics)).encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=90, help='days of stored daily reports')
+    parser.add_argument('--findings-per-day', type=int, default=20000)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='latency added to every S3 call')
+    parser.add_argument('--periods', default='7,30,90', help='comma-separated rollup lengths in days')
+    args = parser.parse_args()
+
+    os.environ.update(STANDIN_ENVIRONMENT)
+    os.environ['STATE_DIR'] = tempfile.mkdtemp(prefix='rollup-benchmark-')
+    os.environ.pop('STATE_BUCKET', None)
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+    from reporting import rollup_cache
+    from reporting.report_generator import daily_report_key
+    from reporting.report_rollup import generate_rollup_report, generate_trend
+    from utils.aws_helpers import logger
+    logger.setLevel('ERROR')
+
+    end = date.today() - timedelta(days=1)
+    bucket = InMemoryBucket()
+    generate_history(bucket, args.days, args.findings_per_day, end)
+    standin = bucket.install(AwsStandIn(latency=args.latency_ms / 1000)).install()
+    size_mb = sum(len(body) for body in bucket.objects.values()) / 2 ** 20
+    print(f"{args.days} daily reports, {args.findings_per_day} findings/day, {size_mb:.1f} MB stored, "
+          f"latency {args.latency_ms}ms")
+
+    def stream(days):
+        os.environ['ROLLUP_CACHE'] = 'false'
+        try:
+            return generate_rollup_report(BUCKET, end_date=end.isoformat(), days=days)
+        finally:
+            os.environ.pop('ROLLUP_CACHE')
+
+    def cold(days):
+        rollup_cache._warm_cache = None
+        return generate_rollup_report(BUCKET, end_date=end.isoformat(), days=days)
+
+    def warm(days):
+        # The latest daily report was rewritten (e.g., by a second scan that day)
+        latest = daily_report_key(end.isoformat())
+        bucket.put(latest, bucket.objects[latest] + b" ")
+        return generate_rollup_report(BUCKET, end_date=end.isoformat(), days=days)
+
+    def trend(days):
+        return generate_trend(BUCKET, days=days, end_date=end.isoformat())
+
+    print(f"{'mode':<8}{'days':>6}{'seconds':>10}{'s3 calls':>10}{'peak MB':>10}{'unique findings':>17}")
+    for days in (int(value) for value in args.periods.split(',')):
+        for mode, func in (("stream", stream), ("cold", cold), ("warm", warm), ("trend", trend)):
+            standin.reset_counts()
+            start = time.perf_counter()
+            report = func(days)
+            elapsed = time.perf_counter() - start
+            calls = standin.total_calls()
+
+            peak = None
+            if mode == "stream":
+                tracemalloc.start()
+                func(days)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            if "unique_counts" in report:
+                unique = sum(report["unique_counts"].values())
+            else:
+                unique = sum(len(resources) for resources in report["resources"].values())
+            peak_text = f"{peak / 2 ** 20:.1f}" if peak is not None else "-"
+            print(f"{mode:<8}{days:>6}{elapsed:>10.3f}{calls:>10}{peak_text:>10}{unique:>17}")
+
+if __name__ == '__main__':
+    main()
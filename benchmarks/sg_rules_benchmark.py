@@ -0,0 +1,101 @@
+"""
+Security Group Rule Engine Benchmark
+Measures rule analysis, index construction and port queries on a generated rule set
+
+Generates security groups with a realistic mix of rule sources (private ranges,
+single public hosts, 0.0.0.0/0, ::/0, broad split ranges, prefix lists) and port
+shapes (single ports, ranges, all traffic), then times exposed_rules() over every
+group, building an ExposureIndex, and port queries against it.
+
+Usage:
+    python benchmarks/sg_rules_benchmark.py --rules 50000 --queries 10000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+from metrics_collector.sg_rules import ExposureIndex, clear_cidr_cache, exposed_rules
+
+RULES_PER_GROUP = 5
+
+
+def generate_groups(rules: int, seed: int = 42):
+    """
+    Returns (security groups, prefix list CIDRs) with the given total number of rules.
+    """
+    rng = random.Random(seed)
+    prefix_lists = {
+        "pl-office": ["198.51.100.0/24", "203.0.113.0/24"],
+        "pl-open": ["0.0.0.0/0"],
+    }
+    groups = []
+    for index in range(0, rules, RULES_PER_GROUP):
+        permissions = []
+        for _ in range(min(RULES_PER_GROUP, rules - index)):
+            roll = rng.random()
+            if roll < 0.05:
+                permission = {"IpProtocol": "-1"}
+            elif roll < 0.15:
+                start = rng.choice((1024, 8000, 30000))
+                permission = {"IpProtocol": "tcp", "FromPort": start, "ToPort": start + rng.randrange(1, 2000)}
+            else:
+                port = rng.choice((22, 80, 443, 3306, 3389, 5432, 6379, 8080, rng.randrange(1, 65536)))
+                permission = {"IpProtocol": rng.choice(("tcp", "6", "udp")), "FromPort": port, "ToPort": port}
+
+            source = rng.random()
+            if source < 0.5:
+                permission["IpRanges"] = [{"CidrIp": f"10.{rng.randrange(256)}.{rng.randrange(256)}.0/24"}]
+            elif source < 0.75:
+                permission["IpRanges"] = [{"CidrIp": f"{rng.randrange(1, 224)}.{rng.randrange(256)}."
+                                                    f"{rng.randrange(256)}.{rng.randrange(256)}/32"}]
+            elif source < 0.85:
+                permission["IpRanges"] = [{"CidrIp": "0.0.0.0/0"}]
+            elif source < 0.9:
+                permission["Ipv6Ranges"] = [{"CidrIpv6": "::/0"}]
+            elif source < 0.95:
+                permission["IpRanges"] = [{"CidrIp": "0.0.0.0/1"}, {"CidrIp": "128.0.0.0/1"}]
+            else:
+                permission["PrefixListIds"] = [{"PrefixListId": rng.choice(list(prefix_lists))}]
+            permissions.append(permission)
+        groups.append({"GroupId": f"sg-{index:017x}", "GroupName": f"group-{index}", "IpPermissions": permissions})
+    return groups, prefix_lists
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=50000, help='total ingress rules')
+    parser.add_argument('--queries', type=int, default=10000, help='port queries against the index')
+    args = parser.parse_args()
+
+    groups, prefix_lists = generate_groups(args.rules)
+    clear_cidr_cache()
+
+    start = time.perf_counter()
+    entries = [entry for sg in groups for entry in exposed_rules(sg, prefix_lists)]
+    analysed = time.perf_counter()
+    index = ExposureIndex(entries)
+    indexed = time.perf_counter()
+    rng = random.Random(7)
+    matches = sum(len(index.groups_exposing(rng.randrange(65536), rng.choice(("tcp", "udp"))))
+                  for _ in range(args.queries))
+    queried = time.perf_counter()
+
+    print(json.dumps({
+        "rules": args.rules,
+        "groups": len(groups),
+        "exposed_rules": len(entries),
+        "analyse_ms": round((analysed - start) * 1000, 1),
+        "index_ms": round((indexed - analysed) * 1000, 1),
+        "query_us": round((queried - indexed) * 1e6 / max(args.queries, 1), 2),
+        "query_matches": matches,
+        "ssh_exposed_groups": len(index.groups_exposing(22)),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
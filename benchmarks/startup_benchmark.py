@@ -0,0 +1,99 @@
+"""
+Startup Benchmark
+Measures cold-start import time and first/warm invocation latency of the Lambda handler
+
+Each sample runs in a fresh interpreter (a cold start) against the local AWS stand-in,
+so the numbers cover module imports, client construction and the handler's own
+overhead but not network time. Pass --max-import-ms / --max-first-invocation-ms to
+fail when a change regresses startup.
+
+Usage:
+    python benchmarks/startup_benchmark.py --samples 5 --max-import-ms 1500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs inside the fresh interpreter and prints one JSON sample
+SAMPLE_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {benchmark_dir!r})
+sys.path.insert(0, {src_dir!r})
+start = time.perf_counter()
+from lambda_handler.lambda_handler import lambda_handler
+imported = time.perf_counter()
+from aws_standin import AwsStandIn
+AwsStandIn().install()
+invoke_start = time.perf_counter()
+lambda_handler({{}}, None)
+first_done = time.perf_counter()
+lambda_handler({{}}, None)
+warm_done = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "first_invocation_ms": (first_done - invoke_start) * 1000,
+    "warm_invocation_ms": (warm_done - first_done) * 1000,
+}}))
+"""
+
+
+def run_sample() -> dict:
+    """
+    Runs one cold start in a subprocess and returns its timings.
+    """
+    from aws_standin import STANDIN_ENVIRONMENT
+
+    env = dict(os.environ, **STANDIN_ENVIRONMENT)
+    # Alerts and reports are skipped so only the collection path is timed
+    env.pop('SNS_TOPIC_ARN', None)
+    env.pop('REPORTS_BUCKET', None)
+    script = SAMPLE_SCRIPT.format(
+        benchmark_dir=BENCHMARK_DIR,
+        src_dir=os.path.join(BENCHMARK_DIR, '..', 'src'),
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=5, help='cold starts to measure')
+    parser.add_argument('--max-import-ms', type=float, help='fail if median import time exceeds this')
+    parser.add_argument('--max-first-invocation-ms', type=float, help='fail if median first invocation exceeds this')
+    args = parser.parse_args()
+
+    sys.path.insert(0, BENCHMARK_DIR)
+    samples = [run_sample() for _ in range(args.samples)]
+
+    summary = {}
+    for metric in ('import_ms', 'first_invocation_ms', 'warm_invocation_ms'):
+        values = [sample[metric] for sample in samples]
+        summary[metric] = {
+            'median': round(statistics.median(values), 1),
+            'max': round(max(values), 1),
+        }
+    print(json.dumps(summary, indent=2))
+
+    failures = []
+    if args.max_import_ms is not None and summary['import_ms']['median'] > args.max_import_ms:
+        failures.append(f"import {summary['import_ms']['median']}ms > {args.max_import_ms}ms")
+    if (args.max_first_invocation_ms is not None
+            and summary['first_invocation_ms']['median'] > args.max_first_invocation_ms):
+        failures.append(
+            f"first invocation {summary['first_invocation_ms']['median']}ms > {args.max_first_invocation_ms}ms"
+        )
+    if failures:
+        print("Startup regression: " + "; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
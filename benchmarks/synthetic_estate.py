@@ -0,0 +1,256 @@
+"""
+Synthetic Estate
+Seeds the local AWS stand-in with a generated account of configurable size
+
+Every resource is generated from a seed, so the same sizes always produce the same
+estate and the same findings. A fixed fraction of each resource type is non-compliant
+(public, unencrypted, without MFA, open to the internet). EC2 resources are split evenly
+across the configured regions; S3 and IAM are global. Half of the private buckets have
+bucket-level Block Public Access on, as new buckets do by default; account-level Block
+Public Access is off unless account_block is set.
+"""
+
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from aws_standin import AwsStandIn, page
+
+ACCOUNT_ID = "123456789012"
+
+
+class SyntheticEstate:
+    """
+    A generated AWS account served through an AwsStandIn.
+
+    Args:
+        instances, volumes, security_groups: EC2 resources across all regions
+        buckets: S3 buckets
+        users: IAM users
+        login_events: ConsoleLogin events returned by LookupEvents
+        regions: Regions the EC2 resources are spread across
+        non_compliant_fraction: Share of each resource type with a finding
+        account_block: Turn on account-level Block Public Access (no bucket is then public)
+        seed: Generator seed
+    """
+
+    def __init__(self, instances: int = 10000, volumes: int = 10000, security_groups: int = 2000,
+                 buckets: int = 5000, users: int = 20000, login_events: int = 5000,
+                 regions: List[str] = ("us-east-1",), non_compliant_fraction: float = 0.1,
+                 account_block: bool = False, seed: int = 42):
+        self.regions = list(regions)
+        self.counts = {
+            "instances": instances,
+            "volumes": volumes,
+            "security_groups": security_groups,
+            "buckets": buckets,
+            "users": users,
+            "login_events": login_events,
+        }
+        self.non_compliant_fraction = non_compliant_fraction
+        self.seed = seed
+        self._regional = {}
+
+        rng = random.Random(seed)
+        created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.buckets = [
+            {"Name": f"medtech-bucket-{i:06d}", "CreationDate": created + timedelta(minutes=i)}
+            for i in range(buckets)
+        ]
+        # Half of the public buckets are public through their ACL, half through their policy
+        self.public_acl_buckets = {b["Name"] for b in self.buckets if rng.random() < non_compliant_fraction / 2}
+        self.public_policy_buckets = {b["Name"] for b in self.buckets if rng.random() < non_compliant_fraction / 2}
+        self.policy_buckets = self.public_policy_buckets | {
+            b["Name"] for b in self.buckets if rng.random() < 0.3
+        }
+        public = self.public_acl_buckets | self.public_policy_buckets
+        # Separate generator, so the rest of the estate stays the same as without it
+        block_rng = random.Random(seed + 1)
+        self.blocked_buckets = {b["Name"] for b in self.buckets if b["Name"] not in public and block_rng.random() < 0.5}
+        self.account_block = account_block
+
+        self.users = [
+            {"UserName": f"user-{i:06d}", "UserId": f"AIDA{i:016d}", "Arn": f"arn:aws:iam::{ACCOUNT_ID}:user/user-{i:06d}",
+             "Path": "/", "CreateDate": created}
+            for i in range(users)
+        ]
+        self.users_without_mfa = {u["UserName"] for u in self.users if rng.random() < non_compliant_fraction}
+
+        now = datetime.now(timezone.utc)
+        self.login_events = []
+        for i in range(login_events):
+            failed = rng.random() < non_compliant_fraction
+            record = {
+                "eventName": "ConsoleLogin",
+                "eventTime": (now - timedelta(seconds=i * 10)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                "sourceIPAddress": f"198.51.100.{rng.randrange(256)}",
+                "userIdentity": {"type": "IAMUser", "userName": f"user-{rng.randrange(max(users, 1)):06d}"},
+                "responseElements": {"ConsoleLogin": "Failure" if failed else "Success"},
+            }
+            if failed:
+                record["errorMessage"] = "Failed authentication"
+            self.login_events.append({
+                "EventName": "ConsoleLogin",
+                "EventTime": now - timedelta(seconds=i * 10),
+                "CloudTrailEvent": json.dumps(record),
+            })
+
+    def _region_data(self, region: str) -> Dict[str, list]:
+        """
+        Generates (once) the EC2 resources of one region.
+        """
+        if region not in self._regional:
+            index = self.regions.index(region) if region in self.regions else 0
+            rng = random.Random(f"{self.seed}-{region}")
+            share = lambda count: count // len(self.regions) + (1 if index < count % len(self.regions) else 0)
+            fraction = self.non_compliant_fraction
+
+            instances = []
+            for i in range(share(self.counts["instances"])):
+                instance = {"InstanceId": f"i-{index:02x}{i:015x}", "State": {"Name": "running"}}
+                if rng.random() < fraction:
+                    instance["PublicIpAddress"] = f"203.0.113.{i % 256}"
+                instances.append(instance)
+            volumes = [
+                {"VolumeId": f"vol-{index:02x}{i:015x}", "Encrypted": rng.random() >= fraction, "Size": 8}
+                for i in range(share(self.counts["volumes"]))
+            ]
+            groups = []
+            network_interfaces = []
+            for i in range(share(self.counts["security_groups"])):
+                group_id = f"sg-{index:02x}{i:015x}"
+                roll = rng.random()
+                # Open groups use 0.0.0.0/0, ::/0 or a split broad range in equal parts
+                if roll < fraction / 3:
+                    ssh_source = {"IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+                elif roll < 2 * fraction / 3:
+                    ssh_source = {"Ipv6Ranges": [{"CidrIpv6": "::/0"}]}
+                elif roll < fraction:
+                    ssh_source = {"IpRanges": [{"CidrIp": "0.0.0.0/1"}, {"CidrIp": "128.0.0.0/1"}]}
+                else:
+                    ssh_source = {"IpRanges": [{"CidrIp": "10.0.0.0/8"}]}
+                groups.append({
+                    "GroupId": group_id,
+                    "GroupName": f"sg-{i}",
+                    "VpcId": f"vpc-{index:02x}",
+                    "IpPermissions": [
+                        {"IpProtocol": "tcp", "FromPort": 443, "ToPort": 443, "IpRanges": [{"CidrIp": "10.0.0.0/8"}]},
+                        dict({"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22}, **ssh_source),
+                    ],
+                })
+                # Nine in ten groups are attached to a network interface
+                if rng.random() < 0.9:
+                    network_interfaces.append({
+                        "NetworkInterfaceId": f"eni-{index:02x}{i:015x}",
+                        "Status": "in-use",
+                        "Groups": [{"GroupId": group_id, "GroupName": f"sg-{i}"}],
+                    })
+            self._regional[region] = {
+                "instances": instances,
+                "volumes": volumes,
+                "security_groups": groups,
+                "network_interfaces": network_interfaces,
+            }
+        return self._regional[region]
+
+    def install(self, standin: AwsStandIn) -> AwsStandIn:
+        """
+        Registers this estate's API handlers on a stand-in.
+        """
+        def regional(key):
+            return self._region_data(standin.current_region())[key]
+
+        def describe_volumes(params):
+            volumes = regional("volumes")
+            if _filter_values(params, "encrypted") == ["false"]:
+                volumes = [v for v in volumes if not v["Encrypted"]]
+            return page(volumes, params, "Volumes", 500)
+
+        def describe_instances(params):
+            # Five instances per reservation, 1000 instances per page
+            instances = regional("instances")
+            reservations = [{"Instances": instances[i:i + 5]} for i in range(0, len(instances), 5)]
+            return page(reservations, params, "Reservations", 200)
+
+        def describe_security_groups(params):
+            groups = regional("security_groups")
+            cidrs = _filter_values(params, "ip-permission.cidr")
+            if cidrs:
+                groups = [g for g in groups if any(cidr in json.dumps(g["IpPermissions"]) for cidr in cidrs)]
+            return page(groups, params, "SecurityGroups", 1000)
+
+        def describe_network_interfaces(params):
+            interfaces = regional("network_interfaces")
+            group_ids = _filter_values(params, "group-id")
+            if group_ids:
+                interfaces = [eni for eni in interfaces if any(g["GroupId"] in group_ids for g in eni["Groups"])]
+            return page(interfaces, params, "NetworkInterfaces", 1000)
+
+        def get_bucket_acl(params):
+            grants = [{"Grantee": {"Type": "CanonicalUser", "ID": "owner"}, "Permission": "FULL_CONTROL"}]
+            if params["Bucket"] in self.public_acl_buckets:
+                grants.append({"Grantee": {"Type": "Group", "URI": "http://acs.amazonaws.com/groups/global/AllUsers"},
+                               "Permission": "READ"})
+            return {"Owner": {"ID": "owner"}, "Grants": grants}
+
+        def get_public_access_block(params):
+            # S3 Control (account-level) calls carry AccountId, S3 (bucket-level) calls Bucket
+            blocked = self.account_block if "AccountId" in params else params["Bucket"] in self.blocked_buckets
+            if not blocked:
+                return {"Error": {"Code": "NoSuchPublicAccessBlockConfiguration",
+                                  "Message": "The public access block configuration was not found"}}
+            return {"PublicAccessBlockConfiguration": {
+                "BlockPublicAcls": True, "IgnorePublicAcls": True, "BlockPublicPolicy": True, "RestrictPublicBuckets": True,
+            }}
+
+        def get_bucket_policy_status(params):
+            if params["Bucket"] not in self.policy_buckets:
+                return {"Error": {"Code": "NoSuchBucketPolicy", "Message": "The bucket policy does not exist"}}
+            return {"PolicyStatus": {"IsPublic": params["Bucket"] in self.public_policy_buckets}}
+
+        def list_mfa_devices(params):
+            if params["UserName"] in self.users_without_mfa:
+                return {"MFADevices": []}
+            return {"MFADevices": [{"UserName": params["UserName"], "SerialNumber": f"arn:aws:iam::{ACCOUNT_ID}:mfa/"
+                                    f"{params['UserName']}", "EnableDate": datetime(2024, 1, 1, tzinfo=timezone.utc)}]}
+
+        def get_credential_report(params):
+            lines = ["user,arn,mfa_active", f"<root_account>,arn:aws:iam::{ACCOUNT_ID}:root,true"]
+            lines += [f"{u['UserName']},{u['Arn']},{str(u['UserName'] not in self.users_without_mfa).lower()}"
+                      for u in self.users]
+            return {"Content": "\n".join(lines).encode("utf-8"), "ReportFormat": "text/csv",
+                    "GeneratedTime": datetime.now(timezone.utc)}
+
+        (standin
+            .on("DescribeRegions", lambda params: {"Regions": [{"RegionName": r} for r in self.regions]})
+            .on("DescribeVolumes", describe_volumes)
+            .on("DescribeInstances", describe_instances)
+            .on("DescribeSecurityGroups", describe_security_groups)
+            .on("DescribeNetworkInterfaces", describe_network_interfaces)
+            .on("ListBuckets", lambda params: page(self.buckets, params, "Buckets", 10000,
+                                                   input_token="ContinuationToken", output_token="ContinuationToken"))
+            .on("GetPublicAccessBlock", get_public_access_block)
+            .on("GetBucketAcl", get_bucket_acl)
+            .on("GetBucketPolicyStatus", get_bucket_policy_status)
+            .on("ListUsers", lambda params: page(self.users, params, "Users", 100, input_token="Marker",
+                                                 output_token="Marker", more_results="IsTruncated"))
+            .on("GetAccountSummary", lambda params: {"SummaryMap": {"Users": len(self.users)}})
+            .on("ListMFADevices", list_mfa_devices)
+            .on("GenerateCredentialReport", lambda params: {"State": "COMPLETE"})
+            .on("GetCredentialReport", get_credential_report)
+            .on("LookupEvents", lambda params: page(self.login_events, params, "Events", 50))
+            .on("DescribeTrails", lambda params: {"trailList": []})
+            .on("GetCallerIdentity", lambda params: {"Account": ACCOUNT_ID, "Arn": f"arn:aws:iam::{ACCOUNT_ID}:root",
+                                                     "UserId": ACCOUNT_ID})
+            .on("Publish", lambda params: {"MessageId": "standin"})
+            .on("PutMetricData", lambda params: {})
+            .on("PutObject", lambda params: {"ETag": '"standin"'}))
+        return standin
+
+
+def _filter_values(params: Dict[str, any], name: str) -> List[str]:
+    for api_filter in params.get("Filters", []):
+        if api_filter["Name"] == name:
+            return api_filter["Values"]
+    return []
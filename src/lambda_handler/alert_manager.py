@@ -4,23 +4,38 @@ Contains SNS alert logic for threshold violations
 Owner: Nicole (Automation & Alert Engineer)
 """
 
-import boto3
+import hashlib
 import os
 import json
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
 
 # Add parent directories to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from utils.aws_helpers import get_boto3_client, handle_error
+from utils.aws_helpers import get_boto3_client, handle_error, logger
+from utils.rules_engine import evaluate_rules
+from utils.state_store import load_state, save_state
+
+# SNS limits: 100 characters per subject, 256 KB per message (leave room for encoding)
+MAX_SUBJECT_LENGTH = 100
+DEFAULT_ALERT_MAX_MESSAGE_BYTES = 250000
+DEFAULT_ALERT_DEDUP_WINDOW_HOURS = 0
+ALERT_STATE_NAME = "alert_fingerprints"
 
 
 def check_thresholds_and_alert(findings: Dict[str, any]) -> List[str]:
     """
     Analyzes findings against thresholds and triggers alerts.
     
-    This function checks for common security issues. Adjust thresholds and checks
-    based on what metrics Alejandro implements.
+    The checks and thresholds are the rules of the security policy (see
+    utils/rules_engine.py); every violated rule with an alert produces one risk.
+    The rules of failed checks (check_errors) are not evaluated; their failure is
+    published as the CheckErrors metric instead. A check that failed in only some
+    accounts still alerts on the other accounts' results, naming the failed accounts.
+    All risks of a run are sent together by dispatch_alerts() instead of one SNS
+    message per category.
     
     Args:
         findings: Dictionary of collected security metrics from collect_security_metrics()
@@ -29,115 +44,146 @@ def check_thresholds_and_alert(findings: Dict[str, any]) -> List[str]:
         List of detected risk descriptions (strings)
     """
     risks = []
+    alerts = []
     sns_topic_arn = os.environ.get('SNS_TOPIC_ARN')
     
     if not sns_topic_arn:
         handle_error(Exception("SNS_TOPIC_ARN environment variable not set"), "check_thresholds_and_alert")
         return risks
     
-    # Check for public S3 buckets (from exposure dict)
-    exposure = findings.get('exposure', {})
-    public_buckets = exposure.get('public_s3_buckets', [])
-    if public_buckets and len(public_buckets) > 0:
-        risk_msg = f"ALERT: {len(public_buckets)} public S3 bucket(s) detected: {', '.join(public_buckets)}"
-        risks.append(risk_msg)
-        send_alert(
-            subject="Security Alert: Public S3 Buckets Detected",
-            message=risk_msg
-        )
+    for result in evaluate_rules(findings):
+        alert = result.alert(findings)
+        if alert:
+            risks.append(alert["message"])
+            alerts.append(alert)
     
-    # Check for public EC2 IPs (from exposure dict)
-    public_ec2_ips = exposure.get('public_ec2_IPs', [])
-    if public_ec2_ips and len(public_ec2_ips) > 0:
-        risk_msg = f"ALERT: {len(public_ec2_ips)} EC2 instance(s) with public IPs detected: {', '.join(public_ec2_ips)}"
-        risks.append(risk_msg)
-        send_alert(
-            subject="Security Alert: Public EC2 Instances Detected",
-            message=risk_msg
-        )
-    
-    # Check for MFA non-compliance (from mfa_iam dict)
-    mfa_iam = findings.get('mfa_iam', {})
-    non_compliant_users = mfa_iam.get('non_compliant_users', [])
-    if non_compliant_users and len(non_compliant_users) > 0:
-        risk_msg = f"ALERT: {len(non_compliant_users)} IAM user(s) without MFA: {', '.join(non_compliant_users)}"
-        risks.append(risk_msg)
-        send_alert(
-            subject="Security Alert: MFA Non-Compliance Detected",
-            message=risk_msg
-        )
-    
-    # Check for risky security groups (list of dicts)
-    security_groups = findings.get('security_groups', [])
-    if security_groups and len(security_groups) > 0:
-        sg_ids = [sg.get('SecurityGroupId', 'Unknown') for sg in security_groups]
-        risk_msg = f"ALERT: {len(security_groups)} security group(s) with risky rules (0.0.0.0/0): {', '.join(sg_ids)}"
-        risks.append(risk_msg)
-        send_alert(
-            subject="Security Alert: Risky Security Groups Detected",
-            message=risk_msg
-        )
-    
-    # Check for unencrypted EBS volumes
-    unencrypted_volumes = findings.get('encryption', [])
-    if unencrypted_volumes and len(unencrypted_volumes) > 0:
-        risk_msg = f"ALERT: {len(unencrypted_volumes)} unencrypted EBS volume(s) detected: {', '.join(unencrypted_volumes)}"
-        risks.append(risk_msg)
-        send_alert(
-            subject="Security Alert: Unencrypted EBS Volumes Detected",
-            message=risk_msg
-        )
+    dispatch_alerts(alerts)
+    return risks
+
+
+def alert_fingerprint(alert: Dict[str, any]) -> str:
+    """
+    Identifies an alert by its subject and the set of affected resources, so the
+    same findings produce the same fingerprint regardless of ordering.
+    """
+    content = alert["subject"] + "\n" + "\n".join(sorted(str(r) for r in alert.get("resources", [])))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]
+
+
+def dispatch_alerts(alerts: List[Dict[str, any]]):
+    """
+    Sends the alerts of one run as a single batched SNS message per topic.
     
-    # CloudTrail and login_attempts alerts are disabled for presentation
-    # Uncomment below to enable:
-    # cloudtrail = findings.get('cloudtrail', {})
-    # if not cloudtrail.get('cloudtrail_enabled', False):
-    #     risk_msg = f"ALERT: CloudTrail logging is NOT enabled. Active trails: {len(cloudtrail.get('active_trails', []))}, Inactive trails: {len(cloudtrail.get('inactive_trails', []))}"
-    #     risks.append(risk_msg)
-    #     send_alert(
-    #         subject="Security Alert: CloudTrail Not Enabled",
-    #         message=risk_msg
-    #     )
-    # login_attempts = findings.get('login_attempts', {})
-    # failed_login_count = login_attempts.get('failed_login_count', 0)
-    # if failed_login_count > 0:
-    #     failed_logins = login_attempts.get('failed_logins', [])
-    #     login_summary = "\n".join([
-    #         f"  - {login.get('user', 'Unknown')} from {login.get('source_ip', 'Unknown')} at {login.get('time', 'Unknown')}"
-    #         for login in failed_logins[:5]
-    #     ])
-    #     if len(failed_logins) > 5:
-    #         login_summary += f"\n  ... and {len(failed_logins) - 5} more"
-    #     risk_msg = f"ALERT: {failed_login_count} failed login attempt(s) detected in last 24 hours:\n{login_summary}"
-    #     risks.append(risk_msg)
-    #     send_alert(
-    #         subject="Security Alert: Failed Login Attempts Detected",
-    #         message=risk_msg
-    #     )
+    - Alerts already sent within ALERT_DEDUP_WINDOW_HOURS (by fingerprint) are
+      suppressed; 0 disables suppression
+    - The batch is split into chunks under ALERT_MAX_MESSAGE_BYTES
+    - SNS_TOPIC_ARN may list several comma-separated topics, which are published
+      to concurrently
     
-    return risks
+    Args:
+        alerts: Dicts with subject, message and resources (affected resource IDs)
+    """
+    if not alerts:
+        return
+
+    topic_arns = [arn.strip() for arn in os.environ.get('SNS_TOPIC_ARN', '').split(',') if arn.strip()]
+    if not topic_arns:
+        handle_error(Exception("SNS_TOPIC_ARN environment variable not set"), "dispatch_alerts")
+        return
+
+    window_hours = float(os.environ.get('ALERT_DEDUP_WINDOW_HOURS', DEFAULT_ALERT_DEDUP_WINDOW_HOURS))
+    now = time.time()
+    sent_at = load_state(ALERT_STATE_NAME) if window_hours > 0 else {}
+
+    pending = []
+    for alert in alerts:
+        fingerprint = alert_fingerprint(alert)
+        if now - sent_at.get(fingerprint, 0) < window_hours * 3600:
+            continue
+        pending.append((fingerprint, alert))
+
+    suppressed = len(alerts) - len(pending)
+    if suppressed:
+        logger.info(f"Suppressed {suppressed} alert(s) already sent in the last {window_hours} hour(s)")
+    if not pending:
+        return
+
+    max_bytes = int(os.environ.get('ALERT_MAX_MESSAGE_BYTES', DEFAULT_ALERT_MAX_MESSAGE_BYTES))
+    chunks = chunk_messages([alert["message"] for _, alert in pending], max_bytes)
+    if len(pending) == 1:
+        base_subject = pending[0][1]["subject"]
+    else:
+        base_subject = f"Security Alert: {len(pending)} Security Risks Detected"
+
+    messages = []
+    for index, chunk in enumerate(chunks, start=1):
+        subject = base_subject if len(chunks) == 1 else f"{base_subject} ({index}/{len(chunks)})"
+        messages.extend((topic_arn, subject[:MAX_SUBJECT_LENGTH], chunk) for topic_arn in topic_arns)
 
+    with ThreadPoolExecutor(max_workers=min(len(messages), 8)) as executor:
+        results = list(executor.map(lambda m: send_alert(m[1], m[2], topic_arn=m[0]), messages))
 
-def send_alert(subject: str, message: str):
+    # Only remember alerts whose batch actually went out
+    if window_hours > 0 and all(results):
+        sent_at = {fp: ts for fp, ts in sent_at.items() if now - ts < window_hours * 3600}
+        sent_at.update({fingerprint: now for fingerprint, _ in pending})
+        try:
+            save_state(ALERT_STATE_NAME, sent_at)
+        except Exception as e:
+            handle_error(e, "dispatch_alerts")
+
+
+def chunk_messages(messages: List[str], max_bytes: int) -> List[str]:
+    """
+    Joins messages into as few bodies as possible, each at most max_bytes (UTF-8).
+    A single message longer than max_bytes is truncated.
+    """
+    separator = "\n\n"
+    chunks = []
+    current = ""
+    for message in messages:
+        if len(message.encode('utf-8')) > max_bytes:
+            suffix = " ... (truncated)"
+            limit = max_bytes - len(suffix.encode('utf-8'))
+            message = message.encode('utf-8')[:limit].decode('utf-8', errors='ignore') + suffix
+        candidate = f"{current}{separator}{message}" if current else message
+        if len(candidate.encode('utf-8')) > max_bytes:
+            chunks.append(current)
+            current = message
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def send_alert(subject: str, message: str, topic_arn: str = None) -> bool:
     """
     Sends alert via SNS.
     
     Args:
         subject: Alert subject line
         message: Alert message body
+        topic_arn: SNS topic ARN (default: SNS_TOPIC_ARN environment variable)
+        
+    Returns:
+        True if the message was published
     """
     try:
-        sns_topic_arn = os.environ.get('SNS_TOPIC_ARN')
+        sns_topic_arn = topic_arn or os.environ.get('SNS_TOPIC_ARN')
         if not sns_topic_arn:
             handle_error(Exception("SNS_TOPIC_ARN environment variable not set"), "send_alert")
-            return
+            return False
         
-        sns = get_boto3_client('sns')
+        # Publish through the topic's own region (arn:aws:sns:<region>:<account>:<name>)
+        sns = get_boto3_client('sns', region=sns_topic_arn.split(':')[3])
         sns.publish(
             TopicArn=sns_topic_arn,
             Subject=subject,
             Message=message
         )
+        return True
     except Exception as e:
         handle_error(e, "send_alert")
+        return False
 
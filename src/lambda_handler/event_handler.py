@@ -0,0 +1,285 @@
+"""
+Event Handler Module
+Event-driven re-evaluation of single resources from CloudTrail/EventBridge config changes
+Owner: Nicole (Automation & Alert Engineer)
+
+INTERFACE NOTES:
+The SecurityConfigChangeRule in dashboard_setup.yaml forwards "AWS API Call via
+CloudTrail" events for the API calls in EVENT_RESOURCES to the same Lambda function.
+lambda_handler() routes them here instead of running a full scan:
+
+1. parse_config_change_event() extracts the affected resources from the event
+2. Each resource is re-evaluated with the check logic from metrics_collector
+3. The last scan snapshot (INCREMENTAL_SCAN) is updated and the affected metrics
+   are republished from it (per AccountId for other accounts and in multi-account
+   deployments, whose undimensioned metrics are totals across accounts)
+4. A resource that is now non-compliant is alerted through dispatch_alerts()
+5. Cached inventories the change made stale (INVENTORY_EVENTS) are dropped, so the
+   next scan lists those resources again (see utils/inventory_cache.py)
+
+Sample events for local testing live in demo/events/:
+    cd src && python -m lambda_handler.event_handler ../demo/events/put_bucket_acl.json
+"""
+
+import json
+import os
+import sys
+from typing import Dict, List
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from lambda_handler.alert_manager import dispatch_alerts
+from metrics_collector.metrics_collector import RESOURCE_EVALUATORS, evaluate_resource
+from metrics_collector.scan_state import ScanSnapshot, security_group_key
+from utils.aws_helpers import get_assumed_role_credentials, handle_error, logger, publish_metric_values
+from utils.inventory_cache import invalidate_inventory
+from utils.rules_engine import get_rule
+from utils.state_store import load_state, save_state
+
+CONFIG_CHANGE_DETAIL_TYPE = "AWS API Call via CloudTrail"
+
+
+def _request(detail, *path):
+    return _lookup(detail.get("requestParameters"), *path)
+
+
+def _response(detail, *path):
+    return _lookup(detail.get("responseElements"), *path)
+
+
+def _lookup(value, *path):
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _instance_ids(items_set) -> List[str]:
+    items = (items_set or {}).get("items", []) if isinstance(items_set, dict) else []
+    return [item["instanceId"] for item in items if item.get("instanceId")]
+
+
+def _group_ids(group_set) -> List[str]:
+    items = (group_set or {}).get("items", []) if isinstance(group_set, dict) else []
+    return [item["groupId"] for item in items if item.get("groupId")]
+
+
+# CloudTrail eventName -> (resource type, function extracting resource IDs from the event detail)
+EVENT_RESOURCES = {
+    # S3 buckets
+    "CreateBucket": ("bucket", lambda d: [_request(d, "bucketName")]),
+    "PutBucketAcl": ("bucket", lambda d: [_request(d, "bucketName")]),
+    "PutBucketPolicy": ("bucket", lambda d: [_request(d, "bucketName")]),
+    "DeleteBucketPolicy": ("bucket", lambda d: [_request(d, "bucketName")]),
+    "PutBucketPublicAccessBlock": ("bucket", lambda d: [_request(d, "bucketName")]),
+    "DeleteBucketPublicAccessBlock": ("bucket", lambda d: [_request(d, "bucketName")]),
+    "DeleteBucket": ("bucket", lambda d: [_request(d, "bucketName")]),
+    # Security groups
+    "CreateSecurityGroup": ("security_group", lambda d: [_response(d, "groupId")]),
+    "AuthorizeSecurityGroupIngress": ("security_group", lambda d: [_request(d, "groupId")]),
+    "RevokeSecurityGroupIngress": ("security_group", lambda d: [_request(d, "groupId")]),
+    "ModifySecurityGroupRules": ("security_group", lambda d: [_request(d, "ModifySecurityGroupRulesRequest", "GroupId")]),
+    "DeleteSecurityGroup": ("security_group", lambda d: [_request(d, "groupId")]),
+    # Attaching a group to a network interface can make its rules reachable
+    "ModifyNetworkInterfaceAttribute": ("security_group", lambda d: _group_ids(_request(d, "groupSet"))),
+    # IAM users
+    "CreateUser": ("user", lambda d: [_request(d, "userName")]),
+    "EnableMFADevice": ("user", lambda d: [_request(d, "userName")]),
+    "DeactivateMFADevice": ("user", lambda d: [_request(d, "userName")]),
+    "DeleteUser": ("user", lambda d: [_request(d, "userName")]),
+    # EBS volumes
+    "CreateVolume": ("volume", lambda d: [_response(d, "volumeId")]),
+    "DeleteVolume": ("volume", lambda d: [_request(d, "volumeId")]),
+    # EC2 instances
+    "RunInstances": ("instance", lambda d: _instance_ids(_response(d, "instancesSet"))),
+    "AssociateAddress": ("instance", lambda d: [_request(d, "instanceId")]),
+    "DisassociateAddress": ("instance", lambda d: [_request(d, "instanceId")]),
+    "TerminateInstances": ("instance", lambda d: _instance_ids(_request(d, "instancesSet"))),
+}
+
+# CloudTrail eventName -> cached inventories (utils/inventory_cache.py) the call makes stale;
+# (type, True) for regional inventories, (type, False) for global ones
+INVENTORY_EVENTS = {
+    "CreateBucket": [("buckets", False)],
+    "DeleteBucket": [("buckets", False)],
+    "CreateUser": [("iam_users", False)],
+    "DeleteUser": [("iam_users", False)],
+    "CreateSecurityGroup": [("security_groups", True)],
+    "AuthorizeSecurityGroupIngress": [("security_groups", True)],
+    "RevokeSecurityGroupIngress": [("security_groups", True)],
+    "ModifySecurityGroupRules": [("security_groups", True)],
+    "DeleteSecurityGroup": [("security_groups", True)],
+    "ModifyNetworkInterfaceAttribute": [("network_interfaces", True)],
+    "CreateVolume": [("unencrypted_volumes", True)],
+    "DeleteVolume": [("unencrypted_volumes", True)],
+    "RunInstances": [("instances", True)],
+    "AssociateAddress": [("instances", True)],
+    "DisassociateAddress": [("instances", True)],
+    "TerminateInstances": [("instances", True)],
+}
+
+def is_config_change_event(event: Dict[str, any]) -> bool:
+    """
+    True if the Lambda was invoked with a CloudTrail API call event from EventBridge.
+    """
+    return isinstance(event, dict) and event.get("detail-type") == CONFIG_CHANGE_DETAIL_TYPE
+
+
+def parse_config_change_event(event: Dict[str, any]) -> List[Dict[str, any]]:
+    """
+    Extracts the resources affected by a config-change event.
+
+    Failed API calls (errorCode set) and unsupported event names yield no changes.
+
+    Args:
+        event: EventBridge event with a CloudTrail record in "detail"
+
+    Returns:
+        List of dicts with resource_type, resource_id, region, account_id,
+        event_name and actor
+    """
+    detail = event.get("detail") or {}
+    event_name = detail.get("eventName")
+    if event_name not in EVENT_RESOURCES or detail.get("errorCode"):
+        return []
+
+    resource_type, extract_ids = EVENT_RESOURCES[event_name]
+    region = detail.get("awsRegion") or event.get("region")
+    account_id = event.get("account") or _lookup(detail, "userIdentity", "accountId")
+    actor = _lookup(detail, "userIdentity", "arn") or "Unknown"
+
+    return [
+        {
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "region": region,
+            "account_id": account_id,
+            "event_name": event_name,
+            "actor": actor,
+        }
+        for resource_id in extract_ids(detail)
+        if resource_id
+    ]
+
+
+def handle_config_change_event(event: Dict[str, any]) -> Dict[str, any]:
+    """
+    Re-evaluates the resources named in a config-change event.
+
+    Args:
+        event: EventBridge event with a CloudTrail record in "detail"
+
+    Returns:
+        Lambda response dict, like lambda_handler()
+    """
+    changes = parse_config_change_event(event)
+    if not changes:
+        logger.info(f"Ignoring event {(event.get('detail') or {}).get('eventName')}: no resources to re-evaluate")
+        return _response_body(200, {'resources_evaluated': 0, 'message': 'No resources to re-evaluate'})
+
+    account_id, credentials = _account_credentials(changes[0]["account_id"])
+    for inventory_type, regional in INVENTORY_EVENTS.get(changes[0]["event_name"], []):
+        try:
+            invalidate_inventory(inventory_type, account_id, changes[0]["region"] if regional else None)
+        except Exception as e:
+            handle_error(e, f"handle_config_change_event (invalidating {inventory_type})")
+    snapshot_name = f"scan_snapshot_{account_id or 'self'}"
+    snapshot = ScanSnapshot(load_state(snapshot_name))
+
+    alerts = []
+    metrics = {}
+    results = []
+    for change in changes:
+        resource_type, resource_id = change["resource_type"], change["resource_id"]
+        category = RESOURCE_EVALUATORS[resource_type][1]
+        try:
+            resource_findings = evaluate_resource(
+                resource_type, resource_id, change["region"], account_id=account_id, credentials=credentials
+            )
+        except Exception as e:
+            handle_error(e, f"handle_config_change_event({resource_type} {resource_id})")
+            results.append({'resource_id': resource_id, 'error': str(e)})
+            continue
+
+        if resource_type == "security_group":
+            keys = [security_group_key(rule) for rule in resource_findings]
+        else:
+            keys = list(resource_findings)
+        diff = snapshot.update_resource(category, resource_id, keys)
+        results.append({'resource_id': resource_id, 'non_compliant': bool(keys), 'findings': keys})
+        logger.info(f"{change['event_name']} on {resource_type} {resource_id}: "
+                    f"{'non-compliant' if keys else 'compliant'}")
+
+        # The category's security rule names its metric and alert; disabled rules publish neither
+        rule = get_rule(category)
+        if rule is None:
+            continue
+        if diff is not None and rule.metric:
+            metrics[rule.metric] = len(snapshot.findings[category])
+        if keys and rule.subject:
+            alerts.append({
+                "subject": rule.subject,
+                "message": (f"ALERT: {change['event_name']} by {change['actor']} left "
+                            f"{resource_type} {resource_id} non-compliant: {', '.join(keys)}"),
+                "resources": keys,
+            })
+
+    try:
+        save_state(snapshot_name, snapshot.to_dict())
+    except Exception as e:
+        handle_error(e, "handle_config_change_event (saving scan snapshot)")
+    publish_metric_values(metrics, _metric_dimensions(account_id))
+    if os.environ.get('SNS_TOPIC_ARN'):
+        dispatch_alerts(alerts)
+
+    return _response_body(200, {
+        'resources_evaluated': len(results),
+        'results': results,
+        'risks_detected': len(alerts),
+        'message': 'Config change re-evaluated successfully'
+    })
+
+
+def _account_credentials(account_id: str):
+    """
+    Returns (account_id, credentials) for evaluating resources in the event's account:
+    (None, None) for the Lambda's own account, assumed-role credentials otherwise.
+    """
+    # Imported on demand, like in lambda_handler, to keep single-account cold starts light
+    from metrics_collector.multi_account import DEFAULT_SCAN_ROLE_NAME, get_current_account_id
+
+    if not account_id or account_id == get_current_account_id():
+        return None, None
+    role_name = os.environ.get("SCAN_ROLE_NAME", DEFAULT_SCAN_ROLE_NAME)
+    return account_id, get_assumed_role_credentials(f"arn:aws:iam::{account_id}:role/{role_name}")
+
+
+def _metric_dimensions(account_id: str) -> Dict[str, str]:
+    """
+    Dimensions of the metrics recomputed from one account's snapshot. The undimensioned
+    metrics are totals across every scanned account in multi-account deployments
+    (SCAN_ACCOUNTS), so one account's counts are published per AccountId instead.
+    """
+    if not account_id and not os.environ.get("SCAN_ACCOUNTS"):
+        return None
+    # Imported on demand, as in _account_credentials()
+    from metrics_collector.multi_account import get_current_account_id
+
+    return {"AccountId": account_id or get_current_account_id()}
+
+
+def _response_body(status_code: int, body: Dict[str, any]) -> Dict[str, any]:
+    return {'statusCode': status_code, 'body': json.dumps(body)}
+
+
+# ------------------------------------------------------------------------------------
+# LOCAL TESTING
+# ------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        with open(path) as f:
+            sample_event = json.load(f)
+        print(f"{path}:")
+        print(json.dumps(parse_config_change_event(sample_event), indent=2))
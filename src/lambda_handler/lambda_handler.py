@@ -7,13 +7,20 @@ Owner: Nicole (Automation & Alert Engineer)
 import json
 import sys
 import os
+import time
 from datetime import datetime
 
 # Add parent directories to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from metrics_collector.metrics_collector import collect_security_metrics
+from metrics_collector.metrics_collector import collect_security_metrics, METADATA_KEYS
 from lambda_handler.alert_manager import check_thresholds_and_alert
-from utils.aws_helpers import publish_metrics_to_cloudwatch, handle_error, logger
+from lambda_handler.event_handler import is_config_change_event, handle_config_change_event
+from utils.aws_helpers import get_boto3_client, publish_metrics_to_cloudwatch, handle_error, logger
+from utils.instrumentation import finish_invocation, profile_thread, start_invocation
+
+# Seconds of Lambda time kept back at the scan deadline for checkpointing and re-invoking
+DEFAULT_SCAN_CHECKPOINT_MARGIN_SECONDS = 30
+DEFAULT_SCAN_RESUME_MODE = "invoke"
 
 
 def lambda_handler(event, context):
@@ -25,20 +32,162 @@ def lambda_handler(event, context):
     1. Collects security metrics using Alejandro's metrics_collector module
     2. Publishes metrics to CloudWatch for dashboard visualization
     3. Checks thresholds and sends alerts via SNS if violations detected
-    4. Generates and saves daily reports (optional, if REPORTS_BUCKET is set)
+    4. Generates and saves daily reports (optional, if REPORTS_BUCKET is set), plus
+       a Parquet findings table for Athena if FINDINGS_EXPORT=true
     5. Returns status and summary
     
     Expected environment variables:
     - SNS_TOPIC_ARN: ARN of SNS topic for alerts
     - REPORTS_BUCKET: S3 bucket name for reports (optional)
+    - SCAN_ACCOUNTS: "organization" or comma-separated account IDs to scan
+      through SCAN_ROLE_NAME (optional, default: only this account)
+    
+    CloudTrail config-change events from EventBridge (e.g. PutBucketAcl) skip the
+    full scan and re-evaluate only the affected resource, see event_handler.py.
+
+    Events of the form {"report": "weekly"} or {"report": "monthly"} skip the scan
+    and build that rollup report from the daily reports in REPORTS_BUCKET, see
+    reporting/report_rollup.py.
+    
+    A scan that would run into the Lambda timeout stops SCAN_CHECKPOINT_MARGIN_SECONDS
+    before it, checkpoints its progress and, with SCAN_RESUME_MODE=invoke (default),
+    invokes the function again asynchronously with {"resume_scan": true} to continue;
+    with SCAN_RESUME_MODE=next_run the next scheduled run continues it. Metrics, alerts
+    and reports are only produced once the scan has completed, see checkpoint.py.
+    
+    Check durations and AWS API call counts are emitted as EMF metrics at the end
+    of every invocation, see utils/instrumentation.py.
+    """
+    if is_config_change_event(event):
+        mode = "config_change"
+    elif isinstance(event, dict) and event.get("report"):
+        mode = "rollup"
+    else:
+        mode = "scan"
+    invocation = start_invocation(mode)
+    try:
+        with profile_thread():
+            return _handle_event(event, invocation, context)
+    finally:
+        finish_invocation(invocation)
+
+
+def _scan_deadline(context):
+    """
+    time.monotonic() by which a scan must stop to checkpoint before the Lambda times
+    out, or None without a Lambda context (e.g. local runs).
+    """
+    get_remaining_time = getattr(context, 'get_remaining_time_in_millis', None)
+    if get_remaining_time is None:
+        return None
+    margin = float(os.environ.get('SCAN_CHECKPOINT_MARGIN_SECONDS', DEFAULT_SCAN_CHECKPOINT_MARGIN_SECONDS))
+    return time.monotonic() + get_remaining_time() / 1000 - margin
+
+
+def _continue_scan(context) -> str:
     """
+    Arranges for a checkpointed scan to continue and returns how: "invoke" if the
+    function was invoked again asynchronously, "next_run" if the next scheduled run
+    picks it up (SCAN_RESUME_MODE=next_run, or the invocation failed).
+    """
+    function_arn = getattr(context, 'invoked_function_arn', None)
+    if os.environ.get('SCAN_RESUME_MODE', DEFAULT_SCAN_RESUME_MODE) != "invoke" or not function_arn:
+        return "next_run"
+    try:
+        get_boto3_client('lambda', region=None).invoke(
+            FunctionName=function_arn,
+            InvocationType='Event',
+            Payload=json.dumps({'resume_scan': True}).encode('utf-8')
+        )
+        return "invoke"
+    except Exception as e:
+        handle_error(e, "lambda_handler (re-invoking to continue the scan)")
+        return "next_run"
+
+
+def _handle_event(event, invocation, context=None):
+    """
+    Runs a scan or a config-change re-evaluation and returns the Lambda response.
+    """
+    if invocation.mode == "config_change":
+        try:
+            return handle_config_change_event(event)
+        except Exception as e:
+            handle_error(e, "lambda_handler (config change event)")
+            return {
+                'statusCode': 500,
+                'body': json.dumps({
+                    'error': str(e),
+                    'message': 'Error re-evaluating config change'
+                })
+            }
+    
+    if invocation.mode == "rollup":
+        try:
+            # Imported on demand so scan cold starts don't load it
+            from reporting.report_rollup import run_rollup
+            key = run_rollup(os.environ['REPORTS_BUCKET'], event['report'], event.get('end_date'))
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'report_key': key, 'message': f"{event['report'].capitalize()} report generated"})
+            }
+        except Exception as e:
+            handle_error(e, "lambda_handler (rollup report)")
+            return {
+                'statusCode': 500,
+                'body': json.dumps({
+                    'error': str(e),
+                    'message': 'Error generating rollup report'
+                })
+            }
     
     try:
         logger.info("Starting security metrics collection")
         
         # Step 1: Collect security data from Alejandro's metrics_collector
-        findings = collect_security_metrics()
-        logger.info(f"Collected {len(findings)} metric categories")
+        # (stopping to checkpoint before the Lambda times out)
+        deadline = _scan_deadline(context)
+        if os.environ.get('SCAN_ACCOUNTS'):
+            # Imported on demand so single-account cold starts don't load it
+            from metrics_collector.multi_account import collect_multi_account_metrics
+            findings = collect_multi_account_metrics(deadline=deadline)
+            logger.info(f"Scanned {len(findings['accounts'])} account(s)")
+            for account_id, error in findings['account_errors'].items():
+                logger.warning(f"Account {account_id} could not be scanned: {error}")
+        else:
+            findings = collect_security_metrics(deadline=deadline)
+        categories = [key for key in findings if key not in METADATA_KEYS]
+        logger.info(f"Collected {len(categories)} metric categories")
+        logger.info(f"Check timings (seconds): {json.dumps(findings.get('check_timings', {}))}")
+        for check_name, error in findings.get('check_errors', {}).items():
+            logger.warning(f"Check '{check_name}' failed: {error}")
+        for check_name, partial in findings.get('partial_errors', {}).items():
+            for kind, errors in partial.items():
+                logger.warning(f"Check '{check_name}' skipped {len(errors)} of its {kind}: {json.dumps(errors)}")
+        # Multi-account errors are keyed "<account>:<check>"
+        invocation.record_checks(findings.get('check_timings', {}), {
+            check_name.split(':')[-1]: error for check_name, error in findings.get('check_errors', {}).items()
+        })
+        if 'changes' in findings:
+            added = sum(len(change['added']) for change in findings['changes'].values())
+            removed = sum(len(change['removed']) for change in findings['changes'].values())
+            logger.info(f"Since the previous scan: {added} new finding(s), {removed} resolved")
+
+        # A checkpointed scan is continued first; publishing its partial findings
+        # would report the pending checks as clean
+        if findings.get('pending_checks'):
+            continuation = _continue_scan(context)
+            logger.info(f"Scan checkpointed with {len(findings['pending_checks'])} check(s) pending, "
+                        f"continuing via {continuation}")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'pending_checks': findings['pending_checks'],
+                    'check_timings': findings.get('check_timings', {}),
+                    'continuation': continuation,
+                    'message': 'Scan checkpointed before the Lambda timeout'
+                })
+            }
         
         # Step 2: Publish metrics to CloudWatch for dashboard
         publish_metrics_to_cloudwatch(findings)
@@ -56,20 +205,33 @@ def lambda_handler(event, context):
         reports_bucket = os.environ.get('REPORTS_BUCKET')
         if reports_bucket:
             try:
-                from reporting.report_generator import generate_daily_report, save_report_to_s3
+                from reporting.report_generator import daily_report_key, generate_daily_report, save_report_to_s3
                 
                 # Generate daily report
                 report = generate_daily_report(findings)
                 
                 # Save to S3 with date-based key
                 date_str = datetime.utcnow().strftime('%Y-%m-%d')
-                s3_key = f"reports/daily/report_{date_str}.json"
+                s3_key = daily_report_key(date_str)
                 save_report_to_s3(report, reports_bucket, s3_key)
                 
                 logger.info(f"Daily report saved to s3://{reports_bucket}/{s3_key}")
             except Exception as report_error:
                 # Log error but don't fail the Lambda execution
                 logger.warning(f"Report generation failed (non-critical): {str(report_error)}")
+
+            # Columnar findings for Athena (OPTIONAL - needs pyarrow, e.g. the AWS SDK for pandas layer)
+            if os.environ.get('FINDINGS_EXPORT', 'false').lower() == 'true':
+                try:
+                    from reporting.findings_table import FindingsTable, export_parquet
+                    from metrics_collector.multi_account import get_current_account_id
+
+                    account_id = '' if findings.get('accounts') else get_current_account_id()
+                    table = FindingsTable.from_findings(findings, account_id)
+                    key = export_parquet(table, reports_bucket, datetime.utcnow().strftime('%Y-%m-%d'))
+                    logger.info(f"{len(table)} finding(s) exported to s3://{reports_bucket}/{key}")
+                except Exception as export_error:
+                    logger.warning(f"Findings export failed (non-critical): {str(export_error)}")
         else:
             logger.info("REPORTS_BUCKET not set - skipping report generation")
         
@@ -77,7 +239,8 @@ def lambda_handler(event, context):
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'findings_count': len(findings),
+                'findings_count': len(categories),
+                'check_timings': findings.get('check_timings', {}),
                 'risks_detected': len(risks) if risks else 0,
                 'risks': risks,
                 'message': 'Security metrics collected successfully'
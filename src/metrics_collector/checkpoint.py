@@ -0,0 +1,119 @@
+"""
+Scan Checkpoint Module
+Progress of an unfinished scan, saved before the Lambda times out and resumed by the next invocation
+Owner: Alejandro (Infrastructure & Metrics Architect)
+
+INTERFACE NOTES:
+lambda_handler passes collect_security_metrics() a deadline derived from
+context.get_remaining_time_in_millis(). Once it passes, the checks stop starting new
+work and the run saves what it finished as a checkpoint (state "scan_checkpoint_<account>"):
+
+{
+    "version": 1, "started_at": 1718000000.0, "resumes": 1,
+    "checks": {"encryption": {"result": [...], "timing": 12.3, "records": [[category, region, id, detail], ...]}},
+    "regions": {"iter_public_instances": {"us-east-1": [...]}},
+    "probes": {"bucket": {"my-bucket": ["<CreationDate>", null]}, "user": {"alice": ["AIDA...", true]}},
+    "resource_regions": {"vol-123": "us-east-1"}
+}
+
+- completed checks keep their result, timing and finding records
+- regional scans keep the items of each finished region
+- the per-resource probes (bucket exposure, per-user MFA) keep each probed result
+  with the resource's version, so a replaced resource is probed again
+
+The findings of such a run carry "pending_checks". The next scan of the account (a
+self-invocation, or the next scheduled run) loads the checkpoint and only does the work
+that is missing. A checkpoint older than SCAN_CHECKPOINT_MAX_AGE_MINUTES is discarded, and
+after SCAN_MAX_RESUMES resumes the deadline is ignored so the scan always completes.
+"""
+
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_SCAN_CHECKPOINT_MAX_AGE_MINUTES = 120
+DEFAULT_SCAN_MAX_RESUMES = 5
+CHECKPOINT_VERSION = 1
+
+# Returned by probe_result() for resources without a saved result
+MISSING = object()
+
+
+class ScanDeadlineExceeded(Exception):
+    """
+    Raised by a check that stopped at the scan deadline with its progress checkpointed.
+    """
+
+
+class ScanCheckpoint:
+    """
+    Work finished by earlier invocations of a scan plus the work of this one.
+    All methods are safe to call from the check threads.
+    """
+
+    def __init__(self, previous: Dict[str, any] = None,
+                 max_age_minutes: float = DEFAULT_SCAN_CHECKPOINT_MAX_AGE_MINUTES):
+        previous = previous or {}
+        if previous.get("version") != CHECKPOINT_VERSION \
+                or time.time() - previous.get("started_at", 0) > max_age_minutes * 60:
+            previous = {}
+        self.resumed = bool(previous)
+        self.started_at = previous.get("started_at", time.time())
+        self.resumes = previous.get("resumes", 0)
+        self.checks = previous.get("checks", {})
+        self.regions = previous.get("regions", {})
+        self.probes = previous.get("probes", {})
+        self.resource_regions = previous.get("resource_regions", {})
+        self._lock = threading.Lock()
+
+    def completed_check(self, name: str) -> Optional[Dict[str, any]]:
+        """
+        The saved {"result", "timing", "records"} of a check finished earlier, or None.
+        """
+        return self.checks.get(name)
+
+    def record_check(self, name: str, result, timing: float, records: Iterable[Tuple[str, str, str, str]]):
+        """
+        Saves a finished check with its (category, region, resource ID, detail) records.
+        Its region and probe progress is no longer needed.
+        """
+        with self._lock:
+            self.checks[name] = {"result": result, "timing": timing, "records": [list(record) for record in records]}
+
+    def region_items(self, scan_name: str, region: str) -> Optional[List[any]]:
+        """
+        The items of a regional scan finished earlier, or None.
+        """
+        return self.regions.get(scan_name, {}).get(region)
+
+    def record_region(self, scan_name: str, region: str, items: List[any]):
+        with self._lock:
+            self.regions.setdefault(scan_name, {})[region] = items
+
+    def probe_result(self, kind: str, name: str, version: str):
+        """
+        The saved probe result of a resource, or MISSING if it wasn't probed or was replaced since.
+        """
+        entry = self.probes.get(kind, {}).get(name)
+        if entry is None or entry[0] != version:
+            return MISSING
+        return entry[1]
+
+    def record_probe(self, kind: str, name: str, version: str, result):
+        with self._lock:
+            self.probes.setdefault(kind, {})[name] = [version, result]
+
+    def to_dict(self, resource_regions: Dict[str, str] = None) -> Dict[str, any]:
+        """
+        The checkpoint to save, counting the invocation that saves it as a resume.
+        """
+        with self._lock:
+            return {
+                "version": CHECKPOINT_VERSION,
+                "started_at": self.started_at,
+                "resumes": self.resumes + 1,
+                "checks": dict(self.checks),
+                "regions": {name: dict(regions) for name, regions in self.regions.items()},
+                "probes": {kind: dict(probes) for kind, probes in self.probes.items()},
+                "resource_regions": dict(resource_regions if resource_regions is not None else self.resource_regions),
+            }
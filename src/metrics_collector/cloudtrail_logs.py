@@ -0,0 +1,350 @@
+"""
+CloudTrail Log Ingestion Module
+Offline analysis of CloudTrail .json.gz log files for bulk forensic sweeps
+Owner: Alejandro (Infrastructure & Metrics Architect)
+
+INTERFACE NOTES:
+check_login_attempts() uses LookupEvents, which is limited to ~2 requests per second
+and 90 days of management events. For longer or larger sweeps this module reads the
+log files a trail delivers to S3 (or a local copy of them) directly:
+
+1. list_log_files() finds every .json.gz file under a local directory or S3 prefix
+2. Worker processes decompress and parse one file each and keep only the records the
+   detectors need, in a compact form (read_log_file); each builds its own S3 client
+   rather than using the one it inherits from the parent
+3. The parent feeds those records, in event-time order, to the same LoginAnalyzer
+   check_login_attempts() uses plus an ActivityAnalyzer for suspicious API activity
+
+Files are processed in delivery-time order and records pass through a reorder buffer
+of INGEST_REORDER_SLACK_MINUTES, so the sliding-window detectors see time-ordered
+events while memory stays bounded by the slack rather than by the corpus size.
+
+Multiprocessing needs /dev/shm, which Lambda doesn't provide, so this is meant to be
+run from a workstation or container:
+    cd src && python -m metrics_collector.cloudtrail_logs s3://my-trail-bucket/AWSLogs/ --workers 8
+"""
+
+import argparse
+import gzip
+import heapq
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from metrics_collector.login_analysis import (
+    LoginAnalyzer, SlidingWindowCounter, parse_event_time, DEFAULT_LOGIN_TOP_N
+)
+from utils.aws_helpers import clear_client_cache, get_boto3_client, logger, paginate
+
+DEFAULT_INGEST_REORDER_SLACK_MINUTES = 60
+DEFAULT_ACCESS_DENIED_THRESHOLD = 20
+DEFAULT_ACCESS_DENIED_WINDOW_MINUTES = 10
+
+# Delivery time in CloudTrail log file names: <account>_CloudTrail_<region>_20250101T1205Z_<id>.json.gz
+LOG_FILE_TIME = re.compile(r'_(\d{8}T\d{4})Z_')
+
+ACCESS_DENIED_ERROR_CODES = {
+    'AccessDenied',
+    'AccessDeniedException',
+    'UnauthorizedOperation',
+    'Client.UnauthorizedOperation',
+}
+
+# API calls that weaken logging or detection, reported whenever they succeed
+DEFENSE_EVASION_EVENTS = {
+    'StopLogging',
+    'DeleteTrail',
+    'UpdateTrail',
+    'PutEventSelectors',
+    'DeleteFlowLogs',
+    'DeleteDetector',
+    'DisableSecurityHub',
+    'DeleteConfigurationRecorder',
+    'StopConfigurationRecorder',
+}
+
+
+def is_s3_location(location: str) -> bool:
+    return location.startswith('s3://')
+
+
+def _split_s3_location(location: str) -> Tuple[str, str]:
+    bucket, _, prefix = location[len('s3://'):].partition('/')
+    return bucket, prefix
+
+
+def list_log_files(location: str) -> List[str]:
+    """
+    Lists the CloudTrail log files under a location, in delivery-time order.
+
+    Args:
+        location: Local directory or s3://bucket/prefix
+
+    Returns:
+        Local paths or s3:// URLs of every .json.gz file
+    """
+    if is_s3_location(location):
+        bucket, prefix = _split_s3_location(location)
+        files = [
+            f"s3://{bucket}/{obj['Key']}"
+            for obj in paginate(get_boto3_client('s3', region=None), 'list_objects_v2', 'Contents',
+                                Bucket=bucket, Prefix=prefix)
+            if obj['Key'].endswith('.json.gz')
+        ]
+    else:
+        files = [
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(location)
+            for name in names
+            if name.endswith('.json.gz')
+        ]
+    return sorted(files, key=lambda path: (log_file_time(path) or 0.0, path))
+
+
+def log_file_time(path: str) -> Optional[float]:
+    """
+    Delivery time encoded in a CloudTrail log file name, as a POSIX timestamp.
+    """
+    match = LOG_FILE_TIME.search(os.path.basename(path))
+    if not match:
+        return None
+    return datetime.strptime(match.group(1) + '+0000', '%Y%m%dT%H%M%z').timestamp()
+
+
+def _is_relevant(record: Dict[str, any]) -> bool:
+    return (
+        record.get('eventName') == 'ConsoleLogin'
+        or bool(record.get('errorCode'))
+        or (record.get('userIdentity') or {}).get('type') == 'Root'
+        or record.get('eventName') in DEFENSE_EVASION_EVENTS
+    )
+
+
+def _compact(record: Dict[str, any]) -> Dict[str, any]:
+    """
+    Keeps only the fields the detectors read, to cut the cost of returning records
+    from worker processes.
+    """
+    identity = record.get('userIdentity') or {}
+    compact = {
+        'eventName': record.get('eventName'),
+        'eventSource': record.get('eventSource'),
+        'sourceIPAddress': record.get('sourceIPAddress'),
+        'userIdentity': {key: identity[key] for key in ('type', 'userName', 'arn') if key in identity},
+    }
+    for key in ('errorCode', 'errorMessage', 'awsRegion', 'recipientAccountId'):
+        if record.get(key):
+            compact[key] = record[key]
+    console_login = (record.get('responseElements') or {}).get('ConsoleLogin')
+    if console_login:
+        compact['responseElements'] = {'ConsoleLogin': console_login}
+    user_name = (record.get('additionalEventData') or {}).get('UserName')
+    if user_name:
+        compact['additionalEventData'] = {'UserName': user_name}
+    return compact
+
+
+def read_log_file(path: str) -> Tuple[str, int, List[Tuple[float, Dict[str, any]]]]:
+    """
+    Decompresses and parses one log file.
+
+    Runs in a worker process. Only records a detector may use are returned.
+
+    Returns:
+        (path, total record count, [(event timestamp, compact record), ...])
+    """
+    if is_s3_location(path):
+        bucket, key = _split_s3_location(path)
+        body = get_boto3_client('s3', region=None).get_object(Bucket=bucket, Key=key)['Body'].read()
+    else:
+        with open(path, 'rb') as f:
+            body = f.read()
+
+    records = json.loads(gzip.decompress(body)).get('Records', [])
+    relevant = []
+    for record in records:
+        if not _is_relevant(record):
+            continue
+        timestamp = parse_event_time(record.get('eventTime'))
+        if timestamp is not None:
+            relevant.append((timestamp, _compact(record)))
+    relevant.sort(key=lambda item: item[0])
+    return path, len(records), relevant
+
+
+def _read_log_file_safe(path: str):
+    try:
+        return read_log_file(path)
+    except Exception as e:
+        # One corrupt or unreadable file shouldn't abort a sweep over thousands
+        return path, 0, e
+
+
+class ActivityAnalyzer:
+    """
+    Detects suspicious API activity: bursts of access-denied errors per principal,
+    root account usage and calls that disable logging or detection.
+    """
+
+    def __init__(self, threshold: int = None, window_minutes: float = None, sample_size: int = 50):
+        self.threshold = threshold or int(
+            os.environ.get('ACCESS_DENIED_THRESHOLD', DEFAULT_ACCESS_DENIED_THRESHOLD))
+        window_minutes = window_minutes or float(
+            os.environ.get('ACCESS_DENIED_WINDOW_MINUTES', DEFAULT_ACCESS_DENIED_WINDOW_MINUTES))
+        self.window_seconds = window_minutes * 60
+        self.sample_size = sample_size
+        self.access_denied = {}
+        self.access_denied_count = 0
+        self.root_activity_count = 0
+        self.root_activity = []
+        self.defense_evasion = []
+
+    def add(self, record: Dict[str, any], timestamp: float):
+        identity = record.get('userIdentity') or {}
+        principal = identity.get('arn') or identity.get('userName') or 'Unknown'
+        event = {
+            "time": datetime.utcfromtimestamp(timestamp).isoformat(),
+            "event_name": record.get('eventName'),
+            "principal": principal,
+            "source_ip": record.get('sourceIPAddress', 'Unknown'),
+        }
+
+        if record.get('errorCode') in ACCESS_DENIED_ERROR_CODES:
+            self.access_denied_count += 1
+            counter = self.access_denied.get(principal)
+            if counter is None:
+                counter = self.access_denied[principal] = SlidingWindowCounter(self.window_seconds)
+            counter.add(timestamp)
+        if identity.get('type') == 'Root' and record.get('eventName') != 'ConsoleLogin':
+            self.root_activity_count += 1
+            if len(self.root_activity) < self.sample_size:
+                self.root_activity.append(event)
+        if record.get('eventName') in DEFENSE_EVASION_EVENTS and not record.get('errorCode'):
+            if len(self.defense_evasion) < self.sample_size:
+                self.defense_evasion.append(event)
+
+    def summary(self, top_n: int = DEFAULT_LOGIN_TOP_N) -> Dict[str, any]:
+        top = heapq.nlargest(top_n, self.access_denied.items(), key=lambda item: item[1].total)
+        return {
+            "access_denied_count": self.access_denied_count,
+            "access_denied_by_principal": [dict({"principal": key}, **counter.summary()) for key, counter in top],
+            "access_denied_suspects": sorted(
+                (dict({"principal": key}, **counter.summary())
+                 for key, counter in self.access_denied.items() if counter.peak >= self.threshold),
+                key=lambda suspect: -suspect["max_failures_in_window"]
+            ),
+            "root_activity_count": self.root_activity_count,
+            "root_activity": self.root_activity,
+            "defense_evasion": self.defense_evasion,
+        }
+
+
+def _init_worker():
+    """
+    Pool initializer: a forked worker inherits the parent's cached boto3 sessions and
+    clients, whose connection pools must not be shared across processes, so it starts
+    with an empty client registry.
+    """
+    clear_client_cache()
+
+
+def _parsed_files(files: List[str], workers: int) -> Iterator[Tuple[str, int, any]]:
+    if workers <= 1:
+        yield from map(_read_log_file_safe, files)
+        return
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        # imap keeps delivery-time order for the reorder buffer
+        yield from pool.imap(_read_log_file_safe, files, chunksize=4)
+
+
+def ingest_cloudtrail_logs(location: str, workers: int = None, reorder_slack_minutes: float = None) -> Dict[str, any]:
+    """
+    Runs the failed-login and suspicious-activity detectors over CloudTrail log files.
+
+    Args:
+        location: Local directory or s3://bucket/prefix of the trail's log files
+        workers: Parsing processes (default: CPU count; 1 parses in-process)
+        reorder_slack_minutes: How late a record may be relative to its file's
+            delivery time and still be analysed in order
+
+    Returns:
+        {"login_attempts": ..., "suspicious_activity": ..., "ingestion": {...}}
+    """
+    workers = workers or os.cpu_count() or 1
+    slack = 60 * (reorder_slack_minutes or float(
+        os.environ.get('INGEST_REORDER_SLACK_MINUTES', DEFAULT_INGEST_REORDER_SLACK_MINUTES)))
+
+    start = time.perf_counter()
+    files = list_log_files(location)
+    logins = LoginAnalyzer()
+    activity = ActivityAnalyzer()
+    total_records = 0
+    failed_files = []
+
+    # Min-heap of (timestamp, sequence, record) waiting for the watermark to pass
+    pending = []
+    sequence = 0
+
+    def release(watermark: float):
+        while pending and pending[0][0] <= watermark:
+            timestamp, _, record = heapq.heappop(pending)
+            if record.get('eventName') == 'ConsoleLogin':
+                logins.add(record, timestamp)
+            else:
+                activity.add(record, timestamp)
+
+    for path, record_count, relevant in _parsed_files(files, workers):
+        if isinstance(relevant, Exception):
+            logger.warning(f"Skipping unreadable CloudTrail log file {path}: {relevant}")
+            failed_files.append(path)
+            continue
+        total_records += record_count
+        for timestamp, record in relevant:
+            heapq.heappush(pending, (timestamp, sequence, record))
+            sequence += 1
+        file_time = log_file_time(path)
+        if file_time is None and relevant:
+            file_time = relevant[0][0]
+        if file_time is not None:
+            release(file_time - slack)
+    release(float('inf'))
+
+    elapsed = time.perf_counter() - start
+    return {
+        "login_attempts": logins.summary(),
+        "suspicious_activity": activity.summary(),
+        "ingestion": {
+            "files": len(files),
+            "failed_files": failed_files,
+            "records": total_records,
+            "seconds": round(elapsed, 3),
+            "records_per_second": round(total_records / elapsed) if elapsed else None,
+            "workers": workers,
+        },
+    }
+
+
+# ------------------------------------------------------------------------------------
+# COMMAND LINE
+# ------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse CloudTrail log files for failed logins and suspicious activity")
+    parser.add_argument('location', help='local directory or s3://bucket/prefix of CloudTrail log files')
+    parser.add_argument('--workers', type=int, help='parsing processes (default: CPU count)')
+    parser.add_argument('--reorder-slack-minutes', type=float, help='maximum record lateness within a file')
+    args = parser.parse_args()
+
+    results = ingest_cloudtrail_logs(args.location, args.workers, args.reorder_slack_minutes)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
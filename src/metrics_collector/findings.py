@@ -0,0 +1,205 @@
+"""
+Findings Model
+Normalised per-resource finding records streamed out of the security checks
+Owner: Alejandro (Infrastructure & Metrics Architect)
+
+INTERFACE NOTES:
+Every check in metrics_collector.py adds its findings to the run's FindingsBuilder,
+next to the result shape it has always returned (ID lists for encryption, dicts of
+lists for exposure, rule dicts for security_groups) that alerting and the reports read.
+collect_security_metrics() returns the findings of the checks that completed as
+findings["records"], a FindingRecords sequence of Finding records:
+
+    Finding(account_id='111122223333', region='us-east-1', check='security_groups',
+            category='security_groups', resource_id='sg-123', detail='tcp:22-22',
+            severity='high')
+
+Global resources (S3 buckets, IAM users) have an empty region, and findings of the
+account the Lambda runs in have an empty account_id. Severity is the one of the
+category's security rule (see utils/rules_engine.py).
+
+FindingRecords is array-backed: all fields except the resource ID repeat across many
+findings, so each distinct (account, region, check, category, detail, severity)
+context is stored once and a finding is a 4-byte context code plus a reference to its
+resource ID string (the same object as in the check's result). That is about 12 bytes
+per finding, against roughly 280 for a dict with the same fields, and nothing for the
+garbage collector to track. Finding objects are only created while iterating.
+"""
+
+import os
+import sys
+import threading
+from array import array
+from typing import Dict, Iterable, Iterator, Tuple
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.rules_engine import get_rules
+
+# Fields shared by the findings of one context, in storage order
+CONTEXT_FIELDS = ("account_id", "region", "check", "category", "detail", "severity")
+
+
+class Finding:
+    """
+    One non-compliant resource (or security group rule) found by a check.
+    """
+
+    __slots__ = ("account_id", "region", "check", "category", "resource_id", "detail", "severity")
+
+    def __init__(self, account_id: str, region: str, check: str, category: str,
+                 resource_id: str, detail: str = "", severity: str = ""):
+        self.account_id = account_id
+        self.region = region
+        self.check = check
+        self.category = category
+        self.resource_id = resource_id
+        self.detail = detail
+        self.severity = severity
+
+    @property
+    def key(self) -> str:
+        """
+        Stable key of the finding, as in scan_state.finding_keys().
+        """
+        return f"{self.resource_id}:{self.detail}" if self.detail else self.resource_id
+
+    def to_dict(self) -> Dict[str, str]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"Finding({fields})"
+
+
+class FindingRecords:
+    """
+    An append-only sequence of findings, stored as context codes plus resource IDs
+    (see module notes). Not thread-safe; FindingsBuilder serialises its writers.
+    """
+
+    __slots__ = ("contexts", "codes", "resource_ids", "_context_codes")
+
+    def __init__(self):
+        self.contexts = []
+        self.codes = array('I')
+        self.resource_ids = []
+        self._context_codes = {}
+
+    def context_code(self, context: Tuple[str, ...]) -> int:
+        """
+        Code of a CONTEXT_FIELDS tuple, added on first use.
+        """
+        code = self._context_codes.get(context)
+        if code is None:
+            code = self._context_codes[context] = len(self.contexts)
+            self.contexts.append(context)
+        return code
+
+    def append(self, account_id: str, region: str, check: str, category: str,
+               resource_id: str, detail: str = "", severity: str = ""):
+        self.codes.append(self.context_code((account_id, region, check, category, detail, severity)))
+        self.resource_ids.append(resource_id)
+
+    def extend(self, other: "FindingRecords", checks: Iterable[str] = None):
+        """
+        Appends the findings of another FindingRecords, optionally only those of the given checks.
+        """
+        remap = {}
+        for code, context in enumerate(other.contexts):
+            if checks is None or context[2] in checks:
+                remap[code] = self.context_code(context)
+        if checks is None:
+            self.codes.extend(array('I', [remap[code] for code in other.codes]))
+            self.resource_ids.extend(other.resource_ids)
+            return
+        for code, resource_id in zip(other.codes, other.resource_ids):
+            new_code = remap.get(code)
+            if new_code is not None:
+                self.codes.append(new_code)
+                self.resource_ids.append(resource_id)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index: int) -> Finding:
+        account_id, region, check, category, detail, severity = self.contexts[self.codes[index]]
+        return Finding(account_id, region, check, category, self.resource_ids[index], detail, severity)
+
+    def __iter__(self) -> Iterator[Finding]:
+        contexts = self.contexts
+        for code, resource_id in zip(self.codes, self.resource_ids):
+            account_id, region, check, category, detail, severity = contexts[code]
+            yield Finding(account_id, region, check, category, resource_id, detail, severity)
+
+
+class FindingsBuilder:
+    """
+    Collects the findings of one collect_security_metrics() run.
+    Checks running in parallel threads add to the same builder.
+    """
+
+    def __init__(self, account_id: str = None, severities: Dict[str, str] = None):
+        """
+        Args:
+            account_id: Scanned account (None or '' for the account the Lambda runs in)
+            severities: Category -> severity (default: from the enabled security rules)
+        """
+        if severities is None:
+            severities = {rule.id: rule.severity for rule in get_rules()}
+        self.account_id = account_id or ""
+        self.records = FindingRecords()
+        self._severities = severities
+        self._lock = threading.Lock()
+
+    def extend(self, check: str, category: str, items: Iterable[Tuple[str, str, str]]) -> int:
+        """
+        Adds the findings of one category.
+
+        Args:
+            check: SECURITY_CHECKS name of the check that found them
+            category: Findings category (e.g. 'public_s3_buckets')
+            items: (region, resource ID, detail) per finding; region and detail may be ''
+
+        Returns:
+            Number of findings added
+        """
+        items = list(items)
+        severity = self._severities.get(category, "")
+        with self._lock:
+            records = self.records
+            codes = {}
+            for region, resource_id, detail in items:
+                code = codes.get((region, detail))
+                if code is None:
+                    code = codes[(region, detail)] = records.context_code(
+                        (self.account_id, region or "", check, category, detail or "", severity)
+                    )
+                records.codes.append(code)
+                records.resource_ids.append(resource_id)
+        return len(items)
+
+    def completed(self, failed_checks: Iterable[str] = ()) -> FindingRecords:
+        """
+        A copy of the findings of every check except the failed ones. A check that
+        timed out may still be adding findings in the background; those are left out too.
+        """
+        failed = set(failed_checks)
+        completed = FindingRecords()
+        with self._lock:
+            if failed:
+                checks = {context[2] for context in self.records.contexts} - failed
+                completed.extend(self.records, checks)
+            else:
+                completed.extend(self.records)
+        return completed
+
+
+def merge_records(records: Iterable[FindingRecords]) -> FindingRecords:
+    """
+    Concatenates the findings of several runs, e.g. one per account.
+    """
+    merged = FindingRecords()
+    for account_records in records:
+        merged.extend(account_records)
+    return merged
@@ -0,0 +1,217 @@
+"""
+Login Analysis Module
+Streaming aggregation of ConsoleLogin events for failed-login and brute-force detection
+Owner: Alejandro (Infrastructure & Metrics Architect)
+
+INTERFACE NOTES:
+LoginAnalyzer consumes one parsed CloudTrail record at a time, so check_login_attempts()
+can feed it straight from the LookupEvents paginator without holding the event window
+in memory. State is bounded by:
+- the number of tracked users / source IPs (LOGIN_MAX_TRACKED_KEYS, further keys are
+  only counted in "untracked_failures": the failures missing from by_user or
+  by_source_ip, each counted once)
+- the failures inside one sliding window per tracked key
+- a fixed-size sample of the most recent failures for the report (LOGIN_SAMPLE_SIZE)
+
+A user or source IP is a brute-force suspect when it has at least
+BRUTE_FORCE_THRESHOLD failures within any BRUTE_FORCE_WINDOW_MINUTES window.
+"""
+
+import heapq
+import os
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DEFAULT_BRUTE_FORCE_THRESHOLD = 5
+DEFAULT_BRUTE_FORCE_WINDOW_MINUTES = 10
+DEFAULT_LOGIN_SAMPLE_SIZE = 50
+DEFAULT_LOGIN_MAX_TRACKED_KEYS = 10000
+DEFAULT_LOGIN_TOP_N = 10
+
+
+class SlidingWindowCounter:
+    """
+    Failure timestamps of one user or source IP inside the current window.
+
+    Events may arrive newest-first (LookupEvents) or oldest-first (log files), as
+    long as the order is consistent; only the timestamps within window_seconds of
+    the latest one are kept.
+    """
+
+    __slots__ = ("window_seconds", "timestamps", "total", "peak", "first_seen", "last_seen")
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.timestamps = deque()
+        self.total = 0
+        self.peak = 0
+        self.first_seen = None
+        self.last_seen = None
+
+    def add(self, timestamp: float):
+        self.timestamps.append(timestamp)
+        while abs(timestamp - self.timestamps[0]) > self.window_seconds:
+            self.timestamps.popleft()
+        self.total += 1
+        self.peak = max(self.peak, len(self.timestamps))
+        self.first_seen = timestamp if self.first_seen is None else min(self.first_seen, timestamp)
+        self.last_seen = timestamp if self.last_seen is None else max(self.last_seen, timestamp)
+
+    def summary(self) -> Dict[str, any]:
+        return {
+            "failures": self.total,
+            "max_failures_in_window": self.peak,
+            "first_seen": _isoformat(self.first_seen),
+            "last_seen": _isoformat(self.last_seen),
+        }
+
+
+def is_failed_login(record: Dict[str, any]) -> bool:
+    """
+    True if a ConsoleLogin CloudTrail record is a failed sign-in.
+
+    Failures have responseElements.ConsoleLogin = "Failure", or an errorCode /
+    errorMessage (e.g., "Failed authentication", "AccessDenied").
+    """
+    response_elements = record.get('responseElements') or {}
+    return (
+        response_elements.get('ConsoleLogin') == 'Failure'
+        or bool(record.get('errorCode'))
+        or bool(record.get('errorMessage'))
+    )
+
+
+def login_user(record: Dict[str, any]) -> str:
+    """
+    User name of a ConsoleLogin record; failed sign-ins for unknown users only carry
+    it in additionalEventData or the ARN.
+    """
+    identity = record.get('userIdentity') or {}
+    return (
+        identity.get('userName')
+        or (record.get('additionalEventData') or {}).get('UserName')
+        or (identity.get('arn') or '').rsplit('/', 1)[-1]
+        or 'Unknown'
+    )
+
+
+def parse_event_time(value: str) -> Optional[float]:
+    """
+    Converts a CloudTrail eventTime ("2025-01-01T12:00:00Z") to a POSIX timestamp.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.utcfromtimestamp(timestamp).isoformat()
+
+
+class LoginAnalyzer:
+    """
+    Aggregates ConsoleLogin records per user and per source IP.
+    """
+
+    def __init__(self, threshold: int = None, window_minutes: float = None,
+                 sample_size: int = None, max_tracked_keys: int = None):
+        self.threshold = threshold or int(
+            os.environ.get('BRUTE_FORCE_THRESHOLD', DEFAULT_BRUTE_FORCE_THRESHOLD))
+        window_minutes = window_minutes or float(
+            os.environ.get('BRUTE_FORCE_WINDOW_MINUTES', DEFAULT_BRUTE_FORCE_WINDOW_MINUTES))
+        self.window_seconds = window_minutes * 60
+        self.sample_size = sample_size or int(os.environ.get('LOGIN_SAMPLE_SIZE', DEFAULT_LOGIN_SAMPLE_SIZE))
+        self.max_tracked_keys = max_tracked_keys or int(
+            os.environ.get('LOGIN_MAX_TRACKED_KEYS', DEFAULT_LOGIN_MAX_TRACKED_KEYS))
+
+        self.events_scanned = 0
+        self.failed_count = 0
+        self.untracked_failures = 0
+        self.by_user = {}
+        self.by_source_ip = {}
+        # Min-heap of (timestamp, sequence, failure) holding the most recent failures
+        self._sample = []
+
+    def add(self, record: Dict[str, any], timestamp: float = None):
+        """
+        Adds one parsed ConsoleLogin record.
+
+        Args:
+            record: CloudTrail record (the parsed CloudTrailEvent of a LookupEvents result)
+            timestamp: Event time as a POSIX timestamp; parsed from eventTime if omitted
+        """
+        self.events_scanned += 1
+        if not is_failed_login(record):
+            return
+        if timestamp is None:
+            timestamp = parse_event_time(record.get('eventTime'))
+        self.failed_count += 1
+
+        user = login_user(record)
+        source_ip = record.get('sourceIPAddress') or 'Unknown'
+        if timestamp is not None:
+            user_tracked = self._count(self.by_user, user, timestamp)
+            source_ip_tracked = self._count(self.by_source_ip, source_ip, timestamp)
+            # Once per failure, however many of its keys were over the limit
+            if not (user_tracked and source_ip_tracked):
+                self.untracked_failures += 1
+
+        failure = (timestamp or 0.0, self.failed_count, {
+            "time": _isoformat(timestamp),
+            "user": user,
+            "source_ip": source_ip,
+            "error_message": record.get('errorMessage', ''),
+            "error_code": record.get('errorCode', ''),
+        })
+        if len(self._sample) < self.sample_size:
+            heapq.heappush(self._sample, failure)
+        elif self._sample and failure[:2] > self._sample[0][:2]:
+            heapq.heapreplace(self._sample, failure)
+
+    def _count(self, counters: Dict[str, SlidingWindowCounter], key: str, timestamp: float) -> bool:
+        """
+        Counts a failure under its key; False if the key is new and max_tracked_keys are tracked.
+        """
+        counter = counters.get(key)
+        if counter is None:
+            if len(counters) >= self.max_tracked_keys:
+                return False
+            counter = counters[key] = SlidingWindowCounter(self.window_seconds)
+        counter.add(timestamp)
+        return True
+
+    def _top(self, counters: Dict[str, SlidingWindowCounter], label: str, top_n: int) -> List[Dict[str, any]]:
+        top = heapq.nlargest(top_n, counters.items(), key=lambda item: item[1].total)
+        return [dict({label: key}, **counter.summary()) for key, counter in top]
+
+    def _suspects(self, counters: Dict[str, SlidingWindowCounter], label: str) -> List[Dict[str, any]]:
+        return sorted(
+            (dict({label: key}, **counter.summary())
+             for key, counter in counters.items() if counter.peak >= self.threshold),
+            key=lambda suspect: -suspect["max_failures_in_window"]
+        )
+
+    def summary(self, top_n: int = DEFAULT_LOGIN_TOP_N) -> Dict[str, any]:
+        """
+        Returns the aggregated results in the check_login_attempts() format.
+        """
+        return {
+            "failed_login_count": self.failed_count,
+            "failed_logins": [failure for _, _, failure in sorted(self._sample, reverse=True)],
+            "events_scanned": self.events_scanned,
+            "by_user": self._top(self.by_user, "user", top_n),
+            "by_source_ip": self._top(self.by_source_ip, "source_ip", top_n),
+            "brute_force_suspects": {
+                "users": self._suspects(self.by_user, "user"),
+                "source_ips": self._suspects(self.by_source_ip, "source_ip"),
+                "threshold": self.threshold,
+                "window_minutes": self.window_seconds / 60,
+            },
+            "untracked_failures": self.untracked_failures,
+        }
@@ -10,32 +10,246 @@ You choose which 3-5 metrics to implement - just make sure the return format is
 Feel free to reach out if you want to discuss the interface or have suggestions!
 """
 
-import boto3
+import contextvars
+import csv
+import io
 import json
-from typing import Dict, List
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
 from datetime import datetime, timedelta
 
-ec2 = boto3.client('ec2')
-s3 = boto3.client('s3')
-iam = boto3.client('iam')
-cloudtrail = boto3.client('cloudtrail')
-logs = boto3.client('logs')
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from metrics_collector.checkpoint import (
+    DEFAULT_SCAN_CHECKPOINT_MAX_AGE_MINUTES, DEFAULT_SCAN_MAX_RESUMES, MISSING, ScanCheckpoint, ScanDeadlineExceeded,
+)
+from metrics_collector.findings import FindingsBuilder
+from metrics_collector.login_analysis import LoginAnalyzer
+from metrics_collector.s3_exposure import (
+    blocks_public_access, bucket_exposure, get_account_public_access_block, invalidate_bucket_exposure,
+    probe_bucket_exposure,
+)
+from metrics_collector.scan_state import DEFAULT_INCREMENTAL_MAX_AGE_HOURS, ScanSnapshot, security_group_key
+from metrics_collector.sg_rules import attached_group_ids, exposed_rules, referenced_prefix_lists
+from utils.aws_helpers import AdaptiveThrottle, TokenBucket, get_boto3_client, handle_error, logger, paginate
+from utils.instrumentation import profile_thread
+from utils.inventory_cache import begin_inventory_run, get_inventory, invalidate_inventory, inventory_stats, save_inventory
+from utils.rules_engine import enabled_checks
+from utils.state_store import load_state, save_state
 
-def check_encryption() -> List:
+# Account whose resources the current collect_security_metrics() run scans, and the
+# STS credentials for it. None means the account the Lambda runs in.
+_scan_account = contextvars.ContextVar('scan_account', default=None)
+_scan_credentials = contextvars.ContextVar('scan_credentials', default=None)
+
+# Previous-run snapshot for incremental scans (None when INCREMENTAL_SCAN is off)
+_scan_snapshot = contextvars.ContextVar('scan_snapshot', default=None)
+
+# Finding records of the current run (None when a check is called on its own), see findings.py
+_findings_builder = contextvars.ContextVar('findings_builder', default=None)
+
+# time.monotonic() at which the current run's checks stop starting new work (None: no
+# limit), and the checkpoint their progress goes into, see checkpoint.py
+_scan_deadline = contextvars.ContextVar('scan_deadline', default=None)
+_scan_checkpoint = contextvars.ContextVar('scan_checkpoint', default=None)
+
+# The check a thread runs, and the regions and resources the current run's checks
+# couldn't evaluate: check -> kind ("regions", "buckets") -> name -> error.
+# Returned as findings["partial_errors"]
+_current_check = contextvars.ContextVar('current_check', default=None)
+_partial_errors = contextvars.ContextVar('partial_errors', default=None)
+_partial_errors_lock = threading.Lock()
+
+def _past_deadline(deadline: float) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+def _record_partial_error(kind: str, name: str, error: Exception):
     """
-    Checks for
-    - EBS volume encryption
+    Records a region or resource the running check couldn't evaluate. The check still
+    reports the rest, and the run's snapshot diff carries the skipped findings forward.
+    """
+    check = _current_check.get()
+    partial_errors = _partial_errors.get()
+    if check is None or partial_errors is None:
+        return
+    with _partial_errors_lock:
+        partial_errors.setdefault(check, {}).setdefault(kind, {})[name] = str(error)
+
+def get_client(service_name: str, region: str = None, retries: bool = True):
+    """
+    Returns a client for the account being scanned by the current run.
+    
+    Clients come from the shared registry in aws_helpers and are only built on
+    first use, so a cold start doesn't pay for services no enabled check calls.
+    
+    Args:
+        service_name: AWS service name (e.g., 'ec2', 's3', 'iam', 'cloudtrail')
+        region: AWS region (default: the Lambda's region)
+        retries: False for calls retried by an AdaptiveThrottle, see get_boto3_client()
+    """
+    return get_boto3_client(service_name, region, credentials=_scan_credentials.get(), retries=retries)
+
+# ------------------------------------------------------------------------------------
+# MULTI-REGION SCANNING
+# ------------------------------------------------------------------------------------
+
+DEFAULT_REGION_MAX_CONCURRENCY = 8
+
+# Region of every regional finding from the current run: resource ID -> region.
+# Set per run by collect_security_metrics() and returned as findings["resource_regions"].
+_resource_regions = contextvars.ContextVar('resource_regions', default=None)
+_resource_regions_lock = threading.Lock()
+
+# Enabled regions per scanned account, cached for the lifetime of the Lambda container
+_enabled_regions = {}
+
+def discover_regions() -> Tuple[str, ...]:
+    """
+    Returns the regions enabled for the scanned account (opt-in regions only if opted in).
+    """
+    account_id = _scan_account.get()
+    if account_id not in _enabled_regions:
+        regions = get_client('ec2').describe_regions()['Regions']
+        _enabled_regions[account_id] = tuple(sorted(r['RegionName'] for r in regions))
+    return _enabled_regions[account_id]
+
+def get_scan_regions() -> List[str]:
+    """
+    Regions the EC2/EBS/security-group checks run against, from SCAN_REGIONS:
+    - unset: only the Lambda's own region (original behaviour)
+    - "all": every enabled region, discovered via DescribeRegions
+    - "us-east-1,eu-west-1": an explicit comma-separated list
+    """
+    setting = os.environ.get("SCAN_REGIONS", "").strip()
+    if not setting:
+        return [get_client('ec2').meta.region_name]
+    if setting.lower() == "all":
+        return list(discover_regions())
+    return [region.strip() for region in setting.split(",") if region.strip()]
+
+def scan_regions(iter_func: Callable[[any], Iterator[any]], max_concurrency: int = None) -> List[Tuple[str, any]]:
     """
+    Runs a regional generator against every scan region in parallel.
+    
+    Each region gets its own EC2 client and at most max_concurrency regions are
+    scanned at once, so the runtime approaches the slowest region rather than the
+    sum of all regions. A failing region is logged and skipped, recorded as a partial
+    error of the check (findings["partial_errors"]) and, in an incremental scan, its
+    previous findings are carried forward; the error is only raised if every region
+    fails. In a resumable run, regions finished by an earlier
+    invocation are taken from the checkpoint, and regions not started by the scan
+    deadline raise ScanDeadlineExceeded once the others are done.
+    
+    Args:
+        iter_func: Generator function taking an EC2 client (e.g., iter_unencrypted_volumes)
+        max_concurrency: Parallel regions (default: REGION_MAX_CONCURRENCY env var or 8)
+        
+    Returns:
+        List of (region, item) pairs in region order
+    """
+    if max_concurrency is None:
+        max_concurrency = int(os.environ.get("REGION_MAX_CONCURRENCY", DEFAULT_REGION_MAX_CONCURRENCY))
+    regions = get_scan_regions()
+
+    # Create clients up front: boto3 sessions are not safe to use from many threads
+    clients = {region: get_client('ec2', region) for region in regions}
+
+    checkpoint, deadline = _scan_checkpoint.get(), _scan_deadline.get()
+    scan_name = iter_func.__name__
+
+    def scan(region):
+        items = checkpoint.region_items(scan_name, region) if checkpoint is not None else None
+        if items is None:
+            if _past_deadline(deadline):
+                return None, None
+            try:
+                items = list(iter_func(clients[region]))
+            except Exception as e:
+                handle_error(e, f"{scan_name}({region})")
+                return [], e
+            if checkpoint is not None:
+                checkpoint.record_region(scan_name, region, items)
+        return [(region, item) for item in items], None
+
+    # Each region runs in a copy of the run's context, so inventories stay keyed by
+    # the scanned account and shared within the run
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(regions)))) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, scan, region) for region in regions]
+        results = [future.result() for future in futures]
+    if any(region_items is None for region_items, _ in results):
+        raise ScanDeadlineExceeded(f"{scan_name} stopped at the scan deadline")
+
+    errors = {region: error for region, (_, error) in zip(regions, results) if error is not None}
+    if errors and len(errors) == len(regions):
+        raise next(iter(errors.values()))
+    snapshot, check = _scan_snapshot.get(), _current_check.get()
+    for region, error in errors.items():
+        _record_partial_error("regions", region, error)
+        if snapshot is not None and check is not None:
+            snapshot.skip_region(check, region)
+
+    return [pair for region_items, _ in results for pair in region_items]
+
+def _tag_regions(tagged_ids: List[Tuple[str, str]]) -> List[str]:
+    """
+    Records the region of each (region, resource ID) pair and returns the IDs.
+    """
+    resource_regions = _resource_regions.get()
+    if resource_regions is not None:
+        with _resource_regions_lock:
+            for region, resource_id in tagged_ids:
+                resource_regions[resource_id] = region
+    return [resource_id for _, resource_id in tagged_ids]
 
-    # Checks for EBS unecrypted volumes
-    volumes = ec2.describe_volumes()['Volumes']
-    unencrypted_volumes = []
+def _inventory(resource_type: str, client, loader: Callable[[], List[any]], validate=None) -> List[any]:
+    """
+    A resource inventory of the scanned account, from the shared inventory cache.
+    Global services (S3, IAM) are cached without a region.
+    """
+    region = client.meta.region_name if client.meta.service_model.service_name == 'ec2' else None
+    return get_inventory(resource_type, loader, account_id=_scan_account.get(), region=region, validate=validate)
+
+def _record_findings(check: str, category: str, items: Iterable[Tuple[str, str, str]]):
+    """
+    Streams (region, resource ID, detail) findings into the run's FindingsBuilder.
+    """
+    builder = _findings_builder.get()
+    if builder is not None:
+        builder.extend(check, category, items)
 
+# ------------------------------------------------------------------------------------
+# CHECKS
+# ------------------------------------------------------------------------------------
+
+def iter_unencrypted_volumes(ec2_client=None) -> Iterator[str]:
+    """
+    Yields the IDs of unencrypted EBS volumes from the region's volume inventory.
+    The encrypted=false filter is applied server-side so encrypted volumes are never transferred.
+    """
+    ec2_client = ec2_client or get_client('ec2')
+    volumes = _inventory('unencrypted_volumes', ec2_client, lambda: [
+        {'VolumeId': v['VolumeId'], 'Encrypted': v['Encrypted']}
+        for v in paginate(ec2_client, 'describe_volumes', 'Volumes',
+                          Filters=[{'Name': 'encrypted', 'Values': ['false']}])
+    ])
     for v in volumes:
         if not v['Encrypted']:
-            unencrypted_volumes.append(v['VolumeId'])
-    
-    return unencrypted_volumes
+            yield v['VolumeId']
+
+def check_encryption() -> List:
+    """
+    Checks for
+    - EBS volume encryption
+    """
+
+    # Checks for EBS unecrypted volumes in every scan region
+    tagged_volumes = scan_regions(iter_unencrypted_volumes)
+    _record_findings("encryption", "encryption", ((region, volume_id, "") for region, volume_id in tagged_volumes))
+    return _tag_regions(tagged_volumes)
 
 def check_exposure() -> Dict[str, any]:
     """
@@ -44,77 +258,372 @@ def check_exposure() -> Dict[str, any]:
     - Public S3 buckets
     """
 
-    # Public EC2 IPs
-    instances = ec2.describe_instances()
-    public_IPs = []
-
-    for reservation in instances['Reservations']:
-        for instance in reservation['Instances']:  # Fixed: reservation is a dict, need to access 'Instances' key
-            if 'PublicIpAddress' in instance and instance.get('PublicIpAddress'):
-                instance_id = instance['InstanceId']
-                public_IPs.append(instance_id)
-    
-    # Public S3 buckets
-    public_buckets = []
+    # Public EC2 IPs in every scan region
+    tagged_instances = scan_regions(iter_public_instances)
+    _record_findings("exposure", "public_ec2_IPs", ((region, instance_id, "") for region, instance_id in tagged_instances))
+    public_IPs = _tag_regions(tagged_instances)
     
-    for bucket in s3.list_buckets()['Buckets']:
-        acl = s3.get_bucket_acl(Bucket=bucket['Name'])
-        for grant in acl['Grants']:
-            if 'AllUsers' in str(grant):
-                public_buckets.append(bucket['Name'])
+    # Public S3 buckets; none can be public (or need listing) if the account blocks public access
+    account_block = account_public_access_block()
+    if blocks_public_access(account_block):
+        return {
+            "public_ec2_IPs": public_IPs,
+            "public_s3_buckets": []
+        }
+
+    # CreationDate identifies the bucket version: it changes if a bucket is deleted and recreated
+    s3_client = get_client('s3')
+    bucket_versions = {
+        bucket['Name']: bucket['CreationDate']
+        for bucket in _inventory('buckets', s3_client, lambda: [
+            {'Name': bucket['Name'], 'CreationDate': str(bucket.get('CreationDate'))}
+            for bucket in paginate(s3_client, 'list_buckets', 'Buckets')
+        ])
+    }
+    public_buckets = find_public_buckets(list(bucket_versions), versions=bucket_versions,
+                                         account_block=account_block)
+    _record_findings("exposure", "public_s3_buckets", (("", name, "") for name in public_buckets))
 
     return {
         "public_ec2_IPs": public_IPs,
         "public_s3_buckets": public_buckets
     }
 
-def check_mfa_iam() -> Dict[str, any]:
+# Fields of DescribeInstances entries kept in the instance inventory
+INSTANCE_INVENTORY_FIELDS = ('InstanceId', 'PublicIpAddress', 'State', 'SubnetId', 'VpcId', 'SecurityGroups', 'Tags')
+
+def list_instances(ec2_client=None) -> List[Dict[str, any]]:
+    """
+    The region's EC2 instances (INSTANCE_INVENTORY_FIELDS only), from the inventory cache.
+    """
+    ec2_client = ec2_client or get_client('ec2')
+
+    def load():
+        return [
+            {field: instance[field] for field in INSTANCE_INVENTORY_FIELDS if field in instance}
+            for reservation in paginate(ec2_client, 'describe_instances', 'Reservations')
+            for instance in reservation['Instances']  # Fixed: reservation is a dict, need to access 'Instances' key
+        ]
+
+    return _inventory('instances', ec2_client, load)
+
+def iter_public_instances(ec2_client=None) -> Iterator[str]:
+    """
+    Yields the IDs of EC2 instances that have a public IP address.
+    """
+    for instance in list_instances(ec2_client):
+        if is_public_instance(instance):
+            yield instance['InstanceId']
+
+def is_public_instance(instance: Dict[str, any]) -> bool:
+    """
+    True if a DescribeInstances instance entry has a public IP address.
+    """
+    return 'PublicIpAddress' in instance and bool(instance.get('PublicIpAddress'))
+
+DEFAULT_S3_MAX_CONCURRENCY = 16
+
+def account_public_access_block() -> Dict[str, bool]:
+    """
+    The scanned account's Block Public Access settings (see s3_exposure.py).
+    """
+    account_id = _scan_account.get()
+    if account_id is None:
+        # Imported on demand: multi_account imports this module
+        from metrics_collector.multi_account import get_current_account_id
+        account_id = get_current_account_id()
+    return get_account_public_access_block(get_client('s3control'), account_id)
+
+def find_public_buckets(bucket_names: List[str], max_concurrency: int = None,
+                        versions: Dict[str, str] = None, account_block: Dict[str, bool] = None) -> List[str]:
+    """
+    Probes buckets concurrently and returns the names of public ones.
+    
+    At most max_concurrency probes are in flight, and all workers share one
+    AdaptiveThrottle so SlowDown/Throttling responses slow the whole fan-out down.
+    A bucket whose probe fails is not reported as private: it is recorded as a partial
+    error of the check (findings["partial_errors"]) and, in an incremental scan, its
+    previous finding is carried forward. The error is raised if every probe fails.
+    In an incremental scan, private buckets whose version is unchanged since the
+    previous snapshot are not probed again. Each probe reads the bucket's Block
+    Public Access settings first and goes through the exposure cache (s3_exposure.py).
+    In a resumable run, buckets probed by an earlier invocation aren't probed again.
+    
+    Args:
+        bucket_names: Buckets to probe
+        max_concurrency: Parallel probes (default: S3_MAX_CONCURRENCY env var or 16)
+        versions: Bucket name -> version (CreationDate) for incremental scans
+        account_block: The account's Block Public Access settings (default: read them)
+        
+    Returns:
+        Public bucket names, in the order of bucket_names
+    """
+    if max_concurrency is None:
+        max_concurrency = int(os.environ.get("S3_MAX_CONCURRENCY", DEFAULT_S3_MAX_CONCURRENCY))
+    versions = versions or {}
+    if account_block is None:
+        account_block = account_public_access_block()
+    if blocks_public_access(account_block):
+        return []
+    snapshot = _scan_snapshot.get()
+    if snapshot is not None:
+        bucket_names = [
+            name for name in bucket_names
+            if not snapshot.cached_compliant('bucket', name, versions.get(name, ''))
+        ]
+    # The probes are retried by the shared throttle, not by botocore as well
+    s3_client = get_client('s3', retries=False)
+    throttle = AdaptiveThrottle()
+    account_id = _scan_account.get()
+    checkpoint, deadline = _scan_checkpoint.get(), _scan_deadline.get()
+
+    def probe(bucket_name):
+        version = versions.get(bucket_name, '')
+        if checkpoint is not None:
+            saved = checkpoint.probe_result('bucket', bucket_name, version)
+            if saved is not MISSING:
+                return saved
+        if _past_deadline(deadline):
+            return MISSING
+        try:
+            exposure = bucket_exposure(bucket_name, s3_client, throttle, account_block,
+                                       account_id=account_id, version=version)
+        except Exception as e:
+            handle_error(e, f"check_exposure({bucket_name})")
+            return e
+        if checkpoint is not None:
+            checkpoint.record_probe('bucket', bucket_name, version, exposure is not None)
+        return exposure is not None
+
+    if not bucket_names:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(bucket_names)))) as executor:
+        results = list(executor.map(probe, bucket_names))
+    if any(is_public is MISSING for is_public in results):
+        raise ScanDeadlineExceeded("check_exposure stopped at the scan deadline")
+
+    errors = {name: result for name, result in zip(bucket_names, results) if isinstance(result, Exception)}
+    if errors and len(errors) == len(bucket_names):
+        raise next(iter(errors.values()))
+    for name, error in errors.items():
+        _record_partial_error("buckets", name, error)
+
+    if snapshot is not None:
+        for name, is_public in zip(bucket_names, results):
+            if name in errors:
+                snapshot.skip("public_s3_buckets", name)
+            else:
+                snapshot.record('bucket', name, versions.get(name, ''), not is_public)
+
+    return [name for name, is_public in zip(bucket_names, results) if is_public is True]
+
+DEFAULT_MFA_CHECK_MODE = "per_user"
+DEFAULT_IAM_RATE_LIMIT = 10
+DEFAULT_IAM_MAX_CONCURRENCY = 8
+CREDENTIAL_REPORT_POLL_SECONDS = 2
+CREDENTIAL_REPORT_MAX_POLLS = 30
+
+def check_mfa_iam(mode: str = None) -> Dict[str, any]:
     """
     Checks for
     - IAM users without MFA
     - Total numbers of users
+    
+    Two modes, selected by `mode` or the MFA_CHECK_MODE env var:
+    - "per_user" (default): one ListMFADevices call per user, run concurrently
+      under a token bucket (IAM_RATE_LIMIT calls/second) to stay inside IAM quotas
+    - "credential_report": generates the IAM credential report and reads the
+      mfa_active column, so the API call count does not grow with the user count.
+      The report can be up to 4 hours old.
     """
+    if mode is None:
+        mode = os.environ.get("MFA_CHECK_MODE", DEFAULT_MFA_CHECK_MODE)
+    iam_client = get_client('iam')
+
+    if mode == "credential_report":
+        return _check_mfa_credential_report(iam_client)
+    if mode != "per_user":
+        raise ValueError(f"Unknown MFA_CHECK_MODE: {mode}")
 
-    # List of users
-    users = iam.list_users()['Users']
+    # List of users (UserId changes if a user is deleted and recreated); a cached list
+    # from an earlier run is reused while the account's user count is unchanged, and
+    # users deleted since are skipped when their MFA devices can't be listed
+    users = _inventory(
+        'iam_users', iam_client,
+        lambda: [{'UserName': user['UserName'], 'UserId': user['UserId']}
+                 for user in paginate(iam_client, 'list_users', 'Users')],
+        validate=lambda cached: len(cached) == iam_client.get_account_summary()['SummaryMap'].get('Users'),
+    )
+    user_ids = {user['UserName']: user['UserId'] for user in users}
 
     # Check amount IAM users
-    total_users = len(users)
+    total_users = len(user_ids)
+
+    # In an incremental scan, users who had MFA at the last probe are not probed again
+    snapshot = _scan_snapshot.get()
+    user_names = [
+        name for name, user_id in user_ids.items()
+        if snapshot is None or not snapshot.cached_compliant('user', name, user_id)
+    ]
 
     # Check MFA
+    rate_limiter = TokenBucket(float(os.environ.get("IAM_RATE_LIMIT", DEFAULT_IAM_RATE_LIMIT)))
+    throttle = AdaptiveThrottle()
+    probe_client = get_client('iam', retries=False)
+    max_concurrency = int(os.environ.get("IAM_MAX_CONCURRENCY", DEFAULT_IAM_MAX_CONCURRENCY))
+
+    # In a resumable run, users probed by an earlier invocation aren't probed again
+    checkpoint, deadline = _scan_checkpoint.get(), _scan_deadline.get()
+
+    def has_mfa(user_name):
+        if checkpoint is not None:
+            saved = checkpoint.probe_result('user', user_name, user_ids[user_name])
+            if saved is not MISSING:
+                return saved
+        if _past_deadline(deadline):
+            return MISSING
+        rate_limiter.acquire()
+        try:
+            mfa_devices = throttle.call(probe_client.list_mfa_devices, UserName=user_name)
+        except Exception as e:
+            # A user deleted since the list was cached (or taken) is skipped
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') != 'NoSuchEntity':
+                raise
+            return None
+        mfa = bool(mfa_devices['MFADevices'])
+        if checkpoint is not None:
+            checkpoint.record_probe('user', user_name, user_ids[user_name], mfa)
+        return mfa
+
+    if not user_names:
+        return {"total_users": total_users, "non_compliant_users": []}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(user_names)))) as executor:
+        results = list(executor.map(has_mfa, user_names))
+    if any(mfa is MISSING for mfa in results):
+        raise ScanDeadlineExceeded("mfa_iam stopped at the scan deadline")
+
+    deleted = [name for name, mfa in zip(user_names, results) if mfa is None]
+    if deleted:
+        # The user list is stale: drop it so the next run lists the users again
+        invalidate_inventory('iam_users', _scan_account.get())
+        total_users -= len(deleted)
+
+    if snapshot is not None:
+        for name, mfa in zip(user_names, results):
+            if mfa is None:
+                # Not evaluated: any previous finding is carried forward, not resolved
+                snapshot.skip("mfa_iam", name)
+            else:
+                snapshot.record('user', name, user_ids[name], mfa)
+
+    non_compliant_users = [name for name, mfa in zip(user_names, results) if mfa is False]
+    _record_findings("mfa_iam", "mfa_iam", (("", name, "") for name in non_compliant_users))
+
+    return {
+        "total_users": total_users,
+        "non_compliant_users": non_compliant_users
+    }
+
+def _check_mfa_credential_report(iam_client) -> Dict[str, any]:
+    """
+    MFA check from the IAM credential report (one CSV covering every user).
+    """
+    # Report generation is asynchronous; poll until it is COMPLETE
+    for _ in range(CREDENTIAL_REPORT_MAX_POLLS):
+        if iam_client.generate_credential_report()['State'] == 'COMPLETE':
+            break
+        time.sleep(CREDENTIAL_REPORT_POLL_SECONDS)
+    else:
+        raise TimeoutError("IAM credential report was not generated in time")
+
+    content = iam_client.get_credential_report()['Content']
+    total_users = 0
     non_compliant_users = []
-    
-    for user in users:
-        mfa_devices = iam.list_mfa_devices(UserName = user['UserName'])
-        if not mfa_devices['MFADevices']:
-            non_compliant_users.append(user['UserName'])
+
+    for user_name, mfa_active in parse_credential_report(content):
+        total_users += 1
+        if not mfa_active:
+            non_compliant_users.append(user_name)
+    _record_findings("mfa_iam", "mfa_iam", (("", name, "") for name in non_compliant_users))
 
     return {
         "total_users": total_users,
         "non_compliant_users": non_compliant_users
     }
 
+def parse_credential_report(content: bytes):
+    """
+    Yields (user name, mfa_active) for each IAM user in a credential report CSV.
+    Rows are parsed one at a time; the root account row is skipped because
+    list_users() does not include it either.
+    """
+    lines = io.TextIOWrapper(io.BytesIO(content), encoding='utf-8', newline='')
+    for row in csv.DictReader(lines):
+        if row['user'] == '<root_account>':
+            continue
+        yield row['user'], row['mfa_active'].lower() == 'true'
+
+def iter_risky_sg_rules(ec2_client=None) -> Iterator[Dict[str, any]]:
+    """
+    Yields one entry per internet-exposed rule of the security groups in use, page by page.
+    
+    Rules are analysed by the sg_rules engine (IPv4/IPv6 ranges, managed prefix lists,
+    overly broad CIDRs). Only groups attached to an in-use network interface are
+    reported unless SG_REPORT_UNATTACHED=true, since an unattached group exposes nothing.
+    """
+    ec2_client = ec2_client or get_client('ec2')
+    attached = None
+    if os.environ.get("SG_REPORT_UNATTACHED", "").lower() != "true":
+        attached = attached_group_ids(_inventory('network_interfaces', ec2_client, lambda: [
+            {'NetworkInterfaceId': eni['NetworkInterfaceId'], 'Status': eni.get('Status'),
+             'Groups': eni.get('Groups', [])}
+            for eni in paginate(ec2_client, 'describe_network_interfaces', 'NetworkInterfaces',
+                                Filters=[{'Name': 'status', 'Values': ['in-use']}])
+        ]))
+
+    groups = [
+        sg for sg in _inventory('security_groups', ec2_client,
+                                lambda: list(paginate(ec2_client, 'describe_security_groups', 'SecurityGroups')))
+        if attached is None or sg['GroupId'] in attached
+    ]
+    prefix_lists = _prefix_list_cidrs(ec2_client, referenced_prefix_lists(groups))
+    for sg in groups:
+        yield from exposed_rules(sg, prefix_lists)
+
+def _prefix_list_cidrs(ec2_client, prefix_list_ids) -> Dict[str, List[str]]:
+    """
+    Expands managed prefix lists into their CIDRs (a list that can't be read is skipped).
+    """
+    prefix_lists = {}
+    for prefix_list_id in prefix_list_ids:
+        try:
+            prefix_lists[prefix_list_id] = [
+                entry['Cidr'] for entry in paginate(
+                    ec2_client, 'get_managed_prefix_list_entries', 'Entries', PrefixListId=prefix_list_id
+                )
+            ]
+        except Exception as e:
+            handle_error(e, f"get_managed_prefix_list_entries({prefix_list_id})")
+    return prefix_lists
+
 def check_security_groups() -> List:
     """
     Checks for
-    - Security groups across all VPCs
-    - Detect 0.0.0.0/0 rules
+    - Security groups across all VPCs that are attached to running resources
+    - Detect rules open to the internet (0.0.0.0/0, ::/0, broad CIDRs, prefix lists)
     - Lists ports exposed publicly
     """
 
-    sgs = ec2.describe_security_groups()
-
+    # Each rule entry carries the region it was found in
     risky_groups = []
-    for sg in sgs['SecurityGroups']:
-        for rule in sg['IpPermissions']:
-            if '0.0.0.0/0' in str(rule):
-                risky_groups.append({
-                    "SecurityGroupId": sg['GroupId'],
-                    "SecurityGroupName": sg.get('GroupName', 'Unknown'),
-                    "FromPort": rule.get('FromPort'),
-                    "ToPort": rule.get('ToPort'),
-                    "Protocol": rule.get('IpProtocol')
-                })
+    for region, rule in scan_regions(iter_risky_sg_rules):
+        rule["Region"] = region
+        risky_groups.append(rule)
+    _tag_regions([(rule["Region"], rule["SecurityGroupId"]) for rule in risky_groups])
+    # Keyed like scan_state: the group ID plus "<protocol>:<from>-<to>" as the detail
+    _record_findings("security_groups", "security_groups", (
+        (rule["Region"], rule["SecurityGroupId"], security_group_key(rule).split(":", 1)[1]) for rule in risky_groups
+    ))
 
     return risky_groups
 
@@ -124,14 +633,17 @@ def check_cloudtrail_status() -> Dict[str, any]:
     Returns status of CloudTrail trails
     """
     try:
-        trails = cloudtrail.list_trails()
+        cloudtrail_client = get_client('cloudtrail')
+        trails = list(paginate(cloudtrail_client, 'list_trails', 'Trails'))
         active_trails = []
         inactive_trails = []
+        trail_regions = {}
         
-        for trail_info in trails.get('Trails', []):
+        for trail_info in trails:
             trail_name = trail_info['Name']
+            trail_regions[trail_name] = trail_info.get('HomeRegion', '')
             try:
-                trail_status = cloudtrail.get_trail_status(Name=trail_name)
+                trail_status = cloudtrail_client.get_trail_status(Name=trail_name)
                 
                 if trail_status.get('IsLogging', False):
                     active_trails.append(trail_name)
@@ -141,11 +653,12 @@ def check_cloudtrail_status() -> Dict[str, any]:
                 # If we can't get status, assume inactive
                 inactive_trails.append(trail_name)
         
+        _record_findings("cloudtrail", "cloudtrail", ((trail_regions[name], name, "") for name in inactive_trails))
         return {
             "cloudtrail_enabled": len(active_trails) > 0,
             "active_trails": active_trails,
             "inactive_trails": inactive_trails,
-            "total_trails": len(trails.get('Trails', []))
+            "total_trails": len(trails)
         }
     except Exception as e:
         # If CloudTrail API fails, return that it's not configured
@@ -157,21 +670,28 @@ def check_cloudtrail_status() -> Dict[str, any]:
             "total_trails": 0
         }
 
+DEFAULT_LOGIN_LOOKBACK_HOURS = 24
+
 def check_login_attempts() -> Dict[str, any]:
     """
     Checks for failed login attempts via CloudTrail
     Uses CloudTrail LookupEvents to find ConsoleLogin failures
-    Returns failed login events from the last 24 hours
+    Returns failed login events from the last LOGIN_LOOKBACK_HOURS (default 24) hours,
+    aggregated per user and source IP with brute-force suspects
+    
+    Events are streamed page by page into a LoginAnalyzer, so memory stays bounded
+    however many sign-ins the window holds.
     """
-    failed_logins = []
+    period_hours = int(os.environ.get('LOGIN_LOOKBACK_HOURS', DEFAULT_LOGIN_LOOKBACK_HOURS))
+    analyzer = LoginAnalyzer()
     
     try:
-        # Look for events in the last 24 hours
         end_time = datetime.utcnow()
-        start_time = end_time - timedelta(days=1)
+        start_time = end_time - timedelta(hours=period_hours)
         
-        # Look for ConsoleLogin events
-        response = cloudtrail.lookup_events(
+        # Look for ConsoleLogin events, paging through the whole window
+        events = paginate(
+            get_client('cloudtrail'), 'lookup_events', 'Events',
             LookupAttributes=[
                 {
                     'AttributeKey': 'EventName',
@@ -179,95 +699,417 @@ def check_login_attempts() -> Dict[str, any]:
                 }
             ],
             StartTime=start_time,
-            EndTime=end_time,
-            MaxResults=50  # Limit to avoid too many results
+            EndTime=end_time
         )
         
-        for event in response.get('Events', []):
+        for event in events:
             try:
-                # Parse the CloudTrail event JSON
-                event_data = json.loads(event.get('CloudTrailEvent', '{}'))
-                
-                # Check if login was successful or failed
-                # Failed logins typically have responseElements.ConsoleLogin = "Failure"
-                response_elements = event_data.get('responseElements', {})
-                console_login = response_elements.get('ConsoleLogin', '')
-                
-                # Also check for error messages that indicate failure
-                error_message = event_data.get('errorMessage', '')
-                error_code = event_data.get('errorCode', '')
-                
-                # Consider it a failure if:
-                # 1. ConsoleLogin is explicitly "Failure"
-                # 2. There's an error message or error code
-                # 3. The response indicates unauthorized access
-                is_failure = (
-                    console_login == 'Failure' or
-                    bool(error_message) or
-                    bool(error_code) or
-                    'Unauthorized' in str(event_data).lower()
-                )
-                
-                if is_failure:
-                    failed_logins.append({
-                        "time": event.get('EventTime').isoformat() if event.get('EventTime') else None,
-                        "user": event_data.get('userIdentity', {}).get('userName', 'Unknown'),
-                        "source_ip": event_data.get('sourceIPAddress', 'Unknown'),
-                        "error_message": error_message,
-                        "error_code": error_code
-                    })
-            except (json.JSONDecodeError, KeyError) as e:
+                # Parse the CloudTrail event JSON once; the record is dropped after aggregation
+                event_data = json.loads(event.get('CloudTrailEvent') or '{}')
+            except json.JSONDecodeError:
                 # Skip events that can't be parsed
                 continue
+            event_time = event.get('EventTime')
+            analyzer.add(event_data, event_time.timestamp() if event_time else None)
         
-        return {
-            "failed_login_count": len(failed_logins),
-            "failed_logins": failed_logins,
-            "period_hours": 24,
-            "note": "Checking last 24 hours of CloudTrail events"
-        }
+        summary = analyzer.summary()
+        # The sampled failures, as "<user>@<source IP>" with the time as detail
+        _record_findings("login_attempts", "login_attempts", (
+            ("", f"{login.get('user')}@{login.get('source_ip')}", login.get('time') or "")
+            for login in summary["failed_logins"]
+        ))
+        return dict(
+            summary,
+            period_hours=period_hours,
+            note=f"Checking last {period_hours} hours of CloudTrail events"
+        )
     except Exception as e:
         # If CloudTrail lookup fails, return empty results with error info
         return {
             "failed_login_count": 0,
             "failed_logins": [],
-            "period_hours": 24,
+            "period_hours": period_hours,
             "error": str(e),
             "note": "CloudTrail lookup failed - check IAM permissions and CloudTrail configuration"
         }
 
-def collect_security_metrics() -> Dict[str, any]:
+# ------------------------------------------------------------------------------------
+# SINGLE-RESOURCE EVALUATION (event-driven mode)
+# ------------------------------------------------------------------------------------
+
+def _is_not_found(error: Exception) -> bool:
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code', '')
+    return 'NotFound' in code or code in ('NoSuchBucket', 'NoSuchEntity')
+
+def evaluate_bucket(bucket_name: str, region: str = None) -> List[str]:
+    """
+    Returns [bucket_name] if the bucket is public, [] if it is private or gone.
+    Cached exposure results of the bucket are dropped, since its configuration changed.
+    """
+    invalidate_bucket_exposure(bucket_name, _scan_account.get())
+    try:
+        exposure = probe_bucket_exposure(bucket_name, get_client('s3', retries=False), AdaptiveThrottle(),
+                                         account_public_access_block())
+        return [bucket_name] if exposure else []
+    except Exception as e:
+        if _is_not_found(e):
+            return []
+        raise
+
+def evaluate_user(user_name: str, region: str = None) -> List[str]:
+    """
+    Returns [user_name] if the IAM user has no MFA device, [] if it has one or is gone.
+    """
+    try:
+        mfa_devices = get_client('iam').list_mfa_devices(UserName=user_name)
+    except Exception as e:
+        if _is_not_found(e):
+            return []
+        raise
+    return [] if mfa_devices['MFADevices'] else [user_name]
+
+def evaluate_volume(volume_id: str, region: str = None) -> List[str]:
+    """
+    Returns [volume_id] if the EBS volume is unencrypted, [] if encrypted or gone.
+    """
+    try:
+        volumes = get_client('ec2', region).describe_volumes(VolumeIds=[volume_id])['Volumes']
+    except Exception as e:
+        if _is_not_found(e):
+            return []
+        raise
+    return [v['VolumeId'] for v in volumes if not v['Encrypted']]
+
+def evaluate_instance(instance_id: str, region: str = None) -> List[str]:
+    """
+    Returns [instance_id] if the EC2 instance has a public IP, [] otherwise or if gone.
+    """
+    try:
+        reservations = get_client('ec2', region).describe_instances(InstanceIds=[instance_id])['Reservations']
+    except Exception as e:
+        if _is_not_found(e):
+            return []
+        raise
+    return [
+        instance['InstanceId']
+        for reservation in reservations
+        for instance in reservation['Instances']
+        if is_public_instance(instance)
+    ]
+
+def evaluate_security_group(group_id: str, region: str = None) -> List[Dict[str, any]]:
+    """
+    Returns the internet-exposed rule entries of one security group
+    ([] if none, gone, or not attached to anything, see iter_risky_sg_rules).
+    """
+    ec2_client = get_client('ec2', region)
+    try:
+        sgs = ec2_client.describe_security_groups(GroupIds=[group_id])['SecurityGroups']
+    except Exception as e:
+        if _is_not_found(e):
+            return []
+        raise
+    if os.environ.get("SG_REPORT_UNATTACHED", "").lower() != "true":
+        in_use = ec2_client.describe_network_interfaces(
+            Filters=[{'Name': 'group-id', 'Values': [group_id]}, {'Name': 'status', 'Values': ['in-use']}],
+            MaxResults=5
+        )['NetworkInterfaces']
+        if not in_use:
+            return []
+    prefix_lists = _prefix_list_cidrs(ec2_client, referenced_prefix_lists(sgs))
+    return [dict(rule, Region=region) if region else rule for sg in sgs for rule in exposed_rules(sg, prefix_lists)]
+
+# Resource type -> (evaluator, findings category in scan_state)
+RESOURCE_EVALUATORS = {
+    "bucket": (evaluate_bucket, "public_s3_buckets"),
+    "user": (evaluate_user, "mfa_iam"),
+    "volume": (evaluate_volume, "encryption"),
+    "instance": (evaluate_instance, "public_ec2_IPs"),
+    "security_group": (evaluate_security_group, "security_groups"),
+}
+
+def evaluate_resource(resource_type: str, resource_id: str, region: str = None,
+                      account_id: str = None, credentials: Dict[str, any] = None) -> List[any]:
+    """
+    Re-evaluates a single resource with the same logic as the full checks.
+    
+    Args:
+        resource_type: Key of RESOURCE_EVALUATORS (e.g., 'bucket', 'security_group')
+        resource_id: Bucket name, user name, or volume/instance/security group ID
+        region: Region of regional resources
+        account_id: Account to evaluate in (default: the account the Lambda runs in)
+        credentials: STS credentials for account_id
+        
+    Returns:
+        The resource's findings: its ID if non-compliant (security groups: the
+        risky rule entries), or [] if it is compliant or no longer exists
+    """
+    evaluator, _ = RESOURCE_EVALUATORS[resource_type]
+    context = contextvars.copy_context()
+    context.run(_scan_account.set, account_id)
+    context.run(_scan_credentials.set, credentials)
+    return context.run(evaluator, resource_id, region)
+
+# Checks available to collect_security_metrics(): name -> (check function, empty result).
+# Only the checks referenced by an enabled security rule run (see utils/rules_engine.py).
+# The empty result is reported for a check that fails or exceeds its timeout so the
+# findings dict always has the same shape for alert_manager and report_generator.
+SECURITY_CHECKS = {
+    "mfa_iam": (check_mfa_iam, lambda: {"total_users": 0, "non_compliant_users": []}),
+    "encryption": (check_encryption, list),
+    "exposure": (check_exposure, lambda: {"public_ec2_IPs": [], "public_s3_buckets": []}),
+    "security_groups": (check_security_groups, list),
+    "cloudtrail": (check_cloudtrail_status, lambda: {
+        "cloudtrail_enabled": False, "active_trails": [], "inactive_trails": [], "total_trails": 0}),
+    "login_attempts": (check_login_attempts, lambda: {"failed_login_count": 0, "failed_logins": []}),
+}
+
+# Keys added to the findings dict that are run metadata, not metric categories
+METADATA_KEYS = ("check_timings", "check_errors", "partial_errors", "resource_regions", "records", "changes",
+                 "pending_checks", "accounts", "account_errors")
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_CHECK_TIMEOUT_SECONDS = 120
+
+# Seconds past the scan deadline the checks get to stop and hand in their progress
+CHECKPOINT_GRACE_SECONDS = 10
+
+
+def _timed_check(name: str, check_func):
+    """
+    Runs a single check and returns (result, duration in seconds).
+    The check's thread is profiled when PROFILE_MODE includes "cprofile".
+    """
+    _current_check.set(name)
+    with profile_thread():
+        start = time.perf_counter()
+        result = check_func()
+        return result, time.perf_counter() - start
+
+
+def _checkpoint_name(account_id: str = None) -> str:
+    return f"scan_checkpoint_{account_id or 'self'}"
+
+def save_scan_checkpoint(findings: Dict[str, any], account_id: str = None, checkpoint: ScanCheckpoint = None):
+    """
+    Saves the checks a findings dict completed (neither failed, partial nor pending),
+    plus the progress in checkpoint, as the account's scan checkpoint. A partial check
+    runs again on resume, reusing the regions and probes it finished.
+
+    Args:
+        findings: Findings dict from collect_security_metrics()
+        account_id: Scanned account (None for the account the Lambda runs in)
+        checkpoint: The run's checkpoint (default: a new one)
+    """
+    checkpoint = checkpoint or ScanCheckpoint()
+    unfinished = (set(findings.get("check_errors", {})) | set(findings.get("partial_errors", {}))
+                  | set(findings.get("pending_checks", [])))
+    records = {}
+    for finding in findings.get("records", []):
+        records.setdefault(finding.check, []).append(
+            (finding.category, finding.region, finding.resource_id, finding.detail)
+        )
+    for name, timing in findings.get("check_timings", {}).items():
+        if name in findings and name not in unfinished:
+            # Stored as it will be loaded, so a resumed result looks the same either way
+            result = json.loads(json.dumps(findings[name], default=str))
+            checkpoint.record_check(name, result, timing, records.get(name, []))
+    try:
+        save_state(_checkpoint_name(account_id), checkpoint.to_dict(findings.get("resource_regions")))
+    except Exception as e:
+        handle_error(e, "save_scan_checkpoint")
+
+def clear_scan_checkpoint(account_id: str = None):
+    """
+    Drops the account's scan checkpoint once its scan has completed.
+    """
+    try:
+        save_state(_checkpoint_name(account_id), {})
+    except Exception as e:
+        handle_error(e, "clear_scan_checkpoint")
+
+def collect_security_metrics(max_workers: int = None, check_timeout: float = None,
+                             account_id: str = None, credentials: Dict[str, any] = None,
+                             incremental: bool = None, deadline: float = None,
+                             resumable: bool = None) -> Dict[str, any]:
     """
     Collects all security metrics and returns them in a dictionary.
     This is the main function called by lambda_handler.
     
-    Currently collects 4 metric categories:
+    Runs the checks the enabled security rules read from (see utils/rules_engine.py);
+    the default policy enables 4 of them:
     1. mfa_iam - IAM MFA compliance
     2. encryption - EBS volume encryption
     3. exposure - Public S3 buckets and EC2 IPs
     4. security_groups - Risky security group rules
+    cloudtrail (trail logging status) and login_attempts (failed console sign-ins)
+    have rules in the policy that are disabled by default.
     
-    Note: CloudTrail and login_attempts functions exist but are commented out
-    for presentation consistency with demo screenshots showing 4 categories.
-    """
-    mfa_iam = check_mfa_iam()
-    encryption = check_encryption()
-    exposure = check_exposure()
-    security_groups = check_security_groups()
+    The checks are independent, so they run concurrently in a thread pool and the
+    Lambda duration is roughly the slowest check instead of the sum of all of them.
+    A check that raises or runs past its timeout is reported with an empty result
+    and its error is recorded under "check_errors". A check that could only scan some
+    of its regions or resources reports those, and lists the rest with their errors
+    under "partial_errors".
+
+    With a deadline (from the Lambda's remaining time, see lambda_handler.py), the
+    run stops starting work once it passes, checkpoints what it finished and lists the
+    unfinished checks under "pending_checks" (their results are empty). The next run
+    for the account continues from the checkpoint, see checkpoint.py.
+    
+    Args:
+        max_workers: Thread pool size (default: COLLECTOR_MAX_WORKERS env var or 4)
+        check_timeout: Seconds allowed per check, measured from submission
+                       (default: CHECK_TIMEOUT_SECONDS env var or 120)
+        account_id: Account to scan (default: the account the Lambda runs in)
+        credentials: STS credentials for account_id, see multi_account.py
+        incremental: Reuse the previous scan snapshot and report changes
+                     (default: INCREMENTAL_SCAN env var), see scan_state.py
+        deadline: time.monotonic() at which to stop and checkpoint (default: no limit)
+        resumable: Continue from and save scan checkpoints (default: RESUMABLE_SCAN
+                   env var, on unless "false"); without it the deadline is ignored
     
-    # CloudTrail and login_attempts are implemented but disabled for presentation
-    # Uncomment these lines to enable (will change to 6 categories, 9 metrics):
-    # cloudtrail = check_cloudtrail_status()
-    # login_attempts = check_login_attempts()
+    Returns:
+        Findings dict keyed by category, plus "check_timings" (seconds per check),
+        "check_errors" (error message per failed check), "partial_errors" (for each
+        check that couldn't evaluate every region or resource: kind -> name -> error),
+        "resource_regions" (region of each regional finding, see SCAN_REGIONS) and
+        "records" (one Finding per finding of the completed checks, see findings.py); incremental
+        scans also add "changes" (added/removed findings since the previous run)
+        and runs stopped at the deadline "pending_checks"
+    """
+    if max_workers is None:
+        max_workers = int(os.environ.get("COLLECTOR_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+    if check_timeout is None:
+        check_timeout = float(os.environ.get("CHECK_TIMEOUT_SECONDS", DEFAULT_CHECK_TIMEOUT_SECONDS))
+    if incremental is None:
+        incremental = os.environ.get("INCREMENTAL_SCAN", "").lower() == "true"
 
-    return {
-        "mfa_iam": mfa_iam,
-        "encryption": encryption,
-        "exposure": exposure,
-        "security_groups": security_groups
-        # "cloudtrail": cloudtrail,  # Disabled for presentation
-        # "login_attempts": login_attempts  # Disabled for presentation
-    }
+    snapshot = None
+    snapshot_name = f"scan_snapshot_{account_id or 'self'}"
+    if incremental:
+        max_age_hours = float(os.environ.get("INCREMENTAL_MAX_AGE_HOURS", DEFAULT_INCREMENTAL_MAX_AGE_HOURS))
+        snapshot = ScanSnapshot(load_state(snapshot_name), max_age_hours=max_age_hours)
+
+    if resumable is None:
+        resumable = os.environ.get("RESUMABLE_SCAN", "true").lower() != "false"
+    checkpoint = None
+    if resumable:
+        max_age_minutes = float(os.environ.get("SCAN_CHECKPOINT_MAX_AGE_MINUTES", DEFAULT_SCAN_CHECKPOINT_MAX_AGE_MINUTES))
+        checkpoint = ScanCheckpoint(load_state(_checkpoint_name(account_id)), max_age_minutes=max_age_minutes)
+        if checkpoint.resumed:
+            logger.info(f"Resuming scan of {account_id or 'this account'} from its checkpoint "
+                        f"(resume {checkpoint.resumes}, {len(checkpoint.checks)} check(s) done)")
+        if checkpoint.resumes >= int(os.environ.get("SCAN_MAX_RESUMES", DEFAULT_SCAN_MAX_RESUMES)):
+            # Out of resumes: finish this time, whatever the Lambda's remaining time
+            deadline = None
+        if deadline is None and not checkpoint.resumed:
+            # Nothing to resume and no deadline to stop at, so no progress to track
+            checkpoint = None
+    else:
+        deadline = None
+
+    findings = {}
+    timings = {}
+    errors = {}
+    pending = []
+    partial_errors = {}
+    resource_regions = dict(checkpoint.resource_regions) if checkpoint is not None else {}
+
+    # Every check thread runs in a copy of this context, so concurrent runs for
+    # different accounts each see their own credentials and region map
+    run_context = contextvars.copy_context()
+    run_context.run(_scan_account.set, account_id)
+    run_context.run(_scan_credentials.set, credentials)
+    run_context.run(_resource_regions.set, resource_regions)
+    run_context.run(_scan_snapshot.set, snapshot)
+    run_context.run(begin_inventory_run)
+    run_context.run(_scan_deadline.set, deadline)
+    run_context.run(_scan_checkpoint.set, checkpoint)
+    run_context.run(_partial_errors.set, partial_errors)
+    builder = FindingsBuilder(account_id)
+    run_context.run(_findings_builder.set, builder)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        submitted_at = time.monotonic()
+        checks = enabled_checks()
+        futures = {}
+        for name, (check_func, _) in SECURITY_CHECKS.items():
+            if name not in checks:
+                continue
+            saved = checkpoint.completed_check(name) if checkpoint is not None else None
+            if saved is not None:
+                # Finished by an earlier invocation of this scan
+                findings[name], timings[name] = saved["result"], saved["timing"]
+                by_category = {}
+                for category, region, resource_id, detail in saved["records"]:
+                    by_category.setdefault(category, []).append((region, resource_id, detail))
+                for category, items in by_category.items():
+                    builder.extend(name, category, items)
+            elif deadline is not None and submitted_at >= deadline:
+                pending.append(name)
+            else:
+                futures[name] = executor.submit(run_context.copy().run, _timed_check, name, check_func)
+
+        for name, future in futures.items():
+            empty_result = SECURITY_CHECKS[name][1]
+            remaining = max(0.0, submitted_at + check_timeout - time.monotonic())
+            if deadline is not None:
+                remaining = min(remaining, max(0.0, deadline + CHECKPOINT_GRACE_SECONDS - time.monotonic()))
+            try:
+                findings[name], timings[name] = future.result(timeout=remaining)
+            except ScanDeadlineExceeded:
+                pending.append(name)
+            except FutureTimeoutError:
+                future.cancel()
+                if deadline is not None and time.monotonic() >= deadline:
+                    # Still running at the deadline; it starts over in the next invocation
+                    pending.append(name)
+                    continue
+                findings[name] = empty_result()
+                timings[name] = round(time.monotonic() - submitted_at, 3)
+                errors[name] = f"Timed out after {check_timeout} seconds"
+            except Exception as e:
+                findings[name] = empty_result()
+                timings[name] = round(time.monotonic() - submitted_at, 3)
+                errors[name] = str(e)
+            else:
+                timings[name] = round(timings[name], 3)
+    finally:
+        # Don't block on checks that timed out; their threads finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for name in pending:
+        findings[name] = SECURITY_CHECKS[name][1]()
+    findings["check_timings"] = timings
+    findings["check_errors"] = errors
+    with _partial_errors_lock:
+        findings["partial_errors"] = {
+            name: partial for name, partial in partial_errors.items() if name not in errors and name not in pending
+        }
+    with _resource_regions_lock:
+        findings["resource_regions"] = dict(resource_regions)
+    findings["records"] = builder.completed(list(errors) + pending)
+    logger.info(f"Inventory cache (container totals): {inventory_stats()}")
+    save_inventory()
+
+    if pending:
+        findings["pending_checks"] = pending
+        save_scan_checkpoint(findings, account_id, checkpoint)
+        logger.info(f"Scan deadline reached; checkpointed with {len(pending)} check(s) pending: {', '.join(pending)}")
+        # An incomplete scan is neither diffed nor saved as the incremental snapshot
+        return findings
+    if checkpoint is not None and checkpoint.resumed:
+        clear_scan_checkpoint(account_id)
+
+    if snapshot is not None:
+        findings["changes"] = snapshot.diff(findings, failed_checks=list(errors))
+        try:
+            save_state(snapshot_name, snapshot.to_dict())
+        except Exception as e:
+            handle_error(e, "collect_security_metrics (saving scan snapshot)")
+    return findings
     
 
 # DONE: Alejandro - Add helper functions for your chosen metrics
@@ -0,0 +1,278 @@
+"""
+Multi-Account Scanner
+Runs collect_security_metrics() across member accounts via STS AssumeRole
+Owner: Alejandro (Infrastructure & Metrics Architect)
+
+INTERFACE NOTES:
+collect_multi_account_metrics() returns the same category keys as
+collect_security_metrics(), merged across accounts, so publish_metrics_to_cloudwatch,
+check_thresholds_and_alert and generate_daily_report work unchanged. Per-account
+findings are kept under "accounts" and accounts that could not be scanned under
+"account_errors".
+
+A deadline is passed on to every account's scan (see checkpoint.py). If any account
+stops with checks pending, the accounts that completed are checkpointed as well, so
+the next invocation continues the multi-account scan without scanning them again.
+
+Each member account needs a role (SCAN_ROLE_NAME) that trusts the Lambda's execution
+role and grants the same read-only permissions as MedTechSecurityMonitoringPolicy.
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from metrics_collector.findings import merge_records
+from metrics_collector.metrics_collector import collect_security_metrics, save_scan_checkpoint
+from utils.aws_helpers import get_assumed_role_credentials, get_boto3_client, handle_error, paginate
+
+DEFAULT_SCAN_ROLE_NAME = "MedTechSecurityAuditRole"
+DEFAULT_ACCOUNT_MAX_CONCURRENCY = 4
+
+# How the fields of each check result are merged across accounts
+SUM = "sum"        # counts
+CONCAT = "concat"  # lists; dict items gain an AccountId
+ALL = "all"        # flags that must hold in every account
+SAME = "same"      # settings shared by every account's scan (the first account's value)
+
+RESULT_MERGES = {
+    "mfa_iam": {"total_users": SUM, "non_compliant_users": CONCAT},
+    "encryption": CONCAT,
+    "exposure": {"public_ec2_IPs": CONCAT, "public_s3_buckets": CONCAT},
+    "security_groups": CONCAT,
+    "cloudtrail": {"cloudtrail_enabled": ALL, "active_trails": CONCAT, "inactive_trails": CONCAT,
+                   "total_trails": SUM},
+    "login_attempts": {
+        "failed_login_count": SUM, "failed_logins": CONCAT, "events_scanned": SUM,
+        "by_user": CONCAT, "by_source_ip": CONCAT, "untracked_failures": SUM, "period_hours": SAME,
+        "brute_force_suspects": {"users": CONCAT, "source_ips": CONCAT, "threshold": SAME, "window_minutes": SAME},
+    },
+}
+CHANGES_MERGE = {"added": CONCAT, "removed": CONCAT, "unchanged_count": SUM, "unobserved_count": SUM}
+
+_current_account_id = None
+
+
+def get_current_account_id() -> str:
+    """
+    Returns the account ID the Lambda runs in (cached per container).
+    """
+    global _current_account_id
+    if _current_account_id is None:
+        _current_account_id = get_boto3_client('sts').get_caller_identity()['Account']
+    return _current_account_id
+
+
+def list_organization_accounts() -> List[str]:
+    """
+    Returns the IDs of all ACTIVE accounts in the AWS Organization.
+    Must run in the management account or a delegated administrator account.
+    """
+    organizations = get_boto3_client('organizations')
+    return [
+        account['Id']
+        for account in paginate(organizations, 'list_accounts', 'Accounts')
+        if account.get('Status') == 'ACTIVE'
+    ]
+
+
+def get_scan_accounts() -> List[str]:
+    """
+    Accounts to scan, from SCAN_ACCOUNTS:
+    - "organization": every active account in the AWS Organization
+    - "111111111111,222222222222": an explicit comma-separated list
+    """
+    setting = os.environ.get("SCAN_ACCOUNTS", "").strip()
+    if setting.lower() == "organization":
+        return list_organization_accounts()
+    return [account.strip() for account in setting.split(",") if account.strip()]
+
+
+def scan_account(account_id: str, role_name: str = None, deadline: float = None) -> Dict[str, any]:
+    """
+    Collects security metrics for a single account.
+
+    The Lambda's own account is scanned with its execution role; any other
+    account through SCAN_ROLE_NAME in that account.
+
+    Args:
+        account_id: AWS account ID
+        role_name: Role to assume in the member account (default: SCAN_ROLE_NAME env var)
+        deadline: time.monotonic() at which to stop and checkpoint (default: no limit)
+
+    Returns:
+        Findings dict from collect_security_metrics()
+    """
+    if account_id == get_current_account_id():
+        return collect_security_metrics(deadline=deadline)
+
+    role_name = role_name or os.environ.get("SCAN_ROLE_NAME", DEFAULT_SCAN_ROLE_NAME)
+    credentials = get_assumed_role_credentials(f"arn:aws:iam::{account_id}:role/{role_name}")
+    return collect_security_metrics(account_id=account_id, credentials=credentials, deadline=deadline)
+
+
+def collect_multi_account_metrics(account_ids: List[str] = None, role_name: str = None,
+                                  max_concurrency: int = None, deadline: float = None) -> Dict[str, any]:
+    """
+    Scans several accounts concurrently and merges their findings.
+
+    A failure in one account (e.g. the role cannot be assumed) is logged and
+    recorded under "account_errors" without affecting the other accounts.
+
+    Args:
+        account_ids: Accounts to scan (default: get_scan_accounts())
+        role_name: Role to assume in each member account (default: SCAN_ROLE_NAME env var)
+        max_concurrency: Accounts scanned in parallel (default: ACCOUNT_MAX_CONCURRENCY env var or 4)
+        deadline: time.monotonic() at which to stop and checkpoint (default: no limit)
+
+    Returns:
+        Merged findings dict, see merge_account_findings()
+    """
+    if account_ids is None:
+        account_ids = get_scan_accounts()
+    if max_concurrency is None:
+        max_concurrency = int(os.environ.get("ACCOUNT_MAX_CONCURRENCY", DEFAULT_ACCOUNT_MAX_CONCURRENCY))
+
+    def scan(account_id):
+        try:
+            return scan_account(account_id, role_name, deadline), None
+        except Exception as e:
+            handle_error(e, f"scan_account({account_id})")
+            return None, str(e)
+
+    account_findings = {}
+    account_errors = {}
+    if account_ids:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(account_ids)))) as executor:
+            for account_id, (findings, error) in zip(account_ids, executor.map(scan, account_ids)):
+                if error is None:
+                    account_findings[account_id] = findings
+                else:
+                    account_errors[account_id] = error
+
+    if any(findings.get("pending_checks") for findings in account_findings.values()):
+        for account_id, findings in account_findings.items():
+            if not findings.get("pending_checks"):
+                save_scan_checkpoint(findings, None if account_id == get_current_account_id() else account_id)
+
+    merged = merge_account_findings(account_findings)
+    merged["account_errors"] = account_errors
+    return merged
+
+
+def merge_account_findings(account_findings: Dict[str, Dict[str, any]]) -> Dict[str, any]:
+    """
+    Merges per-account findings into one findings dict.
+
+    - Each field of a check result is merged as RESULT_MERGES says: counts are summed,
+      lists concatenated (dict entries, e.g. security group rules, gain an AccountId),
+      cloudtrail_enabled only holds if it holds in every account (per account under
+      cloudtrail.enabled_by_account), and settings such as period_hours are kept as
+      they are. Fields not listed (e.g. "error", "note") keep the first account's value
+    - A check that failed in an account (its check_errors) contributes nothing: the
+      merged result covers the accounts where it succeeded, or is the empty result
+      when it failed everywhere
+    - Non-compliant IAM user names are prefixed with their account ("123456789012/alice")
+      because user names are only unique within an account
+    - changes are merged per category (added/removed concatenated, unchanged_count and
+      unobserved_count summed)
+    - check_timings keeps the slowest account per check, check_errors, partial_errors
+      and pending_checks are keyed "<account>:<check>"
+    - Finding records are concatenated (they already carry their account)
+
+    Args:
+        account_findings: Account ID -> findings dict from collect_security_metrics()
+
+    Returns:
+        Merged findings dict, with the per-account findings under "accounts"
+    """
+    merged = {}
+    timings = {}
+    errors = {}
+    partial_errors = {}
+    pending = []
+    resource_regions = {}
+    records = []
+    changes = {}
+    failed_results = {}
+
+    for account_id, findings in account_findings.items():
+        for key, value in findings.items():
+            if key == "check_timings":
+                for check, seconds in value.items():
+                    timings[check] = max(seconds, timings.get(check, 0))
+            elif key == "check_errors":
+                for check, error in value.items():
+                    errors[f"{account_id}:{check}"] = error
+            elif key == "partial_errors":
+                for check, partial in value.items():
+                    partial_errors[f"{account_id}:{check}"] = partial
+            elif key == "pending_checks":
+                pending.extend(f"{account_id}:{check}" for check in value)
+            elif key == "resource_regions":
+                resource_regions.update(value)
+            elif key == "records":
+                records.append(value)
+            elif key == "changes":
+                for category, change in value.items():
+                    changes[category] = _merge_values(changes.get(category), change, account_id, CHANGES_MERGE)
+            elif key in findings.get("check_errors", {}):
+                # Only the accounts whose check succeeded count, see rules_engine.failed_checks()
+                failed_results.setdefault(key, value)
+            else:
+                if key == "mfa_iam":
+                    value = dict(value)
+                    value["non_compliant_users"] = [
+                        f"{account_id}/{user}" for user in value.get("non_compliant_users", [])
+                    ]
+                merged[key] = _merge_values(merged.get(key), value, account_id, RESULT_MERGES.get(key))
+
+    for key, value in failed_results.items():
+        # Failed in every account: the empty result, as for a single-account scan
+        merged.setdefault(key, value)
+    if "cloudtrail" in merged:
+        merged["cloudtrail"]["enabled_by_account"] = {
+            account_id: findings["cloudtrail"].get("cloudtrail_enabled", False)
+            for account_id, findings in account_findings.items()
+            if "cloudtrail" in findings and "cloudtrail" not in findings.get("check_errors", {})
+        }
+    if changes:
+        merged["changes"] = changes
+    merged["check_timings"] = timings
+    merged["check_errors"] = errors
+    merged["partial_errors"] = partial_errors
+    merged["resource_regions"] = resource_regions
+    merged["records"] = merge_records(records)
+    if pending:
+        merged["pending_checks"] = pending
+    merged["accounts"] = account_findings
+    return merged
+
+
+def _merge_values(existing, value, account_id: str, merge):
+    """
+    Merges one account's value for a finding into the running total.
+
+    Args:
+        existing: Total of the accounts merged so far (None for the first account)
+        value: This account's value
+        account_id: This account
+        merge: SUM, CONCAT, ALL or SAME, or a dict of them per field of a dict value;
+               None keeps the first account's value
+    """
+    if isinstance(merge, dict):
+        merged = dict(existing or {})
+        for key, item in value.items():
+            merged[key] = _merge_values(merged.get(key), item, account_id, merge.get(key))
+        return merged
+    if merge == CONCAT:
+        tagged = [dict(item, AccountId=account_id) if isinstance(item, dict) else item for item in value]
+        return (existing or []) + tagged
+    if merge == SUM:
+        return (existing or 0) + value
+    if merge == ALL:
+        return bool(value) if existing is None else existing and bool(value)
+    return value if existing is None else existing
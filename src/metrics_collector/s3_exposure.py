@@ -0,0 +1,200 @@
+"""
+S3 Exposure Engine
+Decides whether buckets are public from Block Public Access, bucket policy status and ACLs
+Owner: Alejandro (Infrastructure & Metrics Architect)
+
+INTERFACE NOTES:
+A bucket is public when a public ACL grant or a public bucket policy takes effect:
+
+- ACL grants to the AllUsers or AuthenticatedUsers groups are public, unless
+  IgnorePublicAcls is set for the account or the bucket
+- A policy GetBucketPolicyStatus reports as public is public, unless
+  RestrictPublicBuckets is set for the account or the bucket
+
+Block Public Access is read first, so the probes it makes pointless are never sent:
+
+1. The account-level configuration (S3 Control GetPublicAccessBlock) is read once per
+   scan. If it ignores public ACLs and restricts public policies, no bucket of the
+   account can be public and check_exposure() probes (and lists) nothing.
+2. Per bucket, GetPublicAccessBlock; a bucket whose own settings (combined with the
+   account's) block both ways is private after that one call.
+3. Otherwise the ACL, and only if it isn't public, the policy status. An ACL or
+   policy status that can't be read (other than NoSuchBucketPolicy) raises: the
+   bucket's exposure is unknown, so it isn't cached, checkpointed or reported private.
+
+bucket_exposure() returns "acl", "policy" or None. Results are cached in the warm
+container for S3_EXPOSURE_CACHE_SECONDS, keyed by account, bucket, bucket version
+(CreationDate) and the account-level configuration, so a changed account setting or a
+recreated bucket is probed again. S3 has no last-modified time for bucket
+configuration, so config-change events (evaluate_bucket()) drop the cached results
+of the bucket they name.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.aws_helpers import handle_error
+
+PUBLIC_ACCESS_BLOCK_FLAGS = ("BlockPublicAcls", "IgnorePublicAcls", "BlockPublicPolicy", "RestrictPublicBuckets")
+NO_PUBLIC_ACCESS_BLOCK = dict.fromkeys(PUBLIC_ACCESS_BLOCK_FLAGS, False)
+
+# ACL grantee groups that make a bucket public
+PUBLIC_GRANTEE_URIS = (
+    "http://acs.amazonaws.com/groups/global/AllUsers",
+    "http://acs.amazonaws.com/groups/global/AuthenticatedUsers",
+)
+
+DEFAULT_S3_EXPOSURE_CACHE_SECONDS = 900
+DEFAULT_S3_EXPOSURE_CACHE_MAX_ENTRIES = 100000
+
+# (account, bucket, version, account block) -> (exposure, checked at), least recently used first
+_results = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def _error_code(error: Exception) -> str:
+    return getattr(error, 'response', {}).get('Error', {}).get('Code', '')
+
+
+def _read_public_access_block(call, context: str, **params) -> Dict[str, bool]:
+    """
+    Calls a GetPublicAccessBlock API; a missing configuration blocks nothing.
+    Errors other than a missing configuration or bucket are logged and treated
+    as blocking nothing, so the ACL and policy are still checked.
+    """
+    try:
+        config = call(**params).get('PublicAccessBlockConfiguration', {})
+    except Exception as e:
+        code = _error_code(e)
+        if code == 'NoSuchBucket':
+            raise
+        if code != 'NoSuchPublicAccessBlockConfiguration':
+            handle_error(e, context)
+        return dict(NO_PUBLIC_ACCESS_BLOCK)
+    return {flag: bool(config.get(flag, False)) for flag in PUBLIC_ACCESS_BLOCK_FLAGS}
+
+
+def get_account_public_access_block(s3control_client, account_id: str, throttle=None) -> Dict[str, bool]:
+    """
+    Returns the account-level Block Public Access settings (all False if none are set).
+    """
+    call = throttle.call if throttle else (lambda func, **params: func(**params))
+    return _read_public_access_block(
+        lambda **params: call(s3control_client.get_public_access_block, **params),
+        f"get_account_public_access_block({account_id})", AccountId=account_id
+    )
+
+
+def blocks_public_access(config: Dict[str, bool]) -> bool:
+    """
+    True if Block Public Access settings leave no way to make a bucket public:
+    public ACLs are ignored and public policies restricted.
+    """
+    return bool(config.get("IgnorePublicAcls") and config.get("RestrictPublicBuckets"))
+
+
+def is_public_grant(grant: Dict[str, any]) -> bool:
+    """
+    True if an ACL grant targets everyone (AllUsers) or any AWS account (AuthenticatedUsers).
+    """
+    grantee = grant.get('Grantee') or {}
+    return grantee.get('Type') == 'Group' and grantee.get('URI') in PUBLIC_GRANTEE_URIS
+
+
+def probe_bucket_exposure(bucket_name: str, s3_client, throttle,
+                          account_block: Dict[str, bool] = None) -> Optional[str]:
+    """
+    Probes one bucket (see module notes for the order of the calls).
+
+    Args:
+        bucket_name: Bucket to probe
+        s3_client: S3 client of the bucket's account
+        throttle: AdaptiveThrottle shared by the scan's probes
+        account_block: The account's Block Public Access settings
+
+    Returns:
+        "acl" or "policy" for a public bucket, None for a private one
+
+    Raises:
+        The API error if the bucket can't be probed (e.g. NoSuchBucket, or an
+        AccessDenied reading its ACL or policy status)
+    """
+    account_block = account_block or NO_PUBLIC_ACCESS_BLOCK
+    bucket_block = _read_public_access_block(
+        lambda **params: throttle.call(s3_client.get_public_access_block, **params),
+        f"get_public_access_block({bucket_name})", Bucket=bucket_name
+    )
+    ignore_acls = account_block.get("IgnorePublicAcls") or bucket_block["IgnorePublicAcls"]
+    restrict_policy = account_block.get("RestrictPublicBuckets") or bucket_block["RestrictPublicBuckets"]
+
+    if not ignore_acls:
+        acl = throttle.call(s3_client.get_bucket_acl, Bucket=bucket_name)
+        if any(is_public_grant(grant) for grant in acl.get('Grants', [])):
+            return "acl"
+
+    if not restrict_policy:
+        try:
+            policy_status = throttle.call(s3_client.get_bucket_policy_status, Bucket=bucket_name)
+        except Exception as e:
+            # NoSuchBucketPolicy just means there is no policy to make the bucket public;
+            # any other error leaves the bucket's exposure unknown
+            if _error_code(e) != 'NoSuchBucketPolicy':
+                raise
+            return None
+        if policy_status.get('PolicyStatus', {}).get('IsPublic', False):
+            return "policy"
+    return None
+
+
+def bucket_exposure(bucket_name: str, s3_client, throttle, account_block: Dict[str, bool] = None,
+                    account_id: str = None, version: str = "") -> Optional[str]:
+    """
+    probe_bucket_exposure() through the result cache.
+
+    Args:
+        account_id: Bucket's account (None for the account the Lambda runs in)
+        version: Bucket version (CreationDate); a recreated bucket is probed again
+
+    Returns:
+        "acl" or "policy" for a public bucket, None for a private one
+    """
+    account_block = account_block or NO_PUBLIC_ACCESS_BLOCK
+    key = (account_id or "", bucket_name, version or "",
+           tuple(account_block.get(flag, False) for flag in PUBLIC_ACCESS_BLOCK_FLAGS))
+    ttl = float(os.environ.get("S3_EXPOSURE_CACHE_SECONDS", DEFAULT_S3_EXPOSURE_CACHE_SECONDS))
+    if ttl > 0:
+        with _results_lock:
+            cached = _results.get(key)
+            if cached is not None and time.time() - cached[1] < ttl:
+                _results.move_to_end(key)
+                return cached[0]
+
+    exposure = probe_bucket_exposure(bucket_name, s3_client, throttle, account_block)
+    if ttl > 0:
+        max_entries = int(os.environ.get("S3_EXPOSURE_CACHE_MAX_ENTRIES", DEFAULT_S3_EXPOSURE_CACHE_MAX_ENTRIES))
+        with _results_lock:
+            _results[key] = (exposure, time.time())
+            _results.move_to_end(key)
+            while len(_results) > max_entries:
+                _results.popitem(last=False)
+    return exposure
+
+
+def invalidate_bucket_exposure(bucket_name: str, account_id: str = None):
+    """
+    Drops the cached results of a bucket (every version and account configuration).
+    """
+    with _results_lock:
+        for key in [key for key in _results if key[0] == (account_id or "") and key[1] == bucket_name]:
+            del _results[key]
+
+
+def clear_exposure_cache():
+    with _results_lock:
+        _results.clear()
@@ -0,0 +1,231 @@
+"""
+Scan State Module
+Snapshot of the previous scan used for incremental scanning and finding diffs
+Owner: Alejandro (Infrastructure & Metrics Architect)
+
+INTERFACE NOTES:
+With INCREMENTAL_SCAN=true, collect_security_metrics() loads the last snapshot for the
+account, lets the per-resource probes (bucket ACL/policy, per-user MFA) reuse results
+for resources whose list metadata is unchanged, and adds a "changes" entry to the
+findings:
+
+{
+    "encryption": {"added": ["vol-789"], "removed": ["vol-123"], "unchanged_count": 1, "unobserved_count": 0},
+    ...
+}
+
+Only resources this run actually evaluated are diffed. A previous finding whose
+resource couldn't be evaluated (its region failed, its probe errored, see skip() and
+skip_region()) is neither "removed" nor dropped from the snapshot: it is carried
+forward and counted as unobserved until a later run evaluates it again.
+
+Only compliant probe results are reused (a private bucket, a user with MFA), and only
+for INCREMENTAL_MAX_AGE_HOURS, so every finding is re-verified on each run and a
+resource that silently drifts is caught by the next full probe.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_INCREMENTAL_MAX_AGE_HOURS = 24
+SNAPSHOT_VERSION = 1
+
+# Diff categories that come from a differently named check
+CATEGORY_CHECKS = {
+    "public_ec2_IPs": "exposure",
+    "public_s3_buckets": "exposure",
+}
+
+
+class ScanSnapshot:
+    """
+    Per-resource probe results from the previous run plus the ones recorded by this run.
+
+    Probe results are stored compactly as {kind: {name: [version, compliant, probed_at]}}
+    where version is list-level metadata that changes when the resource is replaced
+    (bucket CreationDate, IAM UserId).
+    """
+
+    def __init__(self, previous: Dict[str, any] = None, max_age_hours: float = DEFAULT_INCREMENTAL_MAX_AGE_HOURS):
+        previous = previous or {}
+        if previous.get("version") != SNAPSHOT_VERSION:
+            previous = {}
+        self.previous_probes = previous.get("probes", {})
+        self.previous_findings = previous.get("findings", {})
+        # Region of each previous finding's resource, for findings of skipped regions
+        self.previous_regions = previous.get("regions", {})
+        self.max_age_seconds = max_age_hours * 3600
+        self.probes = {}
+        self.findings = {}
+        self.regions = {}
+        self.reused = 0
+        # Resources (per category) and regions (per check) this run couldn't evaluate
+        self.skipped = {}
+        self.skipped_regions = {}
+        self._lock = threading.Lock()
+
+    def cached_compliant(self, kind: str, name: str, version: str) -> Optional[bool]:
+        """
+        Returns True if a fresh compliant result can be reused for this resource,
+        otherwise None (the resource must be probed). Reused results are carried
+        over into the new snapshot with their original probe time.
+        """
+        entry = self.previous_probes.get(kind, {}).get(name)
+        if not entry:
+            return None
+        cached_version, compliant, probed_at = entry
+        if cached_version != version or not compliant or time.time() - probed_at > self.max_age_seconds:
+            return None
+        with self._lock:
+            self.probes.setdefault(kind, {})[name] = entry
+            self.reused += 1
+        return True
+
+    def record(self, kind: str, name: str, version: str, compliant: bool):
+        """
+        Records a fresh probe result.
+        """
+        with self._lock:
+            self.probes.setdefault(kind, {})[name] = [version, compliant, time.time()]
+
+    def skip(self, category: str, resource_id: str):
+        """
+        Records a resource this run couldn't evaluate (e.g. its probe failed); its
+        previous findings are carried forward instead of being diffed.
+        """
+        with self._lock:
+            self.skipped.setdefault(category, set()).add(resource_id)
+
+    def skip_region(self, check: str, region: str):
+        """
+        Records a region the check couldn't scan; the previous findings of the
+        check's resources in that region are carried forward instead of being diffed.
+        """
+        with self._lock:
+            self.skipped_regions.setdefault(check, set()).add(region)
+
+    def _unobserved(self, category: str, keys: List[str]) -> List[str]:
+        """
+        The previous finding keys of a category whose resource this run skipped.
+        """
+        skipped = self.skipped.get(category, set())
+        skipped_regions = self.skipped_regions.get(CATEGORY_CHECKS.get(category, category), set())
+        if not skipped and not skipped_regions:
+            return []
+        return [
+            key for key in keys
+            if resource_of(key) in skipped or self.previous_regions.get(resource_of(key)) in skipped_regions
+        ]
+
+    def diff(self, findings: Dict[str, any], failed_checks: List[str] = ()) -> Dict[str, any]:
+        """
+        Compares this run's findings with the previous snapshot.
+
+        Categories whose check failed are left out of the diff and keep their
+        previous keys, so a transient failure doesn't report every finding as removed.
+        Likewise within a category, the previous keys of skipped resources and regions
+        are kept and counted as unobserved rather than removed.
+
+        Returns:
+            {category: {"added": [...], "removed": [...], "unchanged_count": n, "unobserved_count": n}}
+        """
+        current = finding_keys(findings)
+        resource_regions = findings.get("resource_regions", {})
+        changes = {}
+        for category, keys in current.items():
+            if CATEGORY_CHECKS.get(category, category) in failed_checks:
+                if category in self.previous_findings:
+                    self.findings[category] = self.previous_findings[category]
+                    self._keep_regions(self.previous_findings[category], self.previous_regions)
+                continue
+            # Nothing previous on the first scan of a category: everything is new
+            previous = set(self.previous_findings.get(category, []))
+            keys_set = set(keys)
+            unobserved = set(self._unobserved(category, previous)) - keys_set
+            self.findings[category] = keys + sorted(unobserved)
+            self._keep_regions(keys, resource_regions)
+            self._keep_regions(unobserved, self.previous_regions)
+            changes[category] = {
+                "added": sorted(keys_set - previous),
+                "removed": sorted(previous - keys_set - unobserved),
+                "unchanged_count": len(keys_set & previous),
+                "unobserved_count": len(unobserved),
+            }
+        return changes
+
+    def _keep_regions(self, keys, regions: Dict[str, str]):
+        for key in keys:
+            region = regions.get(resource_of(key))
+            if region:
+                self.regions[resource_of(key)] = region
+
+    def update_resource(self, category: str, resource_id: str, keys: List[str]) -> Optional[Dict[str, any]]:
+        """
+        Replaces one resource's finding keys in the previous snapshot's findings,
+        as after an event-driven re-evaluation, and returns the change.
+        Any cached probe result for the resource is dropped so the next
+        incremental scan probes it again.
+
+        Returns None when the category was never scanned, since there is no
+        baseline to update.
+        """
+        # The updated previous snapshot becomes the one to save
+        self.probes = self.previous_probes
+        self.findings = self.previous_findings
+        self.regions = self.previous_regions
+        for probes in self.probes.values():
+            probes.pop(resource_id, None)
+        if category not in self.findings:
+            return None
+        previous = {
+            key for key in self.findings[category]
+            if key == resource_id or key.startswith(f"{resource_id}:")
+        }
+        current = set(keys)
+        self.findings[category] = [key for key in self.findings[category] if key not in previous] + list(keys)
+        return {
+            "added": sorted(current - previous),
+            "removed": sorted(previous - current),
+            "unchanged_count": len(current & previous),
+        }
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            "version": SNAPSHOT_VERSION,
+            "saved_at": time.time(),
+            "probes": self.probes,
+            "findings": self.findings,
+            "regions": self.regions,
+        }
+
+
+def finding_keys(findings: Dict[str, any]) -> Dict[str, List[str]]:
+    """
+    Reduces findings to one stable string key per finding, per category.
+    """
+    keys = {}
+    if "mfa_iam" in findings:
+        keys["mfa_iam"] = list(findings["mfa_iam"].get("non_compliant_users", []))
+    if "encryption" in findings:
+        keys["encryption"] = list(findings["encryption"])
+    if "exposure" in findings:
+        keys["public_ec2_IPs"] = list(findings["exposure"].get("public_ec2_IPs", []))
+        keys["public_s3_buckets"] = list(findings["exposure"].get("public_s3_buckets", []))
+    if "security_groups" in findings:
+        keys["security_groups"] = [security_group_key(sg) for sg in findings["security_groups"]]
+    return keys
+
+
+def resource_of(key: str) -> str:
+    """
+    Resource ID of a finding key (security group keys carry the rule after a colon).
+    """
+    return key.split(":", 1)[0]
+
+
+def security_group_key(rule: Dict[str, any]) -> str:
+    """
+    Key of one risky security group rule entry, prefixed by its group ID.
+    """
+    return f"{rule.get('SecurityGroupId')}:{rule.get('Protocol')}:{rule.get('FromPort')}-{rule.get('ToPort')}"
@@ -0,0 +1,227 @@
+"""
+Security Group Rule Engine
+Parses security group rules into networks and port intervals and indexes internet exposure
+Owner: Alejandro (Infrastructure & Metrics Architect)
+
+INTERFACE NOTES:
+A rule source is internet-facing when it is at least as broad as SG_MAX_OPEN_PREFIX_V4
+(default /8) or SG_MAX_OPEN_PREFIX_V6 (default /32) and not entirely inside private,
+loopback, link-local or shared address space. That covers 0.0.0.0/0 and ::/0 as well
+as split ranges like 0.0.0.0/1 + 128.0.0.0/1. Managed prefix lists are expanded into
+their CIDRs; rules referencing other security groups are never internet-facing.
+
+exposed_rules() yields one entry per exposing rule, in the format check_security_groups()
+has always returned plus the exposing networks:
+
+{
+    "SecurityGroupId": "sg-123", "SecurityGroupName": "web", "VpcId": "vpc-1",
+    "Protocol": "tcp", "FromPort": 22, "ToPort": 22,
+    "Cidrs": ["0.0.0.0/0", "::/0"]
+}
+
+ExposureIndex answers "which groups expose port X to the internet" without scanning
+every rule.
+"""
+
+import ipaddress
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+DEFAULT_SG_MAX_OPEN_PREFIX_V4 = 8
+DEFAULT_SG_MAX_OPEN_PREFIX_V6 = 32
+
+# Address space that is never reachable from the internet
+NON_INTERNET_NETWORKS = tuple(ipaddress.ip_network(cidr) for cidr in (
+    "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "100.64.0.0/10",
+    "127.0.0.0/8", "169.254.0.0/16",
+    "fc00::/7", "fe80::/10", "::1/128",
+))
+
+# IpProtocol values as returned by DescribeSecurityGroups -> protocol name
+PROTOCOL_NAMES = {"-1": "all", "6": "tcp", "17": "udp", "1": "icmp", "58": "icmpv6"}
+
+ALL_PORTS = (0, 65535)
+
+# Administrative ports highlighted in reports
+ADMIN_PORTS = {22: "SSH", 3389: "RDP"}
+
+
+def is_internet_cidr(cidr: str) -> bool:
+    """
+    True if a rule source CIDR opens the rule to the internet (see module notes).
+    """
+    if ":" in cidr:
+        max_prefix = int(os.environ.get("SG_MAX_OPEN_PREFIX_V6", DEFAULT_SG_MAX_OPEN_PREFIX_V6))
+    else:
+        max_prefix = int(os.environ.get("SG_MAX_OPEN_PREFIX_V4", DEFAULT_SG_MAX_OPEN_PREFIX_V4))
+    return _is_internet_cidr(cidr, max_prefix)
+
+
+@lru_cache(maxsize=65536)
+def _is_internet_cidr(cidr: str, max_prefix: int) -> bool:
+    """
+    is_internet_cidr() for a given prefix limit. Results are cached per CIDR and limit:
+    estates reuse a handful of CIDRs across thousands of rules.
+    """
+    # Most sources are narrow (single hosts, subnets); reject them before parsing
+    _, _, prefix = cidr.partition("/")
+    if prefix.isdigit() and int(prefix) > max_prefix:
+        return False
+    try:
+        network = ipaddress.ip_network(cidr, strict=False)
+    except ValueError:
+        return False
+    if network.prefixlen > max_prefix:
+        return False
+    return not any(
+        network.version == private.version and network.subnet_of(private)
+        for private in NON_INTERNET_NETWORKS
+    )
+
+
+def clear_cidr_cache():
+    _is_internet_cidr.cache_clear()
+
+
+def normalize_protocol(ip_protocol) -> str:
+    """
+    Maps an IpProtocol value ("-1", "6", "tcp", ...) to a protocol name.
+    """
+    ip_protocol = str(ip_protocol).lower()
+    return PROTOCOL_NAMES.get(ip_protocol, ip_protocol)
+
+
+def port_interval(permission: Dict[str, any]) -> Tuple[int, int]:
+    """
+    Inclusive (from, to) port interval of an IpPermission. All-protocol rules and rules
+    without ports cover every port; for ICMP the "ports" are type/code.
+    """
+    if normalize_protocol(permission.get("IpProtocol")) == "all":
+        return ALL_PORTS
+    from_port, to_port = permission.get("FromPort"), permission.get("ToPort")
+    if from_port is None or to_port is None or from_port < 0 or to_port < 0:
+        return ALL_PORTS
+    return from_port, to_port
+
+
+def rule_sources(permission: Dict[str, any], prefix_lists: Dict[str, List[str]] = None) -> Iterator[str]:
+    """
+    Yields every CIDR a rule allows: IPv4 and IPv6 ranges plus expanded prefix lists.
+    """
+    for ip_range in permission.get("IpRanges", []):
+        yield ip_range.get("CidrIp")
+    for ip_range in permission.get("Ipv6Ranges", []):
+        yield ip_range.get("CidrIpv6")
+    for prefix_list in permission.get("PrefixListIds", []):
+        yield from (prefix_lists or {}).get(prefix_list.get("PrefixListId"), [])
+
+
+def referenced_prefix_lists(security_groups: Iterable[Dict[str, any]]) -> Set[str]:
+    """
+    IDs of the managed prefix lists used by the ingress rules of the given groups.
+    """
+    return {
+        prefix_list["PrefixListId"]
+        for sg in security_groups
+        for permission in sg.get("IpPermissions", [])
+        for prefix_list in permission.get("PrefixListIds", [])
+        if prefix_list.get("PrefixListId")
+    }
+
+
+def exposed_rules(sg: Dict[str, any], prefix_lists: Dict[str, List[str]] = None) -> Iterator[Dict[str, any]]:
+    """
+    Yields one entry per ingress rule of a DescribeSecurityGroups entry that is open
+    to the internet.
+
+    Args:
+        sg: Security group from DescribeSecurityGroups
+        prefix_lists: Prefix list ID -> CIDRs, for rules using managed prefix lists
+    """
+    for permission in sg.get("IpPermissions", []):
+        cidrs = [cidr for cidr in rule_sources(permission, prefix_lists) if cidr and is_internet_cidr(cidr)]
+        if not cidrs:
+            continue
+        from_port, to_port = port_interval(permission)
+        yield {
+            "SecurityGroupId": sg["GroupId"],
+            "SecurityGroupName": sg.get("GroupName", "Unknown"),
+            "VpcId": sg.get("VpcId"),
+            "FromPort": from_port,
+            "ToPort": to_port,
+            "Protocol": normalize_protocol(permission.get("IpProtocol")),
+            "Cidrs": cidrs,
+        }
+
+
+def attached_group_ids(network_interfaces: Iterable[Dict[str, any]]) -> Set[str]:
+    """
+    IDs of the security groups used by in-use network interfaces, i.e. attached to
+    an instance, load balancer, Lambda function, database or other running resource.
+    """
+    return {
+        group["GroupId"]
+        for eni in network_interfaces
+        if eni.get("Status") == "in-use"
+        for group in eni.get("Groups", [])
+    }
+
+
+class ExposureIndex:
+    """
+    Index of internet-exposed port intervals per protocol.
+
+    Narrow intervals (up to WIDE_INTERVAL ports) are indexed by each port, so a
+    port query is a dict lookup; wider intervals (port ranges, all-traffic rules)
+    are few and kept in a list that is scanned per query.
+    """
+
+    WIDE_INTERVAL = 256
+
+    def __init__(self, entries: Iterable[Dict[str, any]] = ()):
+        self._by_port = {}
+        self._wide = []
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry: Dict[str, any]):
+        """
+        Adds an exposed_rules() entry (or a security_groups finding from a stored report).
+        """
+        protocol, group_id = normalize_protocol(entry.get("Protocol")), entry["SecurityGroupId"]
+        from_port, to_port = entry.get("FromPort"), entry.get("ToPort")
+        if from_port is None or to_port is None or protocol == "all":
+            # Entries from older reports stored all-traffic rules without ports
+            from_port, to_port = ALL_PORTS
+        if to_port - from_port + 1 > self.WIDE_INTERVAL:
+            self._wide.append((protocol, from_port, to_port, group_id))
+            return
+        for port in range(from_port, to_port + 1):
+            self._by_port.setdefault((protocol, port), set()).add(group_id)
+
+    def groups_exposing(self, port: int, protocol: str = "tcp") -> Set[str]:
+        """
+        IDs of the groups exposing a port to the internet over a protocol,
+        including all-traffic rules.
+        """
+        groups = set()
+        for candidate in (protocol, "all"):
+            groups |= self._by_port.get((candidate, port), set())
+        groups.update(
+            group_id for rule_protocol, from_port, to_port, group_id in self._wide
+            if rule_protocol in (protocol, "all") and from_port <= port <= to_port
+        )
+        return groups
+
+    def admin_port_exposure(self) -> Dict[str, List[str]]:
+        """
+        Groups exposing each administrative port over TCP, e.g. {"22 (SSH)": ["sg-1"]}.
+        """
+        exposure = {}
+        for port, name in ADMIN_PORTS.items():
+            groups = self.groups_exposing(port, "tcp")
+            if groups:
+                exposure[f"{port} ({name})"] = sorted(groups)
+        return exposure
+
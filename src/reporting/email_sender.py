@@ -9,10 +9,12 @@ be available via environment variable SNS_TOPIC_ARN if needed.
 """
 
 import os
-import boto3
+import sys
 from typing import Dict, List
 
-sns = boto3.client("sns")
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.aws_helpers import get_boto3_client
 
 
 def send_report_email(report: Dict[str, any], recipients: List[str], sns_topic_arn: str = None):
@@ -53,6 +55,7 @@ CSV Report:  {report.get('csv_s3_path')}
 """
 
     # 4. Publish message to SNS topic
+    sns = get_boto3_client("sns", region=None)
     sns.publish(
         TopicArn=sns_topic_arn,
         Subject=subject,
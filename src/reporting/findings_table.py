@@ -0,0 +1,263 @@
+"""
+Findings Table
+Columnar, dictionary-encoded findings with Parquet export for Athena
+Owner: Kelly (Reporting & Visualization Lead)
+
+INTERFACE NOTES:
+FindingsTable.from_findings() flattens the findings of collect_security_metrics() or
+collect_multi_account_metrics() into one row per finding:
+
+    account_id | region    | check           | category          | resource_id | detail    | severity
+    1111...    | us-east-1 | security_groups | security_groups   | sg-123      | tcp:22-22 | high
+    1111...    |           | exposure        | public_s3_buckets | bucket-1    |           | high
+
+Rows come from the findings' Finding records (see metrics_collector/findings.py), or
+are derived from the category results for findings without records (e.g. sample data).
+
+Every column is dictionary-encoded: each distinct value is stored once and rows hold
+compact integer codes, so millions of rows across accounts and days fit in a few
+bytes per cell. Aggregations (counts) group on the codes, with NumPy when it is
+installed and a Counter otherwise.
+
+export_parquet() needs pyarrow (e.g. the AWS SDK for pandas Lambda layer) and writes
+one file per day, partitioned Hive-style for Athena:
+
+    s3://<REPORTS_BUCKET>/findings/scan_date=2025-11-27/findings.parquet
+
+Re-running a day replaces that day's file, like the daily JSON report.
+"""
+
+import io
+import os
+import sys
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, Tuple
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from metrics_collector.scan_state import CATEGORY_CHECKS, finding_keys
+from utils.aws_helpers import get_boto3_client
+from utils.rules_engine import get_rules
+
+COLUMNS = ("account_id", "region", "check", "category", "resource_id", "detail", "severity")
+
+DEFAULT_FINDINGS_PREFIX = "findings"
+
+
+def _numpy():
+    """
+    NumPy if installed; aggregations fall back to pure Python without it.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class CategoricalColumn:
+    """
+    A dictionary-encoded column: distinct values in insertion order plus one code per row.
+    """
+
+    __slots__ = ("categories", "codes", "_index")
+
+    def __init__(self):
+        self.categories = []
+        self.codes = array('I')
+        self._index = {}
+
+    def _code(self, value: str) -> int:
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(value)
+        return code
+
+    def append(self, value: str):
+        self.codes.append(self._code(value))
+
+    def append_repeated(self, value: str, count: int):
+        self.codes.extend(array('I', [self._code(value)]) * count)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self) -> Iterator[str]:
+        categories = self.categories
+        return (categories[code] for code in self.codes)
+
+
+class FindingsTable:
+    """
+    Columnar findings, one row per finding (see module notes).
+    """
+
+    def __init__(self):
+        self.columns = {name: CategoricalColumn() for name in COLUMNS}
+
+    def append(self, account_id: str, region: str, check: str, category: str, resource_id: str,
+               detail: str = "", severity: str = ""):
+        """
+        Adds one finding. Global resources (S3 buckets, IAM users) have an empty region.
+        """
+        for name, value in zip(COLUMNS, (account_id, region, check, category, resource_id, detail, severity)):
+            self.columns[name].append(value or "")
+
+    def extend_records(self, records: Iterable[any], account_id: str = ""):
+        """
+        Adds Finding records; records without an account get account_id.
+        """
+        columns = [self.columns[name] for name in COLUMNS]
+        for record in records:
+            values = (record.account_id or account_id, record.region, record.check, record.category,
+                      record.resource_id, record.detail, record.severity)
+            for column, value in zip(columns, values):
+                column.append(value)
+
+    def extend_findings(self, findings: Dict[str, any], account_id: str = ""):
+        """
+        Adds the findings of one account's collect_security_metrics() run.
+        """
+        if "records" in findings:
+            self.extend_records(findings["records"], account_id)
+            return
+
+        resource_regions = findings.get("resource_regions", {})
+        severities = {rule.id: rule.severity for rule in get_rules()}
+        columns = self.columns
+        for category, keys in finding_keys(findings).items():
+            # Account, check, category and severity are the same for the whole category
+            columns["account_id"].append_repeated(account_id or "", len(keys))
+            columns["check"].append_repeated(CATEGORY_CHECKS.get(category, category), len(keys))
+            columns["category"].append_repeated(category, len(keys))
+            columns["severity"].append_repeated(severities.get(category, ""), len(keys))
+            for key in keys:
+                # Security group keys are "<group id>:<protocol>:<from>-<to>"
+                resource_id, _, detail = key.partition(":") if category == "security_groups" else (key, "", "")
+                columns["region"].append(resource_regions.get(resource_id, ""))
+                columns["resource_id"].append(resource_id)
+                columns["detail"].append(detail)
+
+    @classmethod
+    def from_findings(cls, findings: Dict[str, any], account_id: str = "") -> "FindingsTable":
+        """
+        Builds a table from single-account or multi-account findings.
+
+        Args:
+            findings: Findings from collect_security_metrics() or collect_multi_account_metrics()
+            account_id: Account of single-account findings (multi-account findings carry their own)
+        """
+        table = cls()
+        accounts = findings.get("accounts")
+        if accounts:
+            for account, account_findings in accounts.items():
+                table.extend_findings(account_findings, account)
+        else:
+            table.extend_findings(findings, account_id)
+        return table
+
+    def __len__(self):
+        return len(self.columns["resource_id"])
+
+    def rows(self) -> Iterator[Tuple[str, ...]]:
+        return zip(*(self.columns[name] for name in COLUMNS))
+
+    def counts(self, *by: str) -> Dict[Tuple[str, ...], int]:
+        """
+        Number of rows per distinct combination of the given columns,
+        e.g. counts("category", "region") -> {("encryption", "us-east-1"): 12, ...}
+        """
+        columns = [self.columns[name] for name in by]
+        numpy = _numpy()
+        if numpy is None or not len(self):
+            code_counts = Counter(zip(*(column.codes for column in columns)))
+            return {
+                tuple(column.categories[code] for column, code in zip(columns, codes)): count
+                for codes, count in code_counts.items()
+            }
+
+        # Combine the codes of all grouping columns into one integer key per row
+        key = numpy.zeros(len(self), dtype=numpy.int64)
+        key_space = 1
+        for column in columns:
+            key = key * len(column.categories) + numpy.frombuffer(column.codes, dtype=column.codes.typecode)
+            key_space *= len(column.categories)
+        if key_space <= max(len(self), 1 << 16):
+            # Few combinations (account x region x check): count them in one pass
+            key_counts = numpy.bincount(key, minlength=key_space)
+            unique_keys = numpy.flatnonzero(key_counts)
+            key_counts = key_counts[unique_keys]
+        else:
+            unique_keys, key_counts = numpy.unique(key, return_counts=True)
+        result = {}
+        for combined, count in zip(unique_keys.tolist(), key_counts.tolist()):
+            values = []
+            for column in reversed(columns):
+                combined, code = divmod(combined, len(column.categories))
+                values.append(column.categories[code])
+            result[tuple(reversed(values))] = count
+        return result
+
+    def to_arrow(self):
+        """
+        Returns the table as a pyarrow Table with dictionary-encoded string columns.
+        Raises ImportError if pyarrow is not installed.
+        """
+        import pyarrow
+
+        arrays = [
+            pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array(self.columns[name].codes, type=pyarrow.int32()),
+                pyarrow.array(self.columns[name].categories, type=pyarrow.string()),
+            )
+            for name in COLUMNS
+        ]
+        return pyarrow.Table.from_arrays(arrays, names=list(COLUMNS))
+
+
+def findings_key(scan_date: str, prefix: str = None) -> str:
+    """
+    S3 key of a day's findings file, e.g. 'findings/scan_date=2025-11-27/findings.parquet'.
+    """
+    prefix = prefix or os.environ.get("FINDINGS_PREFIX", DEFAULT_FINDINGS_PREFIX)
+    return f"{prefix}/scan_date={scan_date}/findings.parquet"
+
+
+def export_parquet(table: FindingsTable, bucket_name: str, scan_date: str, prefix: str = None) -> str:
+    """
+    Writes a findings table to S3 as Snappy-compressed Parquet.
+
+    Args:
+        table: Findings to export
+        bucket_name: S3 bucket name (from environment variable REPORTS_BUCKET)
+        scan_date: Partition date, e.g. '2025-11-27'
+        prefix: Key prefix (default: FINDINGS_PREFIX env var or 'findings')
+
+    Returns:
+        S3 key of the written file
+    """
+    import pyarrow.parquet
+
+    buffer = io.BytesIO()
+    pyarrow.parquet.write_table(table.to_arrow(), buffer, compression="snappy")
+    key = findings_key(scan_date, prefix)
+    get_boto3_client("s3", region=None).put_object(
+        Bucket=bucket_name,
+        Key=key,
+        Body=buffer.getvalue(),
+        ContentType="application/vnd.apache.parquet",
+    )
+    return key
+
+
+def nested_counts(counts: Dict[Tuple[str, str], int]) -> Dict[str, Dict[str, int]]:
+    """
+    Turns two-column counts into {first: {second: count}}, e.g. category -> region -> count.
+    """
+    nested = {}
+    for (first, second), count in sorted(counts.items()):
+        nested.setdefault(first, {})[second] = count
+    return nested
+
@@ -33,16 +33,51 @@ Example structure from collect_security_metrics():
 """
 
 import json
-import boto3
+import os
+import sys
 from datetime import datetime
 from typing import Dict, List
 
-s3 = boto3.client("s3")
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from metrics_collector.sg_rules import ExposureIndex
+from reporting.findings_table import FindingsTable, nested_counts
+from utils.aws_helpers import get_boto3_client
+from utils.rules_engine import check_failures, evaluate_rules, failed_checks, get_rules, skipped_resources
 
 # ------------------------------------------------------------------------------------
 # DAILY REPORT
 # ------------------------------------------------------------------------------------
 
+DAILY_REPORT_PREFIX = "reports/daily/report_"
+
+# Checks with their own section in the daily summary: check -> section
+SUMMARY_CHECKS = {"mfa_iam": "iam", "encryption": "encryption", "exposure": "exposure",
+                  "security_groups": "security_groups"}
+
+CHECK_FAILED = "check failed"
+CHECK_PARTIAL = "partial"
+
+
+def daily_report_key(date_str: str) -> str:
+    """
+    S3 key of a day's report, e.g. 'reports/daily/report_2025-11-27.json'.
+    """
+    return f"{DAILY_REPORT_PREFIX}{date_str}.json"
+
+
+def check_errors_by_check(metrics: Dict[str, any]) -> Dict[str, str]:
+    """
+    Error of each failed check; multi-account errors ("<account>:<check>") are joined per check.
+    """
+    errors = {}
+    for name, error in metrics.get("check_errors", {}).items():
+        account, _, check = name.rpartition(":")
+        message = f"{account}: {error}" if account else error
+        errors[check] = f"{errors[check]}; {message}" if check in errors else message
+    return errors
+
+
 def generate_daily_report(metrics: Dict[str, any]) -> Dict[str, any]:
     """
     Generates daily summary report from security metrics returned by collect_security_metrics().
@@ -58,9 +93,6 @@ def generate_daily_report(metrics: Dict[str, any]) -> Dict[str, any]:
     encryption = metrics.get("encryption", [])
     exposure = metrics.get("exposure", {})
     security_groups = metrics.get("security_groups", [])
-    # CloudTrail and login_attempts disabled for presentation consistency
-    # cloudtrail = metrics.get("cloudtrail", {})
-    # login_attempts = metrics.get("login_attempts", {})
 
     non_compliant_users = mfa_iam.get("non_compliant_users", [])
     total_users = mfa_iam.get("total_users", 0)
@@ -89,21 +121,68 @@ def generate_daily_report(metrics: Dict[str, any]) -> Dict[str, any]:
             "security_groups": {
                 "risky_sg_count": len(security_groups),
                 "risky_sg_details": security_groups,
+                # Groups exposing SSH/RDP to the internet, e.g. {"22 (SSH)": ["sg-123"]}
+                "admin_port_exposure": ExposureIndex(security_groups).admin_port_exposure(),
             },
-            # "cloudtrail": {  # Disabled for presentation
-            #     "cloudtrail_enabled": cloudtrail.get("cloudtrail_enabled", False),
-            #     "active_trails": cloudtrail.get("active_trails", []),
-            #     "inactive_trails": cloudtrail.get("inactive_trails", []),
-            #     "total_trails": cloudtrail.get("total_trails", 0),
-            # },
-            # "login_attempts": {  # Disabled for presentation
-            #     "failed_login_count": login_attempts.get("failed_login_count", 0),
-            #     "failed_logins": login_attempts.get("failed_logins", []),
-            #     "period_hours": login_attempts.get("period_hours", 24),
-            # },
         },
     }
 
+    # Outcome of every security rule, plus the results of checks enabled in the rules
+    # policy that have no section above (e.g. cloudtrail, login_attempts)
+    results = evaluate_rules(metrics)
+    report["summary"]["rules"] = {}
+    for result in results:
+        outcome = {
+            "severity": result.rule.severity,
+            "value": result.metric_value,
+            "count": result.count,
+            "violated": result.violated,
+        }
+        if result.partial:
+            outcome["status"] = CHECK_PARTIAL
+            if result.failed_accounts:
+                outcome["failed_accounts"] = result.failed_accounts
+            if result.skipped:
+                outcome["skipped"] = result.skipped
+        report["summary"]["rules"][result.rule.id] = outcome
+    for check in sorted({result.rule.check for result in results} - set(SUMMARY_CHECKS)):
+        report["summary"][check] = metrics[check]
+
+    # A failed check's empty result is not an all-clear: its section and rules say so.
+    # A check that failed in some accounts, or skipped some regions or resources, keeps
+    # the rest of its results, marked partial
+    errors = check_errors_by_check(metrics)
+    failed = failed_checks(metrics)
+    failures = check_failures(metrics)
+    skipped = skipped_resources(metrics)
+    for rule in get_rules():
+        if rule.check in failed:
+            report["summary"]["rules"][rule.id] = {"severity": rule.severity, "status": CHECK_FAILED}
+    for check in sorted(set(errors) | set(skipped)):
+        section = SUMMARY_CHECKS.get(check, check)
+        if check in failed:
+            report["summary"][section] = {"status": CHECK_FAILED, "error": errors[check]}
+        elif isinstance(report["summary"].get(section), dict):
+            partial = {"status": CHECK_PARTIAL}
+            if check in errors:
+                partial.update(failed_accounts=failures[check], error=errors[check])
+            if check in skipped:
+                partial["skipped"] = skipped[check]
+            report["summary"][section] = dict(report["summary"][section], **partial)
+
+    # Per-region (and per-account) finding counts, aggregated on the columnar table;
+    # S3 buckets and IAM users are global
+    table = FindingsTable.from_findings(metrics)
+    report["summary"]["findings_by_region"] = nested_counts({
+        (category, region or "global"): count for (category, region), count in table.counts("category", "region").items()
+    })
+    if metrics.get("accounts"):
+        report["summary"]["findings_by_account"] = nested_counts(table.counts("category", "account_id"))
+
+    # Incremental scans report which findings are new or resolved since the last run
+    if "changes" in metrics:
+        report["changes"] = metrics["changes"]
+
     return report
 
 # ------------------------------------------------------------------------------------
@@ -216,6 +295,7 @@ def save_report_to_s3(report: Dict[str, any], bucket_name: str, key: str):
     """
 
     try:
+        s3 = get_boto3_client("s3", region=None)
         s3.put_object(
             Bucket=bucket_name,
             Key=key,
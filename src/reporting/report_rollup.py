@@ -0,0 +1,392 @@
+"""
+Report Rollup
+Weekly/monthly reports streamed from the daily reports stored in S3
+Owner: Kelly (Reporting & Visualization Lead)
+
+INTERFACE NOTES:
+generate_rollup_report() lists reports/daily/report_<date>.json for the period, fetches
+them concurrently and folds them into a RollupAggregator in date order. Each report is
+reduced to its finding keys as soon as it is downloaded, so memory grows with the
+number of distinct findings, not with the number of days.
+
+The summary section has the same shape as generate_weekly_report(); the rollup adds
+per-day counts and per-resource history:
+
+{
+    "period": "weekly", "start_date": "2025-11-21", "end_date": "2025-11-27",
+    "days_covered": 7, "missing_days": [],
+    "summary": {...},
+    "daily_counts": {"2025-11-27": {"mfa_iam": 2, "encryption": 1, ...}, ...},
+    "resources": {
+        "encryption": {
+            "vol-123": {"first_seen": "2025-11-21", "last_seen": "2025-11-27",
+                        "days_seen": 7, "days_open": 7, "open": true}
+        },
+        ...
+    }
+}
+
+"open" means the finding was still present in the latest report of the period.
+
+A day whose check failed (its section is marked "check failed", see
+generate_daily_report()) says nothing about that check's findings: its categories
+are left out of that day's counts and the finding history, "open" is judged by the
+latest report in which the check succeeded, and the day is listed per category
+under "failed_days".
+
+Unless ROLLUP_CACHE=false, rollups are merged from per-day partials kept by
+rollup_cache.py, so only new or rewritten daily reports are downloaded, and
+generate_trend() returns 90 days of counts without reading any unchanged report.
+
+Usage:
+    cd src && python -m reporting.report_rollup my-reports-bucket --period monthly --save
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from reporting.report_generator import CHECK_FAILED, DAILY_REPORT_PREFIX, save_report_to_s3
+from utils.aws_helpers import get_boto3_client, handle_error, logger, paginate
+
+# Days covered by each rollup period, ending on (and including) the end date
+ROLLUP_PERIODS = {"weekly": 7, "monthly": 30}
+
+DEFAULT_ROLLUP_MAX_CONCURRENCY = 8
+
+CATEGORIES = ("mfa_iam", "encryption", "public_ec2_IPs", "public_s3_buckets", "security_groups")
+
+# Daily report section of each category
+CATEGORY_SECTIONS = {"mfa_iam": "iam", "encryption": "encryption", "public_ec2_IPs": "exposure",
+                     "public_s3_buckets": "exposure", "security_groups": "security_groups"}
+
+
+def daily_finding_keys(report: Dict[str, any]) -> Dict[str, any]:
+    """
+    Reduces a stored daily report to its finding keys per category.
+    Security groups are keyed by group ID, as in the weekly report.
+    A category whose check failed that day is CHECK_FAILED instead of a list.
+    """
+    summary = report.get("summary", {})
+    iam = summary.get("iam", {})
+    exposure = summary.get("exposure", {})
+    keys = {
+        "mfa_iam": list(iam.get("non_compliant_users", [])),
+        "encryption": list(summary.get("encryption", {}).get("unencrypted_volumes", [])),
+        "public_ec2_IPs": list(exposure.get("public_ec2_instances", [])),
+        "public_s3_buckets": list(exposure.get("public_s3_buckets", [])),
+        "security_groups": sorted({
+            rule["SecurityGroupId"]
+            for rule in summary.get("security_groups", {}).get("risky_sg_details", [])
+            if rule.get("SecurityGroupId")
+        }),
+    }
+    for category, section in CATEGORY_SECTIONS.items():
+        if summary.get(section, {}).get("status") == CHECK_FAILED:
+            keys[category] = CHECK_FAILED
+    return keys
+
+
+class RollupAggregator:
+    """
+    Folds daily finding keys into per-resource first-seen/last-seen/days-seen
+    statistics. Days must be added in ascending date order.
+    """
+
+    def __init__(self):
+        # category -> resource key -> [first_seen, last_seen, days_seen]
+        self.resources = {category: {} for category in CATEGORIES}
+        self.daily_counts = {}
+        self.failed_days = {}
+        self.total_users_last_observed = 0
+        # Latest day each category was observed (its check succeeded)
+        self.last_dates = dict.fromkeys(CATEGORIES)
+
+    def add_day(self, day: str, keys: Dict[str, any], total_users: int = None):
+        """
+        Adds one day's findings.
+
+        Args:
+            day: Report date, e.g. '2025-11-27'
+            keys: Category -> finding keys or CHECK_FAILED, see daily_finding_keys()
+            total_users: IAM users in that day's report
+        """
+        if total_users is not None:
+            self.total_users_last_observed = total_users
+        counts = {}
+        for category in CATEGORIES:
+            if keys.get(category) == CHECK_FAILED:
+                self.failed_days.setdefault(category, []).append(day)
+                continue
+            resources = self.resources[category]
+            day_keys = set(keys.get(category, []))
+            for key in day_keys:
+                entry = resources.get(key)
+                if entry is None:
+                    resources[key] = [day, day, 1]
+                else:
+                    entry[1] = day
+                    entry[2] += 1
+            counts[category] = len(day_keys)
+            self.last_dates[category] = day
+        self.daily_counts[day] = counts
+
+    def summary(self) -> Dict[str, any]:
+        """
+        Unique findings over the period, in the format of generate_weekly_report().
+        """
+        return rollup_summary(
+            {category: sorted(resources) for category, resources in self.resources.items()},
+            self.total_users_last_observed,
+        )
+
+    def resource_history(self) -> Dict[str, Dict[str, Dict[str, any]]]:
+        """
+        Per-resource history, see history_entry().
+        """
+        return {
+            category: {
+                key: history_entry(first_seen, last_seen, days_seen, self.last_dates[category])
+                for key, (first_seen, last_seen, days_seen) in sorted(resources.items())
+            }
+            for category, resources in self.resources.items()
+        }
+
+
+def rollup_summary(unique: Dict[str, List[str]], total_users_last_observed: int) -> Dict[str, any]:
+    """
+    Summary section of a rollup report from the sorted unique finding keys per category.
+    """
+    users, volumes = unique["mfa_iam"], unique["encryption"]
+    instances, buckets = unique["public_ec2_IPs"], unique["public_s3_buckets"]
+    groups = unique["security_groups"]
+    return {
+        "iam": {
+            "total_users_last_observed": total_users_last_observed,
+            "unique_non_compliant_users": users,
+            "unique_non_compliant_users_count": len(users),
+        },
+        "encryption": {
+            "unique_unencrypted_volumes": volumes,
+            "unique_unencrypted_volumes_count": len(volumes),
+        },
+        "exposure": {
+            "unique_public_ec2_instances": instances,
+            "unique_public_ec2_count": len(instances),
+            "unique_public_s3_buckets": buckets,
+            "unique_public_s3_buckets_count": len(buckets),
+        },
+        "security_groups": {
+            "unique_risky_sg_ids": groups,
+            "unique_risky_sg_count": len(groups),
+        },
+    }
+
+
+def history_entry(first_seen: str, last_seen: str, days_seen: int, last_date: str) -> Dict[str, any]:
+    """
+    One resource's history: days_open counts calendar days from the first to the last
+    sighting, and open means it was present in the period's latest report in which its
+    check succeeded (last_date).
+    """
+    return {
+        "first_seen": first_seen,
+        "last_seen": last_seen,
+        "days_seen": days_seen,
+        "days_open": (date.fromisoformat(last_seen) - date.fromisoformat(first_seen)).days + 1,
+        "open": last_seen == last_date,
+    }
+
+
+def list_daily_reports(bucket_name: str, start_date: str, end_date: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Yields (date, S3 key, ETag) of the stored daily reports from start_date to end_date,
+    in date order.
+    """
+    s3 = get_boto3_client("s3", region=None)
+    # Keys sort by date, so start listing just before the first day and stop after the last
+    for obj in paginate(s3, "list_objects_v2", "Contents", Bucket=bucket_name,
+                        Prefix=DAILY_REPORT_PREFIX, StartAfter=f"{DAILY_REPORT_PREFIX}{start_date}"):
+        key = obj["Key"]
+        if not key.endswith(".json"):
+            continue
+        day = key[len(DAILY_REPORT_PREFIX):-len(".json")]
+        if day > end_date:
+            return
+        if day >= start_date:
+            yield day, key, obj.get("ETag")
+
+
+def _fetch_daily_keys(bucket_name: str, key: str) -> Tuple[Dict[str, any], int]:
+    s3 = get_boto3_client("s3", region=None)
+    report = json.loads(s3.get_object(Bucket=bucket_name, Key=key)["Body"].read())
+    return daily_finding_keys(report), report.get("summary", {}).get("iam", {}).get("total_users")
+
+
+def stream_daily_keys(bucket_name: str, reports: Iterator[Tuple[str, str]],
+                      max_concurrency: int = None) -> Iterator[Tuple[str, any]]:
+    """
+    Downloads daily reports concurrently and yields (date, (keys, total_users)) in the
+    order of the input. At most max_concurrency reports are in flight or buffered.
+    A report that can't be read yields (date, None).
+    """
+    if max_concurrency is None:
+        max_concurrency = int(os.environ.get("ROLLUP_MAX_CONCURRENCY", DEFAULT_ROLLUP_MAX_CONCURRENCY))
+    max_concurrency = max(1, max_concurrency)
+
+    def fetch(key):
+        try:
+            return _fetch_daily_keys(bucket_name, key)
+        except Exception as e:
+            handle_error(e, f"stream_daily_keys({key})")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        pending = deque()
+        for day, key in reports:
+            pending.append((day, executor.submit(fetch, key)))
+            if len(pending) >= max_concurrency:
+                day, future = pending.popleft()
+                yield day, future.result()
+        while pending:
+            day, future = pending.popleft()
+            yield day, future.result()
+
+
+def period_dates(period: str = "weekly", end_date: str = None, days: int = None) -> List[str]:
+    """
+    Dates covered by a rollup, oldest first.
+
+    Args:
+        period: 'weekly' or 'monthly' (see ROLLUP_PERIODS)
+        end_date: Last day included (default: yesterday, UTC)
+        days: Overrides the period's number of days
+    """
+    if days is None:
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"Unknown rollup period '{period}', expected one of {sorted(ROLLUP_PERIODS)}")
+        days = ROLLUP_PERIODS[period]
+    # By default the rollup ends with the last complete day
+    end = date.fromisoformat(end_date) if end_date else datetime.utcnow().date() - timedelta(days=1)
+    return [(end - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+
+
+def generate_rollup_report(bucket_name: str, period: str = "weekly", end_date: str = None, days: int = None,
+                           max_concurrency: int = None) -> Dict[str, any]:
+    """
+    Builds a weekly/monthly report from the daily reports stored in S3.
+
+    Args:
+        bucket_name: Reports bucket (from environment variable REPORTS_BUCKET)
+        period: 'weekly' or 'monthly'
+        end_date: Last day included, e.g. '2025-11-27' (default: yesterday, UTC)
+        days: Overrides the period's number of days
+        max_concurrency: Parallel report downloads (default: ROLLUP_MAX_CONCURRENCY env var or 8)
+
+    Returns:
+        Rollup report dictionary (see module notes)
+    """
+    dates = period_dates(period, end_date, days)
+    if rollup_cache_enabled():
+        # Imported on demand: rollup_cache builds on this module
+        from reporting.rollup_cache import cached_rollup
+        covered, summary, daily_counts, resources, failed_days = cached_rollup(bucket_name, dates, max_concurrency)
+    else:
+        aggregator = RollupAggregator()
+        covered = set()
+        reports = ((day, key) for day, key, _ in list_daily_reports(bucket_name, dates[0], dates[-1]))
+        for day, result in stream_daily_keys(bucket_name, reports, max_concurrency):
+            if result is None:
+                continue
+            keys, total_users = result
+            aggregator.add_day(day, keys, total_users)
+            covered.add(day)
+        summary, daily_counts, resources = aggregator.summary(), aggregator.daily_counts, aggregator.resource_history()
+        failed_days = aggregator.failed_days
+
+    missing = [day for day in dates if day not in covered]
+    if missing:
+        logger.warning(f"{len(missing)} daily report(s) missing for the {period} rollup: {', '.join(missing)}")
+
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "period": period,
+        "start_date": dates[0],
+        "end_date": dates[-1],
+        "days_covered": len(covered),
+        "missing_days": missing,
+        "summary": summary,
+        "daily_counts": daily_counts,
+        "failed_days": failed_days,
+        "resources": resources,
+    }
+
+
+def generate_trend(bucket_name: str, days: int = 90, end_date: str = None) -> Dict[str, any]:
+    """
+    Daily finding counts per category over the last days, plus the number of unique
+    findings per category over the whole range, from the rollup cache.
+
+    Args:
+        bucket_name: Reports bucket (from environment variable REPORTS_BUCKET)
+        days: Days covered
+        end_date: Last day included, e.g. '2025-11-27' (default: yesterday, UTC)
+    """
+    from reporting.rollup_cache import cached_trend
+    dates = period_dates(days=days, end_date=end_date)
+    return dict(cached_trend(bucket_name, dates), start_date=dates[0], end_date=dates[-1])
+
+
+def rollup_cache_enabled() -> bool:
+    return os.environ.get("ROLLUP_CACHE", "true").lower() != "false"
+
+
+def rollup_report_key(period: str, end_date: str) -> str:
+    """
+    S3 key of a rollup report, e.g. 'reports/weekly/report_2025-11-27.json'.
+    """
+    return f"reports/{period}/report_{end_date}.json"
+
+
+def run_rollup(bucket_name: str, period: str = "weekly", end_date: str = None, days: int = None) -> str:
+    """
+    Generates a rollup report and saves it next to the daily reports.
+
+    Returns:
+        S3 key of the saved report
+    """
+    report = generate_rollup_report(bucket_name, period, end_date, days)
+    key = rollup_report_key(period, report["end_date"])
+    save_report_to_s3(report, bucket_name, key)
+    return key
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a weekly/monthly report from stored daily reports")
+    parser.add_argument('bucket', help='reports bucket')
+    parser.add_argument('--period', default='weekly', choices=sorted(ROLLUP_PERIODS))
+    parser.add_argument('--end-date', help='last day included, YYYY-MM-DD (default: yesterday, UTC)')
+    parser.add_argument('--days', type=int, help="number of days (default: the period's)")
+    parser.add_argument('--save', action='store_true', help='save the report to the bucket instead of printing it')
+    parser.add_argument('--trend', action='store_true', help='print only daily and unique finding counts')
+    args = parser.parse_args()
+
+    if args.trend:
+        print(json.dumps(generate_trend(args.bucket, args.days or 90, args.end_date), indent=2))
+        return
+
+    if args.save:
+        run_rollup(args.bucket, args.period, args.end_date, args.days)
+        return
+    print(json.dumps(generate_rollup_report(args.bucket, args.period, args.end_date, args.days), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""
+Rollup Cache
+Pre-aggregated per-day partials of the daily reports, merged into rollups and trends
+Owner: Kelly (Reporting & Visualization Lead)
+
+INTERFACE NOTES:
+Each daily report is reduced once to a partial: per category, a bitmap (a Python int)
+with one bit per finding key, plus the report's total user count. Keys are numbered
+per category across all cached days, so merging N days is N bitwise ORs and a daily
+count is a popcount; only the per-resource history walks individual keys. Categories
+whose check failed that day have no bitmap and are listed under "failed" instead, so
+they count neither as zero findings nor as resolved ones (see report_rollup.py).
+
+Partials are keyed by date and remember the ETag of the report they came from. Every
+rollup lists the period's daily reports (one ListObjectsV2 call per 1000 days) and
+re-reads only days that are new or whose report was rewritten; days whose report was
+deleted are dropped. The cache is kept in memory for warm Lambdas and persisted with
+the state store (STATE_BUCKET, or STATE_DIR locally) as "rollup_cache".
+
+Partials older than ROLLUP_CACHE_RETENTION_DAYS are evicted, and key numbers are
+compacted once most of them only belong to evicted days.
+"""
+
+import base64
+import os
+import sys
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from reporting.report_rollup import (
+    CATEGORIES, CHECK_FAILED, history_entry, list_daily_reports, rollup_summary, stream_daily_keys,
+)
+from utils.aws_helpers import logger
+from utils.state_store import load_state, save_state
+
+ROLLUP_CACHE_STATE = "rollup_cache"
+# Version 2 added "failed": version 1 partials read failed checks as empty
+CACHE_VERSION = 2
+DEFAULT_ROLLUP_CACHE_RETENTION_DAYS = 400
+
+# Cache of the warm Lambda container, always re-validated against the bucket listing
+_warm_cache = None
+_warm_cache_lock = threading.Lock()
+
+
+def _encode_bitmap(bitmap: int) -> str:
+    return base64.b64encode(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")).decode("ascii")
+
+
+def _decode_bitmap(encoded: str) -> int:
+    return int.from_bytes(base64.b64decode(encoded), "little")
+
+
+def _popcount(bitmap: int) -> int:
+    # int.bit_count() needs Python 3.10
+    return bin(bitmap).count("1")
+
+
+def _bit_positions(bitmap: int) -> List[int]:
+    """
+    Indexes of the set bits, lowest first. str.find skips runs of zeros in C,
+    so the Python loop only runs once per set bit.
+    """
+    bits = bin(bitmap)[:1:-1]
+    positions = []
+    index = bits.find("1")
+    while index != -1:
+        positions.append(index)
+        index = bits.find("1", index + 1)
+    return positions
+
+
+class RollupCache:
+    """
+    Per-day partials of the daily reports (see module notes).
+    """
+
+    def __init__(self, state: Dict[str, any] = None):
+        state = state or {}
+        if state.get("version") != CACHE_VERSION:
+            state = {}
+        self.keys = {category: list(state.get("keys", {}).get(category, [])) for category in CATEGORIES}
+        self._ids = {category: {key: index for index, key in enumerate(keys)} for category, keys in self.keys.items()}
+        self.days = {
+            day: {
+                "etag": partial.get("etag"),
+                "total_users": partial.get("total_users"),
+                "bitmaps": {category: _decode_bitmap(encoded) for category, encoded in partial["bitmaps"].items()},
+                "failed": list(partial.get("failed", [])),
+            }
+            for day, partial in state.get("days", {}).items()
+        }
+        self.dirty = False
+
+    def set_day(self, day: str, etag: Optional[str], keys: Dict[str, any], total_users: int = None):
+        """
+        Stores the partial of one daily report, replacing any previous one.
+        """
+        bitmaps = {}
+        failed = []
+        for category in CATEGORIES:
+            if keys.get(category) == CHECK_FAILED:
+                failed.append(category)
+                continue
+            ids, category_keys = self._ids[category], self.keys[category]
+            bitmap = 0
+            for key in keys.get(category, []):
+                index = ids.get(key)
+                if index is None:
+                    index = ids[key] = len(category_keys)
+                    category_keys.append(key)
+                bitmap |= 1 << index
+            bitmaps[category] = bitmap
+        self.days[day] = {"etag": etag, "total_users": total_users, "bitmaps": bitmaps, "failed": failed}
+        self.dirty = True
+
+    def drop_day(self, day: str):
+        if self.days.pop(day, None) is not None:
+            self.dirty = True
+
+    def sync(self, bucket_name: str, dates: List[str], max_concurrency: int = None) -> int:
+        """
+        Brings the partials of the given dates in line with the stored daily reports.
+
+        Returns:
+            Number of daily reports read
+        """
+        listed = {day: (key, etag) for day, key, etag in list_daily_reports(bucket_name, dates[0], dates[-1])}
+        for day in dates:
+            if day in self.days and day not in listed:
+                self.drop_day(day)
+        stale = [
+            (day, key) for day, (key, etag) in sorted(listed.items())
+            if day not in self.days or self.days[day]["etag"] != etag
+        ]
+        for day, result in stream_daily_keys(bucket_name, iter(stale), max_concurrency):
+            if result is not None:
+                keys, total_users = result
+                self.set_day(day, listed[day][1], keys, total_users)
+        return len(stale)
+
+    def trend(self, dates: List[str]) -> Dict[str, any]:
+        """
+        Daily counts per category and unique counts over the dates, from bitmaps only.
+        Categories whose check failed on a day are left out of that day's counts.
+        """
+        present = [day for day in dates if day in self.days]
+        daily_counts = {}
+        failed_days = {}
+        unions = dict.fromkeys(CATEGORIES, 0)
+        for day in present:
+            bitmaps = self.days[day]["bitmaps"]
+            for category in self.days[day]["failed"]:
+                failed_days.setdefault(category, []).append(day)
+            daily_counts[day] = {category: _popcount(bitmap) for category, bitmap in bitmaps.items()}
+            for category, bitmap in bitmaps.items():
+                unions[category] |= bitmap
+        return {
+            "days_covered": len(present),
+            "daily_counts": daily_counts,
+            "failed_days": failed_days,
+            "unique_counts": {category: _popcount(bitmap) for category, bitmap in unions.items()},
+        }
+
+    def merge(self, dates: List[str]) -> Tuple[Dict[str, any], Dict[str, any], Dict[str, any], Dict[str, any]]:
+        """
+        Merges the partials of the dates into a rollup.
+
+        Returns:
+            (summary, daily_counts, resources, failed_days) in the format of generate_rollup_report()
+        """
+        present = [day for day in dates if day in self.days]
+        trend = self.trend(present)
+        total_users = 0
+        for day in present:
+            if self.days[day]["total_users"] is not None:
+                total_users = self.days[day]["total_users"]
+
+        unique, resources = {}, {}
+        for category in CATEGORIES:
+            # Only the days the category's check succeeded
+            bitmaps = [(day, self.days[day]["bitmaps"][category])
+                       for day in present if category in self.days[day]["bitmaps"]]
+            last_date = bitmaps[-1][0] if bitmaps else None
+            first_seen, last_seen = {}, {}
+            seen = 0
+            for day, bitmap in bitmaps:
+                for index in _bit_positions(bitmap & ~seen):
+                    first_seen[index] = day
+                seen |= bitmap
+            seen = 0
+            for day, bitmap in reversed(bitmaps):
+                for index in _bit_positions(bitmap & ~seen):
+                    last_seen[index] = day
+                seen |= bitmap
+
+            # Days seen per key as a bit-sliced counter: plane p holds bit p of every key's count
+            planes = []
+            for _, bitmap in bitmaps:
+                carry = bitmap
+                for plane_index, plane in enumerate(planes):
+                    planes[plane_index] = plane ^ carry
+                    carry &= plane
+                    if not carry:
+                        break
+                if carry:
+                    planes.append(carry)
+            days_seen = defaultdict(int)
+            for plane_index, plane in enumerate(planes):
+                for index in _bit_positions(plane):
+                    days_seen[index] += 1 << plane_index
+
+            keys = self.keys[category]
+            entries = sorted((keys[index], index) for index in first_seen)
+            unique[category] = [key for key, _ in entries]
+            resources[category] = {
+                key: history_entry(first_seen[index], last_seen[index], days_seen[index], last_date)
+                for key, index in entries
+            }
+        return rollup_summary(unique, total_users), trend["daily_counts"], resources, trend["failed_days"]
+
+    def compact(self, retention_days: int = None, today: date = None):
+        """
+        Evicts partials older than the retention and renumbers the keys once more
+        than half of them are only used by evicted days.
+        """
+        if retention_days is None:
+            retention_days = int(os.environ.get("ROLLUP_CACHE_RETENTION_DAYS", DEFAULT_ROLLUP_CACHE_RETENTION_DAYS))
+        cutoff = ((today or datetime.utcnow().date()) - timedelta(days=retention_days)).isoformat()
+        for day in [day for day in self.days if day < cutoff]:
+            self.drop_day(day)
+
+        for category in CATEGORIES:
+            used = 0
+            for partial in self.days.values():
+                used |= partial["bitmaps"].get(category, 0)
+            used_indexes = _bit_positions(used)
+            if len(used_indexes) * 2 >= len(self.keys[category]):
+                continue
+            remap = {old: new for new, old in enumerate(used_indexes)}
+            for partial in self.days.values():
+                bitmap = 0
+                for index in _bit_positions(partial["bitmaps"].get(category, 0)):
+                    bitmap |= 1 << remap[index]
+                partial["bitmaps"][category] = bitmap
+            self.keys[category] = [self.keys[category][index] for index in used_indexes]
+            self._ids[category] = {key: index for index, key in enumerate(self.keys[category])}
+            self.dirty = True
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            "version": CACHE_VERSION,
+            "keys": self.keys,
+            "days": {
+                day: {
+                    "etag": partial["etag"],
+                    "total_users": partial["total_users"],
+                    "bitmaps": {category: _encode_bitmap(bitmap) for category, bitmap in partial["bitmaps"].items()},
+                    "failed": partial["failed"],
+                }
+                for day, partial in self.days.items()
+            },
+        }
+
+
+def load_rollup_cache() -> RollupCache:
+    """
+    Returns the warm container's cache, or loads the persisted one.
+    """
+    global _warm_cache
+    if _warm_cache is None:
+        _warm_cache = RollupCache(load_state(ROLLUP_CACHE_STATE))
+    return _warm_cache
+
+
+def _synced_cache(bucket_name: str, dates: List[str], max_concurrency: int = None) -> RollupCache:
+    cache = load_rollup_cache()
+    fetched = cache.sync(bucket_name, dates, max_concurrency)
+    logger.info(f"Rollup cache: {fetched} of {len(dates)} day(s) read from daily reports")
+    if cache.dirty:
+        cache.compact()
+        save_state(ROLLUP_CACHE_STATE, cache.to_dict())
+        cache.dirty = False
+    return cache
+
+
+def cached_rollup(bucket_name: str, dates: List[str], max_concurrency: int = None):
+    """
+    Rollup of the dates from the cache, after syncing it with the bucket.
+
+    Returns:
+        (covered dates, summary, daily_counts, resources, failed_days)
+    """
+    with _warm_cache_lock:
+        cache = _synced_cache(bucket_name, dates, max_concurrency)
+        summary, daily_counts, resources, failed_days = cache.merge(dates)
+        return {day for day in dates if day in cache.days}, summary, daily_counts, resources, failed_days
+
+
+def cached_trend(bucket_name: str, dates: List[str], max_concurrency: int = None) -> Dict[str, any]:
+    """
+    Daily and unique finding counts over the dates, see RollupCache.trend().
+    """
+    with _warm_cache_lock:
+        return _synced_cache(bucket_name, dates, max_concurrency).trend(dates)
@@ -5,8 +5,16 @@ Owner: Nicole (Automation & Alert Engineer)
 """
 
 import boto3
+import json
 import logging
-from typing import Dict
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List
+
+from botocore.config import Config
 
 
 # Configure logging
@@ -14,118 +22,562 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
-def get_boto3_client(service_name: str, region: str = 'us-east-1'):
+# Connection pool size per client; must cover the largest fan-out sharing one client
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Shared client registry: (service, region, access key ID) -> client.
+# boto3 clients are thread-safe once built, but session/client construction is not.
+_clients = {}
+_sessions = {}
+_client_lock = threading.Lock()
+
+# (event name, handler) pairs registered on every session, see register_event_handler()
+_event_handlers = []
+
+
+def _client_config(retries: bool = True) -> Config:
+    """
+    Builds the botocore config of a client from the registry: adaptive retries, or a
+    single attempt for clients whose calls an AdaptiveThrottle retries instead.
+    """
+    if retries:
+        retry_config = {
+            'mode': 'adaptive',
+            'total_max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)),
+        }
+    else:
+        retry_config = {'mode': 'standard', 'total_max_attempts': 1}
+    return Config(
+        max_pool_connections=int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', DEFAULT_MAX_POOL_CONNECTIONS)),
+        retries=retry_config,
+    )
+
+
+def _get_session(credentials: Dict[str, any] = None) -> boto3.session.Session:
+    """
+    Returns the session for a set of credentials (None: the Lambda's own role).
+    Must be called with _client_lock held.
+    """
+    access_key = credentials['AccessKeyId'] if credentials else None
+    if access_key not in _sessions:
+        if credentials is None:
+            _sessions[None] = (boto3.session.Session(), None)
+        else:
+            _evict_expired_sessions()
+            session = boto3.session.Session(
+                aws_access_key_id=credentials['AccessKeyId'],
+                aws_secret_access_key=credentials['SecretAccessKey'],
+                aws_session_token=credentials['SessionToken'],
+            )
+            _sessions[access_key] = (session, credentials.get('Expiration'))
+        for event_name, handler in _event_handlers:
+            _sessions[access_key][0].events.register(event_name, handler)
+    return _sessions[access_key][0]
+
+
+def _evict_expired_sessions():
+    """
+    Drops sessions and clients whose assumed-role credentials have expired.
+    Must be called with _client_lock held.
+    """
+    now = datetime.now(timezone.utc)
+    expired = [
+        access_key for access_key, (_, expiration) in _sessions.items()
+        if expiration is not None and expiration <= now
+    ]
+    for access_key in expired:
+        del _sessions[access_key]
+    for key in [key for key in _clients if key[2] in expired]:
+        del _clients[key]
+
+
+def get_boto3_client(service_name: str, region: str = None, credentials: Dict[str, any] = None,
+                     retries: bool = True):
     """
-    Creates and returns a boto3 client for the specified service.
+    Returns a shared boto3 client for the specified service.
+    
+    Clients are cached by (service, region, credentials, retries) for the lifetime
+    of the Lambda container, so warm invocations and parallel scans reuse connection
+    pools instead of paying client construction and TLS handshakes again.
+    Clients use adaptive retries (AWS_MAX_ATTEMPTS) and a connection pool sized by
+    AWS_MAX_POOL_CONNECTIONS.
     
     Args:
         service_name: AWS service name (e.g., 's3', 'iam', 'cloudwatch')
-        region: AWS region
+        region: AWS region (default: the session's region, i.e. AWS_REGION in Lambda)
+        credentials: Optional STS credentials (AccessKeyId, SecretAccessKey,
+                     SessionToken), e.g. from get_assumed_role_credentials()
+        retries: False for a client that makes a single attempt per call, for calls
+                 made through an AdaptiveThrottle so only one layer retries them
         
     Returns:
         boto3 client instance
     """
-    return boto3.client(service_name, region_name=region)
+    key = (service_name, region, credentials['AccessKeyId'] if credentials else None, retries)
+    client = _clients.get(key)
+    if client is not None:
+        return client
 
+    with _client_lock:
+        client = _clients.get(key)
+        if client is None:
+            session = _get_session(credentials)
+            client = session.client(service_name, region_name=region, config=_client_config(retries))
+            _clients[key] = client
+    return client
 
-def publish_metrics_to_cloudwatch(metrics: Dict[str, any]):
+
+def register_event_handler(event_name: str, handler):
     """
-    Publishes custom metrics to CloudWatch.
+    Registers a botocore event handler on every current and future session.
     
-    This function handles common metric types. Adjust based on what Alejandro implements.
+    Used for instrumentation hooks and for answering calls from a local AWS
+    stand-in in benchmarks.
     
     Args:
-        metrics: Dictionary of metrics to publish from collect_security_metrics()
+        event_name: botocore event (e.g., 'before-call', 'needs-retry.s3')
+        handler: Callable accepting the event's keyword arguments
     """
-    try:
-        cloudwatch = get_boto3_client('cloudwatch')
-        metric_data = []
-        
-        # Publish public S3 buckets count (from exposure dict)
-        exposure = metrics.get('exposure', {})
-        public_buckets_count = len(exposure.get('public_s3_buckets', []))
-        metric_data.append({
-            'MetricName': 'PublicS3Buckets',
-            'Value': public_buckets_count,
-            'Unit': 'Count'
-        })
-        
-        # Publish public EC2 IPs count (from exposure dict)
-        public_ec2_count = len(exposure.get('public_ec2_IPs', []))
-        metric_data.append({
-            'MetricName': 'PublicEC2Instances',
-            'Value': public_ec2_count,
-            'Unit': 'Count'
-        })
-        
-        # Publish MFA non-compliance count (from mfa_iam dict)
-        mfa_iam = metrics.get('mfa_iam', {})
-        non_compliant_count = len(mfa_iam.get('non_compliant_users', []))
-        metric_data.append({
-            'MetricName': 'MFANonCompliantUsers',
-            'Value': non_compliant_count,
-            'Unit': 'Count'
-        })
+    with _client_lock:
+        _event_handlers.append((event_name, handler))
+        for session, _ in _sessions.values():
+            session.events.register(event_name, handler)
+
+
+def clear_client_cache():
+    """
+    Drops all cached sessions and clients, as on a Lambda cold start.
+    """
+    with _client_lock:
+        _sessions.clear()
+        _clients.clear()
+
+
+# Assumed-role credentials are reused until this many seconds before they expire
+ASSUMED_ROLE_REFRESH_SECONDS = 300
+
+_assumed_role_credentials = {}
+_assumed_role_lock = threading.Lock()
+
+
+def get_assumed_role_credentials(role_arn: str, session_name: str = 'medtech-security-monitor') -> Dict[str, any]:
+    """
+    Returns STS credentials for role_arn, cached until close to expiry.
+    
+    Warm Lambda invocations and concurrent scans of the same account reuse the
+    cached credentials instead of calling AssumeRole again.
+    
+    Args:
+        role_arn: ARN of the role to assume
+        session_name: Role session name recorded in the member account's CloudTrail
         
-        # Publish total IAM users count
-        total_users = mfa_iam.get('total_users', 0)
-        metric_data.append({
-            'MetricName': 'TotalIAMUsers',
-            'Value': total_users,
-            'Unit': 'Count'
-        })
+    Returns:
+        Credentials dict (AccessKeyId, SecretAccessKey, SessionToken, Expiration)
+    """
+    with _assumed_role_lock:
+        cached = _assumed_role_credentials.get(role_arn)
+    if cached:
+        seconds_left = (cached['Expiration'] - datetime.now(timezone.utc)).total_seconds()
+        if seconds_left > ASSUMED_ROLE_REFRESH_SECONDS:
+            return cached
+
+    sts = get_boto3_client('sts')
+    credentials = sts.assume_role(RoleArn=role_arn, RoleSessionName=session_name)['Credentials']
+    with _assumed_role_lock:
+        _assumed_role_credentials[role_arn] = credentials
+    return credentials
+
+
+def paginate(client, operation_name: str, result_key: str, **kwargs) -> Iterator[any]:
+    """
+    Streams every item of a (possibly paginated) list/describe API call.
+    
+    Pages are fetched lazily as the caller iterates, so only one page is held in
+    memory at a time and large accounts are never silently truncated. Operations
+    without a paginator in the installed botocore fall back to a single call.
+    
+    Args:
+        client: boto3 client
+        operation_name: Client method name (e.g., 'describe_volumes')
+        result_key: Response key holding the items (e.g., 'Volumes')
+        **kwargs: API parameters, including server-side Filters
         
-        # Publish risky security groups count
-        risky_sg_count = len(metrics.get('security_groups', []))
-        metric_data.append({
-            'MetricName': 'RiskySecurityGroups',
-            'Value': risky_sg_count,
-            'Unit': 'Count'
-        })
+    Yields:
+        Items from result_key across all pages
+    """
+    if not client.can_paginate(operation_name):
+        yield from getattr(client, operation_name)(**kwargs).get(result_key, [])
+        return
+
+    for page in client.get_paginator(operation_name).paginate(**kwargs):
+        yield from page.get(result_key, [])
+
+
+# Error codes AWS services return when a caller is being rate limited
+THROTTLING_ERROR_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'SlowDown',
+    'Rate exceeded',
+}
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """
+    Returns True if the exception is an AWS throttling/rate-limit error.
+    
+    Args:
+        error: Exception raised by a boto3 call
+    """
+    response = getattr(error, 'response', None) or {}
+    code = response.get('Error', {}).get('Code', '')
+    return code in THROTTLING_ERROR_CODES
+
+
+class AdaptiveThrottle:
+    """
+    Shared backoff for a group of concurrent calls to the same API.
+    
+    Every throttling error doubles a delay that all callers sleep before their next
+    request, and every success halves it again, so a pool of workers slows down
+    together when AWS pushes back and speeds up once the pressure is gone.
+    
+    The throttle retries throttling errors itself, so its calls should go through a
+    client from get_boto3_client(..., retries=False); with botocore's retries as well,
+    every attempt here would be several attempts and sleeps there.
+    """
+
+    def __init__(self, base_delay: float = 0.05, max_delay: float = 5.0, max_retries: int = 5):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.delay = 0.0
+        self.throttle_count = 0
+        self._lock = threading.Lock()
+
+    def _on_success(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.base_delay else 0.0
+
+    def _on_throttle(self):
+        with self._lock:
+            self.throttle_count += 1
+            self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls func(*args, **kwargs), retrying throttling errors with the shared delay.
         
-        # Publish unencrypted EBS volumes count
-        unencrypted_volumes_count = len(metrics.get('encryption', []))
-        metric_data.append({
-            'MetricName': 'UnencryptedEBSVolumes',
-            'Value': unencrypted_volumes_count,
-            'Unit': 'Count'
-        })
+        Returns:
+            The return value of func
+            
+        Raises:
+            The last throttling error once max_retries is exhausted, or any
+            non-throttling error immediately
+        """
+        attempt = 0
+        while True:
+            if self.delay:
+                time.sleep(self.delay)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_throttling_error(e) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self._on_throttle()
+                continue
+            self._on_success()
+            return result
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    
+    Allows bursts of up to `capacity` calls and a sustained `rate` calls per second
+    across every thread sharing the bucket, keeping a fan-out under a service quota.
+    The capacity defaults to the rate but is at least one call, so fractional rates
+    (e.g. 0.5 for one call every two seconds) still let calls through.
+    
+    Raises:
+        ValueError: if rate is not positive or capacity is below one call
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError(f"TokenBucket rate must be positive, got {rate}")
+        if capacity is not None and capacity < 1:
+            raise ValueError(f"TokenBucket capacity must be at least 1, got {capacity}")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available, then consumes it.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+METRICS_NAMESPACE = 'MedTech/Security'
+
+# PutMetricData limits: 1000 datums and 1 MB per request, 150 distinct values per datum
+MAX_METRIC_DATUMS_PER_REQUEST = 1000
+MAX_METRIC_REQUEST_BYTES = 900000
+MAX_METRIC_DISTINCT_VALUES = 150
+DEFAULT_METRIC_PUBLISH_CONCURRENCY = 4
+
+class MetricBatch:
+    """
+    Collects CloudWatch datapoints for one run and publishes them in as few calls as possible.
+    
+    Datapoints with the same name, dimensions and unit are merged into one datum
+    with Values/Counts (a statistic set per distinct value), all datums share the
+    run's timestamp, and the result is split into requests within the
+    PutMetricData limits that are sent concurrently.
+    """
+
+    def __init__(self, namespace: str = METRICS_NAMESPACE, timestamp: datetime = None):
+        self.namespace = namespace
+        self.timestamp = timestamp or datetime.now(timezone.utc)
+        self._values = {}
+
+    def add(self, name: str, value: float, dimensions: Dict[str, str] = None, unit: str = 'Count'):
+        """
+        Adds one datapoint.
         
-        # CloudTrail and login_attempts metrics are disabled for presentation
-        # Uncomment below to enable (will change from 6 to 9 metrics):
-        # cloudtrail = metrics.get('cloudtrail', {})
-        # cloudtrail_enabled = 1 if cloudtrail.get('cloudtrail_enabled', False) else 0
-        # metric_data.append({
-        #     'MetricName': 'CloudTrailEnabled',
-        #     'Value': cloudtrail_enabled,
-        #     'Unit': 'Count'
-        # })
-        # active_trails_count = len(cloudtrail.get('active_trails', []))
-        # metric_data.append({
-        #     'MetricName': 'CloudTrailActiveTrails',
-        #     'Value': active_trails_count,
-        #     'Unit': 'Count'
-        # })
-        # login_attempts = metrics.get('login_attempts', {})
-        # failed_login_count = login_attempts.get('failed_login_count', 0)
-        # metric_data.append({
-        #     'MetricName': 'FailedLoginAttempts',
-        #     'Value': failed_login_count,
-        #     'Unit': 'Count'
-        # })
+        Args:
+            name: Metric name (e.g., 'PublicS3Buckets')
+            value: Datapoint value
+            dimensions: Dimension name -> value (e.g., {'AccountId': '123456789012'})
+            unit: CloudWatch unit
+        """
+        key = (name, tuple(sorted((dimensions or {}).items())), unit)
+        counts = self._values.setdefault(key, {})
+        counts[value] = counts.get(value, 0) + 1
+
+    def __len__(self) -> int:
+        return sum(sum(counts.values()) for counts in self._values.values())
+
+    def datums(self) -> List[Dict[str, any]]:
+        """
+        Returns the consolidated MetricData entries.
+        """
+        datums = []
+        for (name, dimensions, unit), counts in self._values.items():
+            datum = {'MetricName': name, 'Timestamp': self.timestamp, 'Unit': unit}
+            if dimensions:
+                datum['Dimensions'] = [{'Name': key, 'Value': str(value)} for key, value in dimensions]
+            items = list(counts.items())
+            if len(items) == 1 and items[0][1] == 1:
+                datums.append(dict(datum, Value=items[0][0]))
+                continue
+            for start in range(0, len(items), MAX_METRIC_DISTINCT_VALUES):
+                chunk = items[start:start + MAX_METRIC_DISTINCT_VALUES]
+                datums.append(dict(datum, Values=[value for value, _ in chunk], Counts=[count for _, count in chunk]))
+        return datums
+
+    def requests(self) -> List[List[Dict[str, any]]]:
+        """
+        Splits the datums into PutMetricData requests within the count and size limits.
+        """
+        requests = []
+        current = []
+        current_bytes = 0
+        for datum in self.datums():
+            # The query protocol repeats the member path for every field, roughly doubling the JSON size
+            size = 2 * len(json.dumps(datum, default=str))
+            if current and (len(current) >= MAX_METRIC_DATUMS_PER_REQUEST
+                            or current_bytes + size > MAX_METRIC_REQUEST_BYTES):
+                requests.append(current)
+                current, current_bytes = [], 0
+            current.append(datum)
+            current_bytes += size
+        if current:
+            requests.append(current)
+        return requests
+
+    def publish(self, max_concurrency: int = None) -> int:
+        """
+        Publishes every datapoint and returns the number of datums sent.
         
-        # Publish all metrics in a single call
-        if metric_data:
-            cloudwatch.put_metric_data(
-                Namespace='MedTech/Security',
-                MetricData=metric_data
-            )
-            logger.info(f"Published {len(metric_data)} metrics to CloudWatch")
+        Requests run concurrently (METRIC_PUBLISH_CONCURRENCY, default 4) and share
+        an AdaptiveThrottle, so throttling slows the whole batch down instead of
+        dropping datapoints. A request that still fails is logged and skipped.
+        """
+        requests = self.requests()
+        if not requests:
+            return 0
+        if max_concurrency is None:
+            max_concurrency = int(os.environ.get('METRIC_PUBLISH_CONCURRENCY', DEFAULT_METRIC_PUBLISH_CONCURRENCY))
+        cloudwatch = get_boto3_client('cloudwatch', region=None, retries=False)
+        throttle = AdaptiveThrottle()
+
+        def put(metric_data):
+            try:
+                throttle.call(cloudwatch.put_metric_data, Namespace=self.namespace, MetricData=metric_data)
+                return len(metric_data)
+            except Exception as e:
+                handle_error(e, f"MetricBatch.publish ({len(metric_data)} datums)")
+                return 0
+
+        if len(requests) == 1:
+            return put(requests[0])
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(requests)))) as executor:
+            return sum(executor.map(put, requests))
+
+
+def _rule_metric_values(findings: Dict[str, any]):
+    """
+    The security rules' metrics for one findings dict.
+
+    Returns:
+        (metric name -> value, (metric name, region) -> count of the regional rules,
+        rule id -> findings count of the non-info rules)
+    """
+    # Imported on demand: the rules engine itself logs through this module
+    from utils.rules_engine import evaluate_rules
+
+    values, regional, checks = {}, {}, {}
+    resource_regions = findings.get('resource_regions', {})
+    for result in evaluate_rules(findings):
+        rule = result.rule
+        if rule.metric:
+            values[rule.metric] = result.metric_value
+            if rule.regional:
+                for region, count in result.region_counts(resource_regions).items():
+                    regional[(rule.metric, region)] = count
+        if rule.severity != 'info':
+            checks[rule.id] = result.findings_count
+    return values, regional, checks
+
+
+def _check_error_counts(findings: Dict[str, any]) -> Dict[str, int]:
+    """
+    Failures per check of one findings dict (0 for every check that ran and succeeded),
+    counting checks that failed and checks that skipped regions or resources
+    (partial_errors). Multi-account findings key both "<account>:<check>", so a check
+    counts the accounts it failed in.
+    """
+    counts = dict.fromkeys(findings.get('check_timings', {}), 0)
+    for name in list(findings.get('check_errors', {})) + list(findings.get('partial_errors', {})):
+        check = name.split(':')[-1]
+        counts[check] = counts.get(check, 0) + 1
+    return counts
+
+
+def security_metric_batch(findings: Dict[str, any]) -> MetricBatch:
+    """
+    Builds the CloudWatch datapoints for a run's findings from the security rules
+    (see utils/rules_engine.py):
+    
+    - Each rule's metric without dimensions (totals across accounts)
+    - The same metrics per account (AccountId), for multi-account runs
+    - The regional rules' metrics per Region, and per AccountId and Region for multi-account runs
+    - 'Findings' per Check, whose value is the rule id (e.g. 'public_s3_buckets', not the
+      'exposure' check producing it), as the dashboard's Findings by Check widget queries;
+      in multi-account runs as a statistic set of the per-account counts, so Sum is the
+      total and Maximum the worst account
+    - 'CheckErrors': failed or partial checks (partial_errors) in total, per Check (here the
+      check name, e.g. 'exposure') and per AccountId
+    
+    The rules of a failed check (check_errors) publish nothing, so its empty result
+    doesn't show up as zero findings; CheckErrors reports the failure instead. A check
+    that failed in only some accounts publishes its totals over the other accounts,
+    and CheckErrors per AccountId names the ones missing.
     
+    Args:
+        findings: Findings from collect_security_metrics() or collect_multi_account_metrics()
+    """
+    batch = MetricBatch()
+    totals, regional, checks = _rule_metric_values(findings)
+    for name, value in totals.items():
+        batch.add(name, value)
+
+    accounts = findings.get('accounts') or {}
+    if accounts:
+        for account_id, account_findings in accounts.items():
+            values, account_regional, account_checks = _rule_metric_values(account_findings)
+            for name, value in values.items():
+                batch.add(name, value, {'AccountId': account_id})
+            for (name, region), value in account_regional.items():
+                batch.add(name, value, {'AccountId': account_id, 'Region': region})
+            for check, value in account_checks.items():
+                batch.add('Findings', value, {'Check': check})
+    else:
+        for check, value in checks.items():
+            batch.add('Findings', value, {'Check': check})
+
+    for (name, region), value in regional.items():
+        batch.add(name, value, {'Region': region})
+
+    check_errors = _check_error_counts(findings)
+    batch.add('CheckErrors', sum(check_errors.values()))
+    for check, count in check_errors.items():
+        batch.add('CheckErrors', count, {'Check': check})
+    for account_id, account_findings in accounts.items():
+        batch.add('CheckErrors', sum(_check_error_counts(account_findings).values()), {'AccountId': account_id})
+    return batch
+
+
+def publish_metrics_to_cloudwatch(metrics: Dict[str, any]):
+    """
+    Publishes custom metrics to CloudWatch.
+    
+    The undimensioned metrics the dashboard reads are always published;
+    per-account, per-region and per-check series are added alongside them,
+    see security_metric_batch().
+    
+    Args:
+        metrics: Dictionary of metrics to publish from collect_security_metrics()
+    """
+    try:
+        batch = security_metric_batch(metrics)
+        published = batch.publish()
+        logger.info(f"Published {published} metric datums ({len(batch)} datapoints) to CloudWatch")
     except Exception as e:
         handle_error(e, "publish_metrics_to_cloudwatch")
 
 
+def publish_metric_values(values: Dict[str, float], dimensions: Dict[str, str] = None):
+    """
+    Publishes a subset of the security metrics, e.g. after a single resource
+    was re-evaluated in event-driven mode.
+    
+    Args:
+        values: Metric name -> value (e.g., {'PublicS3Buckets': 2})
+        dimensions: Dimensions of every value (e.g., {'AccountId': '123456789012'});
+                    None publishes the undimensioned totals
+    """
+    if not values:
+        return
+    try:
+        batch = MetricBatch()
+        for name, value in values.items():
+            batch.add(name, value, dimensions)
+        batch.publish()
+        logger.info(f"Published {len(values)} metrics to CloudWatch")
+    except Exception as e:
+        handle_error(e, "publish_metric_values")
+
+
 def handle_error(error: Exception, context: str = ""):
     """
     Centralized error handling and logging.
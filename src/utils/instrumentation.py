@@ -0,0 +1,281 @@
+"""
+Instrumentation
+Per-invocation check timings, AWS API call counters and opt-in profiling
+Owner: Nicole (Automation & Alert Engineer)
+
+Metrics are written as CloudWatch Embedded Metric Format (EMF) log lines, which
+CloudWatch Logs turns into metrics in the INSTRUMENTATION_NAMESPACE namespace
+without any PutMetricData calls:
+- CheckDuration / CheckFailed per check (dimension: Check)
+- ApiCalls / ApiRetries / ApiThrottles / ApiErrors per AWS API (dimensions: Service, Operation)
+- InvocationDuration / ApiCalls per invocation (dimension: Mode)
+
+API counters come from botocore event hooks registered on every client from the
+shared registry, so no collector code has to count its own calls.
+
+Profiling is off unless PROFILE_MODE is set to "cprofile", "tracemalloc" or both
+(comma-separated); the top PROFILE_TOP_N entries are logged at the end of the
+invocation. cProfile covers the invocation thread and each check's thread.
+"""
+
+import io
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.aws_helpers import THROTTLING_ERROR_CODES, logger, register_event_handler
+
+DEFAULT_INSTRUMENTATION_NAMESPACE = "MedTech/Security/Instrumentation"
+DEFAULT_PROFILE_TOP_N = 25
+
+API_COUNTERS = ("ApiCalls", "ApiRetries", "ApiThrottles", "ApiErrors")
+
+_api_counts = defaultdict(lambda: dict.fromkeys(API_COUNTERS, 0))
+_api_lock = threading.Lock()
+_hooks_installed = False
+
+# cProfile profilers of the current invocation, one per profiled thread
+_profilers = []
+_profilers_lock = threading.Lock()
+
+
+# ------------------------------------------------------------------------------------
+# API CALL COUNTERS (botocore hooks)
+# ------------------------------------------------------------------------------------
+
+def _count(service: str, operation: str, counter: str, amount: int = 1):
+    with _api_lock:
+        _api_counts[(service, operation)][counter] += amount
+
+
+def _error_code(parsed) -> str:
+    return (parsed or {}).get('Error', {}).get('Code', '') if isinstance(parsed, dict) else ''
+
+
+def _on_after_call(model, parsed, http_response, **kwargs):
+    service, operation = model.service_model.service_name, model.name
+    metadata = (parsed or {}).get('ResponseMetadata', {})
+    _count(service, operation, "ApiCalls")
+    _count(service, operation, "ApiRetries", metadata.get('RetryAttempts', 0))
+    if http_response is not None and http_response.status_code >= 300:
+        _count(service, operation, "ApiErrors")
+        # Throttled attempts that went through the HTTP layer are counted in _on_needs_retry;
+        # responses without RetryAttempts never reached it
+        if 'RetryAttempts' not in metadata and _error_code(parsed) in THROTTLING_ERROR_CODES:
+            _count(service, operation, "ApiThrottles")
+
+
+def _on_needs_retry(operation, response=None, **kwargs):
+    # Called once per attempt; response is (http response, parsed) unless the attempt raised
+    if response and _error_code(response[1]) in THROTTLING_ERROR_CODES:
+        _count(operation.service_model.service_name, operation.name, "ApiThrottles")
+
+
+def _on_after_call_error(event_name, **kwargs):
+    # after-call-error.<service id>.<operation>: the call raised (e.g., connection errors after retries)
+    _, service, operation = event_name.split('.', 2)
+    _count(service, operation, "ApiCalls")
+    _count(service, operation, "ApiErrors")
+
+
+def install_api_hooks():
+    """
+    Registers the API counting hooks on every boto3 session (once per container).
+    """
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    register_event_handler('after-call', _on_after_call)
+    register_event_handler('needs-retry', _on_needs_retry)
+    register_event_handler('after-call-error', _on_after_call_error)
+    _hooks_installed = True
+
+
+def api_call_counts() -> Dict[Tuple[str, str], Dict[str, int]]:
+    """
+    Returns the API counters of the current invocation: (service, operation) -> counters.
+    """
+    with _api_lock:
+        return {key: dict(counters) for key, counters in _api_counts.items()}
+
+
+def reset_api_call_counts():
+    with _api_lock:
+        _api_counts.clear()
+
+
+# ------------------------------------------------------------------------------------
+# EMBEDDED METRIC FORMAT
+# ------------------------------------------------------------------------------------
+
+def emf_enabled() -> bool:
+    return os.environ.get('EMF_METRICS', 'true').lower() != 'false'
+
+
+def emf_record(metrics: Dict[str, Tuple[float, str]], dimensions: Dict[str, str],
+               namespace: str = None) -> Dict[str, any]:
+    """
+    Builds one EMF log record.
+
+    Args:
+        metrics: Metric name -> (value, unit), e.g. {"CheckDuration": (412.0, "Milliseconds")}
+        dimensions: Dimension name -> value, e.g. {"Check": "exposure"}
+        namespace: CloudWatch namespace (default: INSTRUMENTATION_NAMESPACE env var)
+    """
+    namespace = namespace or os.environ.get('INSTRUMENTATION_NAMESPACE', DEFAULT_INSTRUMENTATION_NAMESPACE)
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": namespace,
+                "Dimensions": [list(dimensions)],
+                "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in metrics.items()],
+            }],
+        },
+    }
+    record.update(dimensions)
+    record.update({name: value for name, (value, _) in metrics.items()})
+    return record
+
+
+def emit_emf(metrics: Dict[str, Tuple[float, str]], dimensions: Dict[str, str]):
+    """
+    Writes one EMF record to stdout. The Lambda logging prefix would make the line
+    unparseable as EMF, so this bypasses the logger.
+    """
+    print(json.dumps(emf_record(metrics, dimensions), separators=(',', ':')), flush=True)
+
+
+# ------------------------------------------------------------------------------------
+# PROFILING (opt-in via PROFILE_MODE)
+# ------------------------------------------------------------------------------------
+
+def profile_modes() -> set:
+    return {mode.strip().lower() for mode in os.environ.get('PROFILE_MODE', '').split(',') if mode.strip()}
+
+
+@contextmanager
+def profile_thread():
+    """
+    Profiles the enclosed block with cProfile when PROFILE_MODE includes "cprofile".
+    Each thread needs its own profiler; the stats are merged in finish_invocation().
+    """
+    if "cprofile" not in profile_modes():
+        yield
+        return
+    # Imported on demand so cold starts without profiling don't pay for it
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows only one active profiler; the outer one keeps running
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with _profilers_lock:
+            _profilers.append(profiler)
+
+
+def _log_profiles(top_n: int):
+    with _profilers_lock:
+        profilers = list(_profilers)
+        _profilers.clear()
+    if profilers:
+        import pstats
+        output = io.StringIO()
+        stats = pstats.Stats(profilers[0], stream=output)
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        stats.sort_stats('cumulative').print_stats(top_n)
+        logger.info(f"cProfile ({len(profilers)} thread(s), top {top_n} by cumulative time):\n{output.getvalue()}")
+
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics('lineno')[:top_n]
+        tracemalloc.stop()
+        logger.info(
+            f"tracemalloc: current {current / 2 ** 20:.1f} MiB, peak {peak / 2 ** 20:.1f} MiB; top allocations:\n"
+            + "\n".join(str(stat) for stat in top)
+        )
+
+
+# ------------------------------------------------------------------------------------
+# INVOCATION LIFECYCLE
+# ------------------------------------------------------------------------------------
+
+class Invocation:
+    """
+    Instrumentation state of one Lambda invocation.
+    """
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.started_at = time.monotonic()
+        self.check_timings = {}
+        self.check_errors = {}
+
+    def record_checks(self, check_timings: Dict[str, float], check_errors: Dict[str, str]):
+        """
+        Records the per-check results of collect_security_metrics() (timings in seconds).
+        """
+        self.check_timings.update(check_timings)
+        self.check_errors.update(check_errors)
+
+
+def start_invocation(mode: str) -> Invocation:
+    """
+    Resets the API counters and starts the profilers PROFILE_MODE asks for.
+
+    Args:
+        mode: What the invocation does (e.g., 'scan', 'config_change'), used as a dimension
+    """
+    install_api_hooks()
+    reset_api_call_counts()
+    with _profilers_lock:
+        _profilers.clear()
+    if "tracemalloc" in profile_modes() and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return Invocation(mode)
+
+
+def finish_invocation(invocation: Invocation, top_n: Optional[int] = None):
+    """
+    Emits the invocation's EMF metrics, logs an API call summary and any profiles.
+    """
+    duration = time.monotonic() - invocation.started_at
+    counts = api_call_counts()
+    total_calls = sum(counters["ApiCalls"] for counters in counts.values())
+
+    if emf_enabled():
+        for check_name, seconds in invocation.check_timings.items():
+            emit_emf({
+                "CheckDuration": (round(seconds * 1000, 1), "Milliseconds"),
+                "CheckFailed": (1 if check_name in invocation.check_errors else 0, "Count"),
+            }, {"Check": check_name})
+        for (service, operation), counters in sorted(counts.items()):
+            emit_emf({name: (value, "Count") for name, value in counters.items()},
+                     {"Service": service, "Operation": operation})
+        emit_emf({
+            "InvocationDuration": (round(duration * 1000, 1), "Milliseconds"),
+            "ApiCalls": (total_calls, "Count"),
+        }, {"Mode": invocation.mode})
+
+    busiest = sorted(counts.items(), key=lambda item: -item[1]["ApiCalls"])[:10]
+    logger.info(
+        f"{total_calls} AWS API call(s) in {duration:.2f}s; busiest: "
+        + ", ".join(f"{service}:{operation}={counters['ApiCalls']}" for (service, operation), counters in busiest)
+    )
+
+    _log_profiles(top_n or int(os.environ.get('PROFILE_TOP_N', DEFAULT_PROFILE_TOP_N)))
@@ -0,0 +1,269 @@
+"""
+Inventory Cache
+Shared resource inventories (instances, security groups, buckets, IAM users) for the checks
+Owner: Alejandro (Infrastructure & Metrics Architect)
+
+INTERFACE NOTES:
+get_inventory() returns the listing of one resource type in one account and region,
+calling the loader (the describe/list API) only when no usable copy is cached:
+
+- Within a collect_security_metrics() run (begin_inventory_run()) every inventory is
+  loaded at most once, however many checks read it; concurrent readers wait for the
+  first one's call instead of issuing their own.
+- Across runs, an inventory is reused while younger than its type's TTL
+  (DEFAULT_INVENTORY_TTLS, overridden per type by INVENTORY_TTLS, e.g.
+  "buckets=900,iam_users=0"). A TTL of 0 keeps the inventory to a single run.
+- A reused inventory from an earlier run can be checked by a cheap validator first
+  (for IAM users, the user count from GetAccountSummary) and is reloaded if it fails.
+- Config-change events invalidate the affected inventory (invalidate_inventory()).
+
+The cache lives in the warm Lambda container and evicts the least recently used
+inventories once they hold more than INVENTORY_CACHE_MAX_ITEMS resources. With
+INVENTORY_CACHE_PERSIST=true the long-lived types (PERSISTED_TYPES) are also saved
+with the state store (STATE_BUCKET, or STATE_DIR under /tmp) as "inventory_cache",
+so a cold container starts with them.
+
+Loaders return JSON-serialisable projections of the API items, and callers must not
+modify the returned lists or items.
+"""
+
+import contextvars
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.aws_helpers import handle_error
+from utils.state_store import load_state, save_state
+
+# Seconds an inventory is reused across runs (0: only within one run)
+DEFAULT_INVENTORY_TTLS = {
+    "instances": 0,
+    "unencrypted_volumes": 0,
+    "security_groups": 0,
+    "network_interfaces": 0,
+    "buckets": 3600,
+    "iam_users": 900,
+}
+PERSISTED_TYPES = ("buckets", "iam_users")
+DEFAULT_INVENTORY_CACHE_MAX_ITEMS = 200000
+INVENTORY_STATE_NAME = "inventory_cache"
+INVENTORY_CACHE_VERSION = 1
+
+# Run the current thread's inventory reads belong to, see begin_inventory_run()
+_current_run = contextvars.ContextVar('inventory_run', default=None)
+_run_ids = itertools.count(1)
+
+# (resource type, account, region) -> _Entry, least recently used first
+_entries = OrderedDict()
+_inflight = {}
+_lock = threading.Lock()
+_persisted_loaded = False
+_dirty = False
+_stats = {"hits": 0, "loads": 0, "revalidated": 0}
+
+
+class _Entry:
+    __slots__ = ("items", "fetched_at", "run")
+
+    def __init__(self, items: List[any], fetched_at: float, run: Optional[int]):
+        self.items = items
+        self.fetched_at = fetched_at
+        self.run = run
+
+
+def _ttls() -> Dict[str, float]:
+    ttls = dict(DEFAULT_INVENTORY_TTLS)
+    for item in os.environ.get("INVENTORY_TTLS", "").split(","):
+        name, _, seconds = item.partition("=")
+        if name.strip() and seconds.strip():
+            ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+def _persist_enabled() -> bool:
+    return os.environ.get("INVENTORY_CACHE_PERSIST", "false").lower() == "true"
+
+
+def begin_inventory_run() -> int:
+    """
+    Starts a new run in the current context: inventories loaded from now on are
+    shared by every read in this context (and its copies) without re-checking them.
+    """
+    run = next(_run_ids)
+    _current_run.set(run)
+    return run
+
+
+def _load_persisted():
+    """
+    Loads the persisted inventories once per container. Called with _lock held.
+    """
+    global _persisted_loaded
+    if _persisted_loaded:
+        return
+    _persisted_loaded = True
+    if not _persist_enabled():
+        return
+    state = load_state(INVENTORY_STATE_NAME)
+    if state.get("version") != INVENTORY_CACHE_VERSION:
+        return
+    for entry in state.get("entries", []):
+        key = (entry["type"], entry["account"], entry["region"])
+        if key not in _entries:
+            _entries[key] = _Entry(entry["items"], entry["fetched_at"], None)
+            _entries.move_to_end(key, last=False)
+
+
+def _evict(keep):
+    """
+    Drops least recently used inventories over INVENTORY_CACHE_MAX_ITEMS. Called with _lock held.
+    """
+    max_items = int(os.environ.get("INVENTORY_CACHE_MAX_ITEMS", DEFAULT_INVENTORY_CACHE_MAX_ITEMS))
+    total = sum(len(entry.items) for entry in _entries.values())
+    for key in list(_entries):
+        if total <= max_items:
+            break
+        if key != keep:
+            total -= len(_entries.pop(key).items)
+
+
+def _still_valid(validate, items: List[any], resource_type: str) -> bool:
+    try:
+        return bool(validate(items))
+    except Exception as e:
+        # A validator that can't run (e.g. a missing permission) just means reloading
+        handle_error(e, f"get_inventory({resource_type}) validation")
+        return False
+
+
+def get_inventory(resource_type: str, loader: Callable[[], List[any]], account_id: str = None,
+                  region: str = None, validate: Callable[[List[any]], bool] = None) -> List[any]:
+    """
+    Returns a resource inventory, loading it only if no usable copy is cached.
+
+    Args:
+        resource_type: Inventory type, e.g. 'instances' (see DEFAULT_INVENTORY_TTLS)
+        loader: Lists the resources (JSON-serialisable items)
+        account_id: Account of the inventory (None for the account the Lambda runs in)
+        region: Region of the inventory (None for global services)
+        validate: Called with an inventory from an earlier run before it is reused;
+                  returning False reloads it
+
+    Returns:
+        The inventory's items (shared, don't modify)
+    """
+    global _dirty
+    key = (resource_type, account_id or "", region or "")
+    ttl = _ttls().get(resource_type, 0)
+    run = _current_run.get()
+
+    while True:
+        with _lock:
+            _load_persisted()
+            entry = _entries.get(key)
+            if entry is not None and not (run is not None and entry.run == run) \
+                    and time.time() - entry.fetched_at >= ttl:
+                entry = None
+            if entry is not None and ((run is not None and entry.run == run) or validate is None):
+                _entries.move_to_end(key)
+                if run is not None:
+                    entry.run = run
+                _stats["hits"] += 1
+                return entry.items
+            future = _inflight.get(key)
+            owner = future is None
+            if owner:
+                future = _inflight[key] = Future()
+        if owner:
+            break
+        # Another thread is loading this inventory; use its result
+        future.result()
+
+    try:
+        if entry is not None and _still_valid(validate, entry.items, resource_type):
+            items, fetched_at, outcome = entry.items, entry.fetched_at, "revalidated"
+        else:
+            items, fetched_at, outcome = list(loader()), time.time(), "loads"
+    except Exception as e:
+        with _lock:
+            _inflight.pop(key, None)
+        future.set_exception(e)
+        raise
+
+    with _lock:
+        _stats[outcome] += 1
+        _entries[key] = _Entry(items, fetched_at, run)
+        _entries.move_to_end(key)
+        if resource_type in PERSISTED_TYPES and (entry is None or entry.items is not items):
+            _dirty = True
+        _evict(key)
+        _inflight.pop(key, None)
+    future.set_result(None)
+    return items
+
+
+def invalidate_inventory(resource_type: str, account_id: str = None, region: str = None):
+    """
+    Drops a cached inventory so the next read reloads it, e.g. after a config-change
+    event created or deleted a resource of that type. Without a region, the type's
+    inventories in every region of the account are dropped.
+    """
+    global _dirty
+    with _lock:
+        _load_persisted()
+        for key in list(_entries):
+            if key[0] == resource_type and key[1] == (account_id or "") and (region is None or key[2] == region):
+                del _entries[key]
+                _dirty = _dirty or resource_type in PERSISTED_TYPES
+    save_inventory()
+
+
+def save_inventory():
+    """
+    Persists the long-lived inventories if they changed and INVENTORY_CACHE_PERSIST=true.
+    """
+    global _dirty
+    if not _persist_enabled():
+        return
+    with _lock:
+        if not _dirty:
+            return
+        state = {
+            "version": INVENTORY_CACHE_VERSION,
+            "entries": [
+                {"type": key[0], "account": key[1], "region": key[2], "fetched_at": entry.fetched_at,
+                 "items": entry.items}
+                for key, entry in _entries.items() if key[0] in PERSISTED_TYPES
+            ],
+        }
+        try:
+            save_state(INVENTORY_STATE_NAME, state)
+            _dirty = False
+        except Exception as e:
+            handle_error(e, "save_inventory")
+
+
+def inventory_stats() -> Dict[str, int]:
+    """
+    Cache hits, loads (API listings) and revalidated inventories since the container started.
+    """
+    with _lock:
+        return dict(_stats)
+
+
+def clear_inventory_cache():
+    """
+    Drops every cached inventory (the persisted copy is kept).
+    """
+    global _persisted_loaded, _dirty
+    with _lock:
+        _entries.clear()
+        _persisted_loaded = False
+        _dirty = False
@@ -0,0 +1,403 @@
+"""
+Security Rules Engine
+Declarative threshold rules, compiled once and evaluated in one pass over the findings
+Owner: Nicole (Automation & Alert Engineer)
+
+INTERFACE NOTES:
+The rules live in a policy file: security_rules.json next to this module, or the file
+named by SECURITY_RULES_PATH (.yaml/.yml files need PyYAML). Each rule reads one value
+from the findings of collect_security_metrics() and compares it with a threshold:
+
+{
+    "id": "public_s3_buckets",               # findings category (metric Check, report key)
+    "check": "exposure",                     # SECURITY_CHECKS entry producing the value
+    "selector": "exposure.public_s3_buckets",
+    "operator": "gt", "threshold": 0,        # the defaults; lists compare by length
+    "severity": "high",                      # "info" rules are never violated, only measured
+    "metric": "PublicS3Buckets",
+    "regional": true,                        # also published per Region
+    "alert": {
+        "subject": "Security Alert: Public S3 Buckets Detected",
+        "message": "ALERT: {count} public S3 bucket(s) detected: {resources}"
+    }
+}
+
+Optional fields:
+- "enabled": false drops the rule; a check no enabled rule refers to is not run
+- "resources": selector of the affected resources when they are not the value itself
+- "resource": template naming a dict resource, e.g. "{SecurityGroupId}"
+- "region_field": region of a dict resource (otherwise looked up in resource_regions)
+- alert "detail" and "max_details": one line per resource, joined into {details}
+
+Alert templates can use {count} (affected resources), {value}, {resources}
+(comma-separated), {details} and the fields of the check's result dict; missing
+fields render as "Unknown".
+
+The policy is compiled once per container: selectors become key paths, operators
+functions and templates are validated, so a broken policy fails at cold start and
+evaluate_rules() does no parsing. Each rule only walks its own value, so evaluation
+is linear in the number of findings.
+"""
+
+import json
+import operator
+import os
+import string
+import sys
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.aws_helpers import logger
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "security_rules.json")
+
+OPERATORS = {
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "lt": operator.lt,
+    "le": operator.le,
+    "eq": operator.eq,
+    "ne": operator.ne,
+}
+
+SEVERITIES = ("info", "low", "medium", "high", "critical")
+
+# Compiled policies per path; compiled once per container
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+class _Fields(dict):
+    """
+    Template fields; placeholders without a value render as "Unknown".
+    """
+
+    def __missing__(self, key):
+        return "Unknown"
+
+
+def _select(data, path):
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+        if data is None:
+            return None
+    return data
+
+
+def _validate_template(template: Optional[str], rule_id: str) -> Optional[str]:
+    if template is None:
+        return None
+    try:
+        list(string.Formatter().parse(template))
+    except ValueError as e:
+        raise ValueError(f"Rule '{rule_id}': invalid template {template!r}: {e}")
+    return template
+
+
+class Rule:
+    """
+    One compiled rule of the policy (see module notes).
+    """
+
+    __slots__ = (
+        "id", "check", "path", "resources_path", "resource_template", "region_field",
+        "compare", "threshold", "severity", "metric", "regional",
+        "subject", "message", "detail", "max_details",
+    )
+
+    def __init__(self, spec: Dict[str, any]):
+        self.id = spec.get("id")
+        selector = spec.get("selector")
+        if not self.id or not selector:
+            raise ValueError(f"Rule {spec!r} needs an id and a selector")
+        self.path = tuple(selector.split("."))
+        self.check = spec.get("check") or self.path[0]
+        self.resources_path = tuple(spec["resources"].split(".")) if spec.get("resources") else None
+        self.resource_template = _validate_template(spec.get("resource"), self.id)
+        self.region_field = spec.get("region_field")
+
+        operator_name = spec.get("operator", "gt")
+        if operator_name not in OPERATORS:
+            raise ValueError(f"Rule '{self.id}': unknown operator '{operator_name}', expected one of {sorted(OPERATORS)}")
+        self.compare = OPERATORS[operator_name]
+        self.threshold = spec.get("threshold", 0)
+
+        self.severity = spec.get("severity", "medium")
+        if self.severity not in SEVERITIES:
+            raise ValueError(f"Rule '{self.id}': unknown severity '{self.severity}', expected one of {SEVERITIES}")
+        self.metric = spec.get("metric")
+        self.regional = bool(spec.get("regional", False))
+
+        alert = spec.get("alert") or {}
+        self.subject = alert.get("subject")
+        self.message = _validate_template(alert.get("message"), self.id)
+        self.detail = _validate_template(alert.get("detail"), self.id)
+        self.max_details = alert.get("max_details")
+        if bool(self.subject) != bool(self.message):
+            raise ValueError(f"Rule '{self.id}': an alert needs both a subject and a message")
+
+    def evaluate(self, findings: Dict[str, any]) -> Optional["RuleResult"]:
+        """
+        Returns the rule's result, or None if the findings don't contain its value.
+        """
+        value = _select(findings, self.path)
+        if value is None:
+            return None
+        if isinstance(value, (list, tuple)):
+            measured, resources = len(value), value
+        else:
+            measured = value
+            resources = (_select(findings, self.resources_path) or []) if self.resources_path else []
+        violated = self.severity != "info" and self.compare(measured, self.threshold)
+        return RuleResult(self, value, measured, resources, violated)
+
+    def resource_id(self, resource) -> str:
+        if self.resource_template and isinstance(resource, dict):
+            return self.resource_template.format_map(_Fields(resource))
+        return str(resource)
+
+
+class RuleResult:
+    """
+    Outcome of one rule for a findings dict.
+    """
+
+    __slots__ = ("rule", "value", "measured", "resources", "violated", "failed_accounts", "skipped")
+
+    def __init__(self, rule: Rule, value, measured, resources: List[any], violated: bool):
+        self.rule = rule
+        self.value = value
+        self.measured = measured
+        self.resources = resources
+        self.violated = violated
+        # Accounts whose check failed, and regions/resources it couldn't evaluate
+        # (see skipped_resources()); the value only covers the rest
+        self.failed_accounts = []
+        self.skipped = {}
+
+    @property
+    def partial(self) -> bool:
+        """
+        Whether the rule's check failed in some accounts or skipped some regions or
+        resources (see evaluate_rules()).
+        """
+        return bool(self.failed_accounts or self.skipped)
+
+    def partial_note(self) -> str:
+        """
+        What a partial result doesn't cover, e.g. for the alert message.
+        """
+        notes = []
+        if self.failed_accounts:
+            notes.append(f"the {self.rule.check} check failed in account(s) {', '.join(self.failed_accounts)}")
+        for kind, names in self.skipped.items():
+            notes.append(f"{kind} not evaluated: {', '.join(names)}")
+        return "Partial result: " + "; ".join(notes)
+
+    @property
+    def count(self) -> int:
+        """
+        Number of affected resources.
+        """
+        return len(self.resources)
+
+    @property
+    def metric_value(self) -> float:
+        return int(self.measured) if isinstance(self.measured, bool) else self.measured
+
+    @property
+    def findings_count(self) -> int:
+        """
+        Findings of the rule's category: the affected resources while it is violated.
+        """
+        return self.count if self.violated else 0
+
+    def resource_ids(self) -> List[str]:
+        return [self.rule.resource_id(resource) for resource in self.resources]
+
+    def region_counts(self, resource_regions: Dict[str, str]) -> Counter:
+        """
+        Affected resources per region; resources without a known region are skipped.
+        """
+        counts = Counter()
+        rule = self.rule
+        for resource in self.resources:
+            region = resource.get(rule.region_field) if rule.region_field and isinstance(resource, dict) else None
+            region = region or resource_regions.get(rule.resource_id(resource))
+            if region:
+                counts[region] += 1
+        return counts
+
+    def alert(self, findings: Dict[str, any]) -> Optional[Dict[str, any]]:
+        """
+        The alert for a violated rule ({subject, message, resources}), or None.
+        """
+        rule = self.rule
+        if not self.violated or not rule.message:
+            return None
+        resource_ids = self.resource_ids()
+        fields = _Fields(findings.get(rule.check) if isinstance(findings.get(rule.check), dict) else {})
+        fields.update(count=self.count, value=self.value, resources=", ".join(resource_ids))
+        if rule.detail:
+            shown = self.resources if rule.max_details is None else self.resources[:rule.max_details]
+            lines = [
+                rule.detail.format_map(_Fields(resource)) if isinstance(resource, dict)
+                else rule.detail.format_map(_Fields(resource=resource))
+                for resource in shown
+            ]
+            if len(self.resources) > len(shown):
+                lines.append(f"  ... and {len(self.resources) - len(shown)} more")
+            fields["details"] = "\n".join(lines)
+        message = rule.message.format_map(fields)
+        if self.partial:
+            message += f"\n({self.partial_note()})"
+        return {
+            "subject": rule.subject,
+            "message": message,
+            "resources": resource_ids,
+        }
+
+
+def _read_policy(path: str) -> Dict[str, any]:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            # Imported on demand: JSON policies don't need PyYAML in the package
+            import yaml
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+def compile_rules(policy: Dict[str, any]) -> List[Rule]:
+    """
+    Compiles a policy dict ({"rules": [...]}) into its enabled rules.
+
+    Raises:
+        ValueError: if a rule is invalid or two rules share an id
+    """
+    rules = []
+    seen = set()
+    for spec in policy.get("rules", []):
+        if not spec.get("enabled", True):
+            continue
+        rule = Rule(spec)
+        if rule.id in seen:
+            raise ValueError(f"Duplicate rule id '{rule.id}'")
+        seen.add(rule.id)
+        rules.append(rule)
+    return rules
+
+
+def get_rules(path: str = None) -> List[Rule]:
+    """
+    The enabled rules of the policy, compiled on first use.
+
+    Args:
+        path: Policy file (default: SECURITY_RULES_PATH env var or security_rules.json)
+    """
+    path = path or os.environ.get("SECURITY_RULES_PATH") or DEFAULT_RULES_PATH
+    rules = _compiled.get(path)
+    if rules is None:
+        with _compiled_lock:
+            rules = _compiled.get(path)
+            if rules is None:
+                rules = _compiled[path] = compile_rules(_read_policy(path))
+                logger.info(f"Compiled {len(rules)} security rule(s) from {path}")
+    return rules
+
+
+def get_rule(rule_id: str) -> Optional[Rule]:
+    """
+    The enabled rule with the given id, e.g. the rule of a findings category.
+    """
+    for rule in get_rules():
+        if rule.id == rule_id:
+            return rule
+    return None
+
+
+def enabled_checks() -> set:
+    """
+    Names of the checks the enabled rules read from.
+    """
+    return {rule.check for rule in get_rules()}
+
+
+def check_failures(findings: Dict[str, any]) -> Dict[str, List[str]]:
+    """
+    Accounts each check listed in the findings' check_errors failed in. Multi-account
+    findings key them "<account>:<check>"; a single-account failure has no accounts.
+    """
+    failures = {}
+    for name in findings.get("check_errors", {}):
+        account, _, check = name.rpartition(":")
+        failures.setdefault(check, [])
+        if account:
+            failures[check].append(account)
+    return {check: sorted(accounts) for check, accounts in failures.items()}
+
+
+def skipped_resources(findings: Dict[str, any]) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Regions and resources each check couldn't evaluate, from the findings' partial_errors:
+    check -> kind ("regions", "buckets") -> names. Multi-account findings key them
+    "<account>:<check>"; their names are prefixed with the account ("123456789012/eu-west-1").
+    """
+    skipped = {}
+    for name, partial in findings.get("partial_errors", {}).items():
+        account, _, check = name.rpartition(":")
+        for kind, errors in partial.items():
+            skipped.setdefault(check, {}).setdefault(kind, []).extend(
+                f"{account}/{item}" if account else item for item in errors
+            )
+    return {check: {kind: sorted(names) for kind, names in kinds.items()} for check, kinds in skipped.items()}
+
+
+def failed_checks(findings: Dict[str, any]) -> set:
+    """
+    Names of the checks without a result: failed in a single-account scan, or in every
+    account of a multi-account scan. A check that failed in only some accounts still
+    has the other accounts' results.
+    """
+    accounts = set(findings.get("accounts") or ())
+    return {
+        check for check, failed in check_failures(findings).items()
+        if not accounts or accounts <= set(failed)
+    }
+
+
+def evaluate_rules(findings: Dict[str, any], rules: List[Rule] = None) -> List[RuleResult]:
+    """
+    Evaluates the rules against a findings dict.
+
+    Rules of failed checks (see failed_checks()) are skipped: the empty result such a
+    check reports would otherwise read as all-clear. Where the check failed in only
+    some accounts, or couldn't evaluate some regions or resources, the rule is
+    evaluated on the rest and marked partial, with the failed accounts in
+    failed_accounts and the rest in skipped.
+
+    Args:
+        findings: Findings from collect_security_metrics() or collect_multi_account_metrics()
+        rules: Compiled rules (default: get_rules())
+
+    Returns:
+        One result per rule whose value is present in the findings and whose check
+        succeeded, in policy order
+    """
+    results = []
+    failures = check_failures(findings)
+    skipped = skipped_resources(findings)
+    failed = failed_checks(findings)
+    for rule in rules if rules is not None else get_rules():
+        if rule.check in failed:
+            continue
+        result = rule.evaluate(findings)
+        if result is not None:
+            result.failed_accounts = failures.get(rule.check, [])
+            result.skipped = skipped.get(rule.check, {})
+            results.append(result)
+    return results
@@ -0,0 +1,86 @@
+"""
+State Store
+Persists small pieces of state (alert fingerprints, scan snapshots) between Lambda runs
+Owner: Nicole (Automation & Alert Engineer)
+
+State is stored as gzip-compressed JSON, one object per name:
+- in S3 under state/<name>.json.gz when STATE_BUCKET is set
+- otherwise as <name>.json.gz in STATE_DIR (default /tmp/medtech-security-state),
+  which survives warm invocations of the same Lambda container and is useful locally
+"""
+
+import gzip
+import json
+import os
+import sys
+from typing import Dict
+
+# Add parent directories to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.aws_helpers import get_boto3_client, handle_error
+
+DEFAULT_STATE_DIR = "/tmp/medtech-security-state"
+
+
+def _state_key(name: str) -> str:
+    return f"state/{name}.json.gz"
+
+
+def _state_path(name: str) -> str:
+    return os.path.join(os.environ.get("STATE_DIR", DEFAULT_STATE_DIR), f"{name}.json.gz")
+
+
+def load_state(name: str) -> Dict[str, any]:
+    """
+    Loads a state object, returning {} if it doesn't exist yet or can't be read.
+
+    Args:
+        name: State object name (e.g., 'alert_fingerprints')
+    """
+    bucket = os.environ.get("STATE_BUCKET")
+    try:
+        if bucket:
+            s3 = get_boto3_client('s3', region=None)
+            try:
+                body = s3.get_object(Bucket=bucket, Key=_state_key(name))['Body'].read()
+            except s3.exceptions.NoSuchKey:
+                return {}
+        else:
+            path = _state_path(name)
+            if not os.path.exists(path):
+                return {}
+            with open(path, 'rb') as f:
+                body = f.read()
+        return json.loads(gzip.decompress(body))
+    except Exception as e:
+        # Losing state only costs a full rescan or a repeated alert, so don't fail the run
+        handle_error(e, f"load_state({name})")
+        return {}
+
+
+def save_state(name: str, state: Dict[str, any]):
+    """
+    Saves a state object, replacing the previous version.
+
+    Args:
+        name: State object name (e.g., 'alert_fingerprints')
+        state: JSON-serialisable dict
+    """
+    body = gzip.compress(json.dumps(state, separators=(',', ':')).encode('utf-8'))
+    bucket = os.environ.get("STATE_BUCKET")
+    if bucket:
+        get_boto3_client('s3', region=None).put_object(
+            Bucket=bucket,
+            Key=_state_key(name),
+            Body=body,
+            ContentType="application/json",
+            ContentEncoding="gzip"
+        )
+        return
+
+    path = _state_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(body)
+    os.replace(temp_path, path)
@@ -0,0 +1,42 @@
+"""
+Test Fixtures
+Runs the monitor's code against the local AWS stand-in from benchmarks/
+Owner: Alejandro (Infrastructure & Metrics Architect)
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from aws_standin import STANDIN_ENVIRONMENT, AwsStandIn
+
+# Before any boto3 session exists, so no real credentials are ever looked up
+os.environ.update(STANDIN_ENVIRONMENT)
+
+from metrics_collector.s3_exposure import clear_exposure_cache
+from utils.aws_helpers import logger
+from utils.inventory_cache import clear_inventory_cache
+
+logger.setLevel('WARNING')
+
+_standin = AwsStandIn().install()
+
+
+@pytest.fixture
+def standin(monkeypatch, tmp_path):
+    """
+    The stand-in with no handlers, fresh caches and state kept under tmp_path.
+    """
+    monkeypatch.setenv('STATE_DIR', str(tmp_path))
+    monkeypatch.delenv('STATE_BUCKET', raising=False)
+    _standin.handlers.clear()
+    _standin.reset_counts()
+    clear_inventory_cache()
+    clear_exposure_cache()
+    yield _standin
+    _standin.handlers.clear()
+    clear_inventory_cache()
+    clear_exposure_cache()
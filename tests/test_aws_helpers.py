@@ -0,0 +1,76 @@
+"""
+AWS helpers: the client registry and the token bucket rate limiter.
+"""
+
+import pytest
+
+from utils import aws_helpers
+from utils.aws_helpers import AdaptiveThrottle, TokenBucket, clear_client_cache, get_boto3_client
+
+
+def test_client_defaults_to_the_session_region(standin, monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'eu-west-1')
+    monkeypatch.setenv('AWS_REGION', 'eu-west-1')
+    clear_client_cache()
+    try:
+        assert get_boto3_client('sts').meta.region_name == 'eu-west-1'
+        assert get_boto3_client('sts', region='us-west-2').meta.region_name == 'us-west-2'
+    finally:
+        monkeypatch.undo()
+        clear_client_cache()
+
+
+def test_throttled_clients_leave_retries_to_the_throttle(standin):
+    retrying = get_boto3_client('s3')
+    single_attempt = get_boto3_client('s3', retries=False)
+    assert retrying is not single_attempt
+    assert retrying.meta.config.retries['mode'] == 'adaptive'
+    assert single_attempt.meta.config.retries == {'mode': 'standard', 'total_max_attempts': 1}
+
+
+def test_throttle_gives_up_after_max_retries(standin, monkeypatch):
+    monkeypatch.setattr(standin, 'throttle_rate', 1.0)
+    client = get_boto3_client('s3', retries=False)
+    with pytest.raises(Exception, match='Rate exceeded'):
+        AdaptiveThrottle(base_delay=0.001, max_retries=2).call(client.get_bucket_acl, Bucket='b')
+    assert standin.call_counts[('s3', 'GetBucketAcl')] == 3
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake monotonic clock that time.sleep() advances; returns the sleeps."""
+    now, sleeps = [0.0], []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(aws_helpers.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(aws_helpers.time, 'sleep', sleep)
+    return sleeps
+
+
+def test_fractional_rate_lets_one_call_through_per_interval(clock):
+    bucket = TokenBucket(0.5)
+    assert bucket.capacity == 1.0
+
+    bucket.acquire()
+    assert clock == []
+    bucket.acquire()
+    bucket.acquire()
+    assert sum(clock) == pytest.approx(4.0)
+
+
+def test_rate_allows_bursts_of_its_capacity(clock):
+    bucket = TokenBucket(4)
+    for _ in range(4):
+        bucket.acquire()
+    assert clock == []
+    bucket.acquire()
+    assert sum(clock) == pytest.approx(0.25)
+
+
+@pytest.mark.parametrize("rate, capacity", [(0, None), (-1, None), (2, 0.5)])
+def test_invalid_rate_or_capacity_is_rejected(rate, capacity):
+    with pytest.raises(ValueError):
+        TokenBucket(rate, capacity)
@@ -0,0 +1,116 @@
+"""
+Failed checks: no metrics, rules or all-clear report sections from their empty results.
+"""
+
+import pytest
+from synthetic_estate import SyntheticEstate
+
+from metrics_collector.findings import FindingRecords
+from metrics_collector.metrics_collector import collect_security_metrics
+from metrics_collector.multi_account import merge_account_findings
+from reporting.report_generator import generate_daily_report
+from utils.aws_helpers import security_metric_batch
+from utils.rules_engine import evaluate_rules, failed_checks
+
+
+@pytest.fixture
+def findings(standin, monkeypatch):
+    """A scan whose MFA check fails: the users can't be listed."""
+    monkeypatch.setenv('IAM_RATE_LIMIT', '100000')
+    SyntheticEstate(instances=100, volumes=100, security_groups=20, buckets=20, users=20).install(standin)
+    standin.on('ListUsers', lambda params: {'Error': {'Code': 'AccessDenied', 'Message': 'AccessDenied'}})
+    findings = collect_security_metrics(resumable=False)
+    assert set(findings["check_errors"]) == {"mfa_iam"}
+    return findings
+
+
+def metric_values(batch):
+    return {
+        (datum['MetricName'], tuple((d['Name'], d['Value']) for d in datum.get('Dimensions', []))): datum.get('Value')
+        for datum in batch.datums()
+    }
+
+
+def test_failed_check_rules_are_not_evaluated(findings):
+    rule_ids = {result.rule.id for result in evaluate_rules(findings)}
+    assert "mfa_iam" not in rule_ids and "total_iam_users" not in rule_ids
+    assert "encryption" in rule_ids
+
+
+def test_failed_check_publishes_check_errors_instead_of_metrics(findings):
+    values = metric_values(security_metric_batch(findings))
+    assert ('MFANonCompliantUsers', ()) not in values
+    assert ('TotalIAMUsers', ()) not in values
+    assert ('Findings', (('Check', 'mfa_iam'),)) not in values
+    assert ('UnencryptedEBSVolumes', ()) in values
+
+    assert values[('CheckErrors', ())] == 1
+    assert values[('CheckErrors', (('Check', 'mfa_iam'),))] == 1
+    assert values[('CheckErrors', (('Check', 'encryption'),))] == 0
+
+
+def test_failed_check_is_marked_in_the_daily_report(findings):
+    summary = generate_daily_report(findings)["summary"]
+    assert summary["iam"]["status"] == "check failed"
+    assert "AccessDenied" in summary["iam"]["error"]
+    assert summary["rules"]["mfa_iam"] == {"severity": "high", "status": "check failed"}
+    assert "status" not in summary["encryption"]
+    assert summary["rules"]["encryption"]["count"] > 0
+
+
+def account_findings(users, mfa_error=None):
+    return {
+        "mfa_iam": {"total_users": 0 if mfa_error else len(users), "non_compliant_users": [] if mfa_error else users},
+        "encryption": ["vol-1"],
+        "check_timings": {"mfa_iam": 1.0, "encryption": 1.0},
+        "check_errors": {"mfa_iam": mfa_error} if mfa_error else {},
+        "resource_regions": {},
+        "records": FindingRecords(),
+    }
+
+
+@pytest.fixture
+def partial():
+    """Two accounts whose MFA check failed in one of them."""
+    return merge_account_findings({
+        "111111111111": account_findings(["alice", "bob"]),
+        "222222222222": account_findings([], mfa_error="AccessDenied"),
+    })
+
+
+def test_check_failed_in_some_accounts_is_evaluated_on_the_others(partial):
+    results = {result.rule.id: result for result in evaluate_rules(partial)}
+    assert results["mfa_iam"].count == 2 and results["mfa_iam"].violated
+    assert results["mfa_iam"].failed_accounts == ["222222222222"]
+    assert results["total_iam_users"].measured == 2
+    assert not results["encryption"].partial
+
+    alert = results["mfa_iam"].alert(partial)
+    assert "111111111111/alice" in alert["message"]
+    assert "check failed in account(s) 222222222222" in alert["message"]
+
+
+def test_check_failed_in_some_accounts_publishes_the_others(partial):
+    values = metric_values(security_metric_batch(partial))
+    assert values[('MFANonCompliantUsers', ())] == 2
+    assert values[('MFANonCompliantUsers', (('AccountId', '111111111111'),))] == 2
+    assert ('MFANonCompliantUsers', (('AccountId', '222222222222'),)) not in values
+    assert values[('CheckErrors', (('AccountId', '222222222222'),))] == 1
+
+
+def test_check_failed_in_some_accounts_is_partial_in_the_daily_report(partial):
+    summary = generate_daily_report(partial)["summary"]
+    assert summary["iam"]["status"] == "partial"
+    assert summary["iam"]["failed_accounts"] == ["222222222222"]
+    assert summary["iam"]["non_compliant_users_count"] == 2
+    assert summary["rules"]["mfa_iam"]["status"] == "partial"
+    assert summary["rules"]["mfa_iam"]["count"] == 2
+
+
+def test_check_failed_in_every_account_is_not_evaluated():
+    merged = merge_account_findings({
+        account_id: account_findings([], mfa_error="AccessDenied") for account_id in ("111111111111", "222222222222")
+    })
+    assert failed_checks(merged) == {"mfa_iam"}
+    assert "mfa_iam" not in {result.rule.id for result in evaluate_rules(merged)}
+    assert generate_daily_report(merged)["summary"]["iam"]["status"] == "check failed"
@@ -0,0 +1,98 @@
+"""
+Scan checkpoints: a scan stopped at its deadline is saved and resumed to the same findings.
+"""
+
+import time
+
+import pytest
+from synthetic_estate import SyntheticEstate
+
+from metrics_collector.metrics_collector import _checkpoint_name, collect_security_metrics
+from metrics_collector.scan_state import finding_keys
+from utils.inventory_cache import clear_inventory_cache
+from utils.state_store import load_state
+
+USERS = 60
+
+
+@pytest.fixture
+def estate(standin, monkeypatch):
+    monkeypatch.setenv('IAM_RATE_LIMIT', '100000')
+    monkeypatch.setenv('IAM_MAX_CONCURRENCY', '1')
+    monkeypatch.setenv('S3_EXPOSURE_CACHE_SECONDS', '0')
+    SyntheticEstate(instances=200, volumes=200, security_groups=50, buckets=100, users=USERS,
+                    login_events=10).install(standin)
+    return standin
+
+
+def stall_mfa_probe(standin, call_number, deadline):
+    """Makes the call_number-th ListMFADevices call return only after the deadline."""
+    list_mfa_devices = standin.handlers['ListMFADevices']
+    calls = []
+
+    def stalled(params):
+        calls.append(params['UserName'])
+        if len(calls) == call_number:
+            time.sleep(max(0.0, deadline - time.monotonic()) + 0.05)
+        return list_mfa_devices(params)
+
+    standin.on('ListMFADevices', stalled)
+    return calls
+
+
+def saved_checkpoint():
+    return load_state(_checkpoint_name(None))
+
+
+def test_scan_resumes_from_its_checkpoint(estate):
+    full = collect_security_metrics(resumable=False)
+    assert not full["check_errors"]
+    clear_inventory_cache()
+    estate.reset_counts()
+
+    deadline = time.monotonic() + 1.0
+    probed = stall_mfa_probe(estate, 20, deadline)
+    first = collect_security_metrics(deadline=deadline)
+    assert first["pending_checks"] == ["mfa_iam"]
+    assert first["mfa_iam"] == {"total_users": 0, "non_compliant_users": []}
+    assert saved_checkpoint()["resumes"] == 1
+    assert len(saved_checkpoint()["probes"]["user"]) == 20
+    assert len(probed) == 20
+    volumes_listed = estate.call_counts[('ec2', 'DescribeVolumes')]
+
+    # The next invocation only probes the users the first one didn't get to
+    clear_inventory_cache()
+    resumed = collect_security_metrics()
+    assert "pending_checks" not in resumed
+    assert finding_keys(resumed) == finding_keys(full)
+    assert resumed["mfa_iam"]["total_users"] == USERS
+    assert len(resumed["records"]) == len(full["records"])
+    assert len(probed) == USERS
+    assert sorted(probed) == sorted(set(probed))
+    assert estate.call_counts[('ec2', 'DescribeVolumes')] == volumes_listed
+    assert not saved_checkpoint()
+
+
+def test_scan_completes_after_scan_max_resumes(estate, monkeypatch):
+    monkeypatch.setenv('SCAN_MAX_RESUMES', '2')
+    full = collect_security_metrics(resumable=False)
+
+    # Out of time before any check starts: everything stays pending...
+    for resumes in (1, 2):
+        clear_inventory_cache()
+        stopped = collect_security_metrics(deadline=time.monotonic() - 1)
+        assert sorted(stopped["pending_checks"]) == sorted(full["check_timings"])
+        assert saved_checkpoint()["resumes"] == resumes
+
+    # ... until the resumes run out and the deadline is ignored
+    clear_inventory_cache()
+    completed = collect_security_metrics(deadline=time.monotonic() - 1)
+    assert "pending_checks" not in completed
+    assert finding_keys(completed) == finding_keys(full)
+    assert not saved_checkpoint()
+
+
+def test_non_resumable_scan_ignores_the_deadline(estate):
+    findings = collect_security_metrics(deadline=time.monotonic() - 1, resumable=False)
+    assert "pending_checks" not in findings
+    assert not saved_checkpoint()
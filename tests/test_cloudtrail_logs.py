@@ -0,0 +1,31 @@
+"""
+CloudTrail log ingestion: worker processes read S3 log files with their own clients.
+"""
+
+import io
+import os
+
+from cloudtrail_ingest_benchmark import generate_corpus
+
+from metrics_collector.cloudtrail_logs import ingest_cloudtrail_logs
+from utils.aws_helpers import get_boto3_client
+
+
+def test_s3_ingestion_is_the_same_with_worker_processes(standin, tmp_path):
+    generate_corpus(str(tmp_path), files=12, records_per_file=200)
+    keys = sorted(
+        os.path.relpath(os.path.join(directory, name), tmp_path)
+        for directory, _, names in os.walk(tmp_path) for name in names if name.endswith('.json.gz')
+    )
+    standin.on('ListObjectsV2', lambda params: {'Contents': [{'Key': key} for key in keys], 'IsTruncated': False})
+    standin.on('GetObject', lambda params: {'Body': io.BytesIO((tmp_path / params['Key']).read_bytes())})
+
+    # The parent's cached S3 client exists before the pool forks
+    get_boto3_client('s3', region=None)
+    in_process = ingest_cloudtrail_logs("s3://trail-bucket/AWSLogs/", workers=1)
+    pooled = ingest_cloudtrail_logs("s3://trail-bucket/AWSLogs/", workers=2)
+
+    assert pooled["ingestion"]["failed_files"] == []
+    assert pooled["ingestion"]["records"] == in_process["ingestion"]["records"] == 12 * 200
+    assert pooled["login_attempts"] == in_process["login_attempts"]
+    assert pooled["suspicious_activity"] == in_process["suspicious_activity"]
@@ -0,0 +1,69 @@
+"""
+Config-change events: republished metrics don't overwrite totals across accounts.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from synthetic_estate import ACCOUNT_ID, SyntheticEstate
+
+from lambda_handler.event_handler import handle_config_change_event
+from metrics_collector.scan_state import SNAPSHOT_VERSION
+from utils.state_store import save_state
+
+OTHER_ACCOUNT_ID = "210987654321"
+EVENT_PATH = os.path.join(os.path.dirname(__file__), '..', 'demo', 'events', 'put_bucket_acl.json')
+
+
+@pytest.fixture
+def published(standin, monkeypatch):
+    """The MetricData of every PutMetricData call, for an estate with one public bucket."""
+    monkeypatch.delenv('SNS_TOPIC_ARN', raising=False)
+    monkeypatch.delenv('SCAN_ACCOUNTS', raising=False)
+    SyntheticEstate(instances=0, volumes=0, security_groups=0, buckets=0, users=0).install(standin)
+    standin.on('GetBucketAcl', lambda params: {'Grants': [{
+        'Grantee': {'Type': 'Group', 'URI': 'http://acs.amazonaws.com/groups/global/AllUsers'}, 'Permission': 'READ'}]})
+    standin.on('AssumeRole', lambda params: {'Credentials': {
+        'AccessKeyId': 'ASSUMED', 'SecretAccessKey': 'secret', 'SessionToken': 'token',
+        'Expiration': datetime.now(timezone.utc) + timedelta(hours=1)}})
+    metric_data = []
+    standin.on('PutMetricData', lambda params: metric_data.extend(params['MetricData']) or {})
+    return metric_data
+
+
+def bucket_acl_event(account_id):
+    """PutBucketAcl making a bucket public, in an account whose last scan found one other."""
+    snapshot_account = "self" if account_id == ACCOUNT_ID else account_id
+    save_state(f"scan_snapshot_{snapshot_account}", {
+        "version": SNAPSHOT_VERSION, "probes": {}, "findings": {"public_s3_buckets": ["other-bucket"]}})
+    with open(EVENT_PATH) as f:
+        event = json.load(f)
+    event["account"] = event["detail"]["userIdentity"]["accountId"] = account_id
+    return event
+
+
+def dimensions(metric_data):
+    return {datum['MetricName']: {d['Name']: d['Value'] for d in datum.get('Dimensions', [])} for datum in metric_data}
+
+
+def test_republished_value_counts_the_account(published):
+    handle_config_change_event(bucket_acl_event(ACCOUNT_ID))
+    assert [(datum['MetricName'], datum['Value']) for datum in published] == [('PublicS3Buckets', 2)]
+
+
+def test_own_account_event_publishes_the_totals(published):
+    handle_config_change_event(bucket_acl_event(ACCOUNT_ID))
+    assert dimensions(published) == {'PublicS3Buckets': {}}
+
+
+def test_other_account_event_publishes_per_account(published):
+    handle_config_change_event(bucket_acl_event(OTHER_ACCOUNT_ID))
+    assert dimensions(published) == {'PublicS3Buckets': {'AccountId': OTHER_ACCOUNT_ID}}
+
+
+def test_multi_account_deployment_publishes_per_account(published, monkeypatch):
+    monkeypatch.setenv('SCAN_ACCOUNTS', f"{ACCOUNT_ID},{OTHER_ACCOUNT_ID}")
+    handle_config_change_event(bucket_acl_event(ACCOUNT_ID))
+    assert dimensions(published) == {'PublicS3Buckets': {'AccountId': ACCOUNT_ID}}
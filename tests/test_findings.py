@@ -0,0 +1,82 @@
+"""
+Finding records: building them per run, leaving out failed checks and merging accounts.
+"""
+
+from metrics_collector.findings import FindingRecords, FindingsBuilder, merge_records
+from metrics_collector.multi_account import merge_account_findings
+
+SEVERITIES = {"encryption": "medium", "public_s3_buckets": "high", "security_groups": "high"}
+
+
+def account_records(account_id, volumes, buckets=()):
+    builder = FindingsBuilder(account_id, SEVERITIES)
+    builder.extend("encryption", "encryption", [("us-east-1", volume, "") for volume in volumes])
+    builder.extend("exposure", "public_s3_buckets", [("", bucket, "") for bucket in buckets])
+    return builder
+
+
+def rows(records):
+    return [(finding.account_id, finding.check, finding.resource_id, finding.severity) for finding in records]
+
+
+def test_findings_of_one_context_share_it():
+    records = account_records("111", ["vol-1", "vol-2", "vol-3"], ["bucket-1"]).records
+
+    assert len(records) == 4
+    assert len(records.contexts) == 2
+    assert records[3].key == "bucket-1" and records[3].region == ""
+    assert records[0].to_dict() == {
+        "account_id": "111", "region": "us-east-1", "check": "encryption", "category": "encryption",
+        "resource_id": "vol-1", "detail": "", "severity": "medium",
+    }
+
+
+def test_completed_leaves_out_failed_checks():
+    builder = account_records("111", ["vol-1"], ["bucket-1", "bucket-2"])
+
+    assert rows(builder.completed(["encryption"])) == [
+        ("111", "exposure", "bucket-1", "high"), ("111", "exposure", "bucket-2", "high")]
+    assert len(builder.completed()) == 3
+    # The copy doesn't change with the builder
+    completed = builder.completed()
+    builder.extend("encryption", "encryption", [("us-east-1", "vol-2", "")])
+    assert len(completed) == 3
+
+
+def test_merge_keeps_each_accounts_findings_in_order():
+    first = account_records("111", ["vol-1", "vol-2"], ["bucket-1"]).completed()
+    second = account_records("222", ["vol-1"]).completed()
+    merged = merge_records([first, second, FindingRecords()])
+
+    assert rows(merged) == [
+        ("111", "encryption", "vol-1", "medium"),
+        ("111", "encryption", "vol-2", "medium"),
+        ("111", "exposure", "bucket-1", "high"),
+        ("222", "encryption", "vol-1", "medium"),
+    ]
+    assert len(merged.contexts) == 3
+    assert len(merge_records([])) == 0
+
+
+def test_merge_deduplicates_contexts_across_runs():
+    # Same account (e.g. a resumed scan): the shared context is stored once
+    merged = merge_records([account_records("111", ["vol-1"]).completed(),
+                            account_records("111", ["vol-2"]).completed()])
+
+    assert [finding.resource_id for finding in merged] == ["vol-1", "vol-2"]
+    assert len(merged.contexts) == 1
+
+
+def test_multi_account_findings_carry_every_accounts_records():
+    def findings(account_id, volumes):
+        return {
+            "encryption": volumes,
+            "check_timings": {"encryption": 1.0},
+            "check_errors": {},
+            "resource_regions": {volume: "us-east-1" for volume in volumes},
+            "records": account_records(account_id, volumes).completed(),
+        }
+    merged = merge_account_findings({"111": findings("111", ["vol-1"]), "222": findings("222", ["vol-2", "vol-3"])})
+
+    assert [(finding.account_id, finding.resource_id) for finding in merged["records"]] == [
+        ("111", "vol-1"), ("222", "vol-2"), ("222", "vol-3")]
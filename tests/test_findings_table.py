@@ -0,0 +1,113 @@
+"""
+Findings table: rows from records and from category results, counts with and without
+NumPy, and the Parquet export.
+"""
+
+import io
+
+import pytest
+from rollup_benchmark import InMemoryBucket
+
+from metrics_collector.findings import FindingsBuilder
+from reporting import findings_table
+from reporting.findings_table import FindingsTable, export_parquet, findings_key, nested_counts
+
+ACCOUNT_ID = "111122223333"
+SEVERITIES = {"encryption": "medium", "public_s3_buckets": "high", "security_groups": "high"}
+
+
+def category_findings():
+    """Findings of one account as the checks return them, without records."""
+    return {
+        "encryption": ["vol-1", "vol-2"],
+        "exposure": {"public_ec2_IPs": [], "public_s3_buckets": ["bucket-1"]},
+        "security_groups": [
+            {"SecurityGroupId": "sg-1", "Protocol": "tcp", "FromPort": 22, "ToPort": 22},
+            {"SecurityGroupId": "sg-1", "Protocol": "tcp", "FromPort": 3389, "ToPort": 3389},
+        ],
+        "resource_regions": {"vol-1": "us-east-1", "vol-2": "eu-west-1", "sg-1": "us-east-1"},
+    }
+
+
+def record_findings():
+    """The same findings, as the run's Finding records."""
+    builder = FindingsBuilder(severities=SEVERITIES)
+    builder.extend("encryption", "encryption", [("us-east-1", "vol-1", ""), ("eu-west-1", "vol-2", "")])
+    builder.extend("exposure", "public_s3_buckets", [("", "bucket-1", "")])
+    builder.extend("security_groups", "security_groups",
+                   [("us-east-1", "sg-1", "tcp:22-22"), ("us-east-1", "sg-1", "tcp:3389-3389")])
+    return dict(category_findings(), records=builder.completed())
+
+
+EXPECTED_ROWS = {
+    (ACCOUNT_ID, "us-east-1", "encryption", "encryption", "vol-1", "", "medium"),
+    (ACCOUNT_ID, "eu-west-1", "encryption", "encryption", "vol-2", "", "medium"),
+    (ACCOUNT_ID, "", "exposure", "public_s3_buckets", "bucket-1", "", "high"),
+    (ACCOUNT_ID, "us-east-1", "security_groups", "security_groups", "sg-1", "tcp:22-22", "high"),
+    (ACCOUNT_ID, "us-east-1", "security_groups", "security_groups", "sg-1", "tcp:3389-3389", "high"),
+}
+
+
+@pytest.mark.parametrize("findings", [category_findings, record_findings])
+def test_rows_from_records_and_category_results_match(findings):
+    table = FindingsTable.from_findings(findings(), ACCOUNT_ID)
+    assert len(table) == 5
+    assert set(table.rows()) == EXPECTED_ROWS
+
+
+def test_multi_account_rows_carry_their_account():
+    table = FindingsTable.from_findings({"accounts": {"111": category_findings(), "222": record_findings()}})
+    assert table.counts("account_id") == {("111",): 5, ("222",): 5}
+    assert table.columns["account_id"].categories == ["111", "222"]
+
+
+@pytest.fixture(params=["numpy", "counter"])
+def aggregation(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(findings_table, "_numpy", lambda: None)
+    return request.param
+
+
+def test_counts_group_by_columns(aggregation):
+    table = FindingsTable.from_findings(category_findings(), ACCOUNT_ID)
+    assert table.counts("category", "region") == {
+        ("encryption", "us-east-1"): 1,
+        ("encryption", "eu-west-1"): 1,
+        ("public_s3_buckets", ""): 1,
+        ("security_groups", "us-east-1"): 2,
+    }
+    assert nested_counts(table.counts("category", "region"))["security_groups"] == {"us-east-1": 2}
+
+
+def test_counts_of_many_combinations(aggregation):
+    # 300 x 300 possible (resource, detail) pairs: more than the rows, so not a bincount
+    table = FindingsTable()
+    for index in range(300):
+        table.append(ACCOUNT_ID, "us-east-1", "security_groups", "security_groups",
+                     f"sg-{index}", f"tcp:{index}-{index}", "high")
+    table.append(ACCOUNT_ID, "us-east-1", "security_groups", "security_groups", "sg-0", "tcp:0-0", "high")
+
+    counts = table.counts("resource_id", "detail")
+    assert len(counts) == 300
+    assert counts[("sg-0", "tcp:0-0")] == 2
+    assert counts[("sg-299", "tcp:299-299")] == 1
+
+
+def test_counts_of_an_empty_table(aggregation):
+    assert FindingsTable().counts("category") == {}
+
+
+def test_export_parquet_writes_the_days_partition(standin):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    bucket = InMemoryBucket()
+    bucket.install(standin)
+    table = FindingsTable.from_findings(category_findings(), ACCOUNT_ID)
+
+    key = export_parquet(table, "reports", "2025-11-27")
+    assert key == findings_key("2025-11-27") == "findings/scan_date=2025-11-27/findings.parquet"
+
+    exported = parquet.read_table(io.BytesIO(bucket.objects[key]))
+    assert exported.column_names == list(findings_table.COLUMNS)
+    assert set(zip(*(exported.column(name).to_pylist() for name in findings_table.COLUMNS))) == EXPECTED_ROWS
@@ -0,0 +1,94 @@
+"""
+Inventory cache: regional inventories stay per account and are shared within a run.
+"""
+
+import contextvars
+
+import pytest
+
+from metrics_collector import metrics_collector
+from utils.inventory_cache import begin_inventory_run
+
+ACCOUNTS = {
+    "111111111111": {"AccessKeyId": "ACCOUNTA", "SecretAccessKey": "a", "SessionToken": "a"},
+    "222222222222": {"AccessKeyId": "ACCOUNTB", "SecretAccessKey": "b", "SessionToken": "b"},
+}
+REGIONS = ["us-east-1", "eu-west-1"]
+
+
+@pytest.fixture
+def estate(standin, monkeypatch):
+    """One public instance per account and region, named after both."""
+    monkeypatch.setenv('SCAN_REGIONS', ",".join(REGIONS))
+    standin.on('DescribeInstances', lambda params: {'Reservations': [{'Instances': [{
+        'InstanceId': f"i-{standin.current_access_key()}-{standin.current_region()}",
+        'PublicIpAddress': '203.0.113.10',
+    }]}]})
+    return standin
+
+
+def scan_account(account_id, scans=1):
+    """Scans an account's public instances `scans` times in one run, as its checks would."""
+    def run():
+        begin_inventory_run()
+        metrics_collector._scan_account.set(account_id)
+        metrics_collector._scan_credentials.set(ACCOUNTS[account_id])
+        return [metrics_collector.scan_regions(metrics_collector.iter_public_instances) for _ in range(scans)]
+    return contextvars.copy_context().run(run)
+
+
+def expected(account_id):
+    access_key = ACCOUNTS[account_id]["AccessKeyId"]
+    return [(region, f"i-{access_key}-{region}") for region in REGIONS]
+
+
+def test_accounts_do_not_share_regional_inventories(estate, monkeypatch):
+    monkeypatch.setenv('INVENTORY_TTLS', 'instances=600')
+
+    assert scan_account("111111111111") == [expected("111111111111")]
+    assert scan_account("222222222222") == [expected("222222222222")]
+    assert estate.call_counts[('ec2', 'DescribeInstances')] == 4
+
+    # Within the TTL, a later run of each account reuses its own inventories
+    assert scan_account("111111111111") == [expected("111111111111")]
+    assert scan_account("222222222222") == [expected("222222222222")]
+    assert estate.call_counts[('ec2', 'DescribeInstances')] == 4
+
+
+def test_regional_inventory_is_loaded_once_per_run(estate):
+    # TTL 0 (the default for instances): shared within the run only
+    assert scan_account("111111111111", scans=3) == [expected("111111111111")] * 3
+    assert estate.call_counts[('ec2', 'DescribeInstances')] == len(REGIONS)
+
+    scan_account("111111111111")
+    assert estate.call_counts[('ec2', 'DescribeInstances')] == 2 * len(REGIONS)
+
+
+def test_users_deleted_since_the_cached_list_are_skipped(standin, monkeypatch):
+    monkeypatch.setenv('IAM_RATE_LIMIT', '1000')
+    users = ["alice", "bob", "carol"]
+    standin.on('ListUsers', lambda params: {'Users': [
+        {'UserName': name, 'UserId': f"AIDA{name.upper()}", 'Path': '/', 'Arn': f"arn:aws:iam::111111111111:user/{name}",
+         'CreateDate': '2024-01-01T00:00:00Z'} for name in users]})
+    standin.on('GetAccountSummary', lambda params: {'SummaryMap': {'Users': len(users)}})
+    standin.on('ListMFADevices', lambda params: (
+        {'MFADevices': []} if params['UserName'] in users
+        else {'Error': {'Code': 'NoSuchEntity', 'Message': 'The user cannot be found.'}}))
+
+    def check():
+        def run():
+            begin_inventory_run()
+            metrics_collector._scan_account.set("111111111111")
+            return metrics_collector.check_mfa_iam("per_user")
+        return contextvars.copy_context().run(run)
+
+    assert check() == {"total_users": 3, "non_compliant_users": ["alice", "bob", "carol"]}
+
+    # bob is deleted and dave created: same count, so the cached list is reused
+    users[1] = "dave"
+    assert check() == {"total_users": 2, "non_compliant_users": ["alice", "carol"]}
+    assert standin.call_counts[('iam', 'ListUsers')] == 1
+
+    # ... and dropped, so the next run lists the users again
+    assert check() == {"total_users": 3, "non_compliant_users": ["alice", "dave", "carol"]}
+    assert standin.call_counts[('iam', 'ListUsers')] == 2
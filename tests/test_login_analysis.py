@@ -0,0 +1,31 @@
+"""
+Login analysis: failures over the tracked-key limit are counted once.
+"""
+
+from metrics_collector.login_analysis import LoginAnalyzer
+
+
+def failed_login(user, source_ip, minute):
+    return {
+        "eventName": "ConsoleLogin", "eventTime": f"2025-01-01T12:{minute:02d}:00Z",
+        "userIdentity": {"type": "IAMUser", "userName": user}, "sourceIPAddress": source_ip,
+        "responseElements": {"ConsoleLogin": "Failure"}, "errorMessage": "Failed authentication",
+    }
+
+
+def test_untracked_failures_count_each_failure_once():
+    analyzer = LoginAnalyzer(max_tracked_keys=2)
+    for minute, (user, source_ip) in enumerate([
+        ("alice", "198.51.100.1"),
+        ("bob", "198.51.100.2"),
+        ("carol", "198.51.100.3"),   # user and source IP both over the limit
+        ("dave", "198.51.100.1"),    # only the user
+        ("alice", "198.51.100.4"),   # only the source IP
+        ("bob", "198.51.100.1"),     # both tracked
+    ]):
+        analyzer.add(failed_login(user, source_ip, minute))
+
+    summary = analyzer.summary()
+    assert summary["failed_login_count"] == 6
+    assert summary["untracked_failures"] == 3
+    assert {entry["user"]: entry["failures"] for entry in summary["by_user"]} == {"alice": 2, "bob": 2}
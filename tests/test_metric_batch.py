@@ -0,0 +1,100 @@
+"""
+CloudWatch metrics: MetricBatch consolidation and PutMetricData chunking, and the
+dimensions published are the ones the dashboard queries.
+"""
+
+import json
+import os
+import re
+
+from synthetic_estate import SyntheticEstate
+
+from metrics_collector.metrics_collector import collect_security_metrics
+from utils.aws_helpers import (
+    MAX_METRIC_DATUMS_PER_REQUEST, MAX_METRIC_DISTINCT_VALUES, MAX_METRIC_REQUEST_BYTES, MetricBatch,
+    security_metric_batch,
+)
+
+DASHBOARD_TEMPLATE = os.path.join(os.path.dirname(__file__), '..', 'src', 'cloudformation', 'dashboard_setup.yaml')
+
+
+def test_findings_check_dimension_matches_the_dashboard(standin, monkeypatch):
+    monkeypatch.setenv('IAM_RATE_LIMIT', '100000')
+    SyntheticEstate(instances=100, volumes=100, security_groups=20, buckets=20, users=20).install(standin)
+    batch = security_metric_batch(collect_security_metrics(resumable=False))
+
+    with open(DASHBOARD_TEMPLATE) as f:
+        queried = set(re.findall(r'"MedTech/Security", "Findings", "Check", "([^"]+)"', f.read()))
+    published = {
+        dimension['Value']
+        for datum in batch.datums() if datum['MetricName'] == 'Findings'
+        for dimension in datum['Dimensions'] if dimension['Name'] == 'Check'
+    }
+    assert published == queried
+
+
+def request_bytes(request):
+    """The size estimate MetricBatch.requests() keeps each request under."""
+    return sum(2 * len(json.dumps(datum, default=str)) for datum in request)
+
+
+def test_repeated_datapoints_become_a_statistic_set():
+    batch = MetricBatch()
+    batch.add('PublicS3Buckets', 1)
+    for value in (0, 0, 3):
+        batch.add('Findings', value, {'Check': 'mfa_iam'})
+    datums = {datum['MetricName']: datum for datum in batch.datums()}
+
+    assert len(batch) == 4
+    assert datums['PublicS3Buckets']['Value'] == 1
+    assert 'Values' not in datums['PublicS3Buckets']
+    assert datums['Findings']['Values'] == [0, 3]
+    assert datums['Findings']['Counts'] == [2, 1]
+    assert datums['Findings']['Dimensions'] == [{'Name': 'Check', 'Value': 'mfa_iam'}]
+
+
+def test_distinct_values_are_split_across_datums():
+    batch = MetricBatch()
+    for value in range(MAX_METRIC_DISTINCT_VALUES + 1):
+        batch.add('Findings', value, {'Check': 'encryption'})
+    datums = batch.datums()
+
+    assert [len(datum['Values']) for datum in datums] == [MAX_METRIC_DISTINCT_VALUES, 1]
+    assert sorted(value for datum in datums for value in datum['Values']) == list(range(MAX_METRIC_DISTINCT_VALUES + 1))
+
+
+def test_requests_hold_at_most_the_datum_limit():
+    batch = MetricBatch()
+    for index in range(MAX_METRIC_DATUMS_PER_REQUEST + 1):
+        batch.add('Findings', 1, {'Check': f'check-{index}'})
+    requests = batch.requests()
+
+    assert [len(request) for request in requests] == [MAX_METRIC_DATUMS_PER_REQUEST, 1]
+
+
+def test_requests_stay_under_the_size_limit():
+    batch = MetricBatch()
+    for index in range(300):
+        for value in range(MAX_METRIC_DISTINCT_VALUES):
+            batch.add('Findings', value + 0.123456789, {'Check': f'check-{index}', 'AccountId': '123456789012'})
+    requests = batch.requests()
+
+    assert len(requests) > 1
+    assert all(request_bytes(request) <= MAX_METRIC_REQUEST_BYTES for request in requests)
+    assert sum(len(request) for request in requests) == len(batch.datums())
+
+
+def test_publish_sends_every_datum(standin):
+    sent = []
+    standin.on('PutMetricData', lambda params: sent.append(params['MetricData']) or {})
+    batch = MetricBatch()
+    for index in range(MAX_METRIC_DATUMS_PER_REQUEST + 10):
+        batch.add('Findings', index % 3, {'Check': f'check-{index}'})
+
+    assert batch.publish() == MAX_METRIC_DATUMS_PER_REQUEST + 10
+    assert sorted(len(metric_data) for metric_data in sent) == [10, MAX_METRIC_DATUMS_PER_REQUEST]
+
+
+def test_empty_batch_publishes_nothing(standin):
+    assert MetricBatch().publish() == 0
+    assert standin.total_calls() == 0
@@ -0,0 +1,61 @@
+"""
+Merging findings across accounts: each field is combined the way its meaning requires.
+"""
+
+from metrics_collector.findings import FindingRecords
+from metrics_collector.multi_account import merge_account_findings
+
+
+def account_findings(cloudtrail_enabled, failed_logins, users, changes):
+    return {
+        "mfa_iam": {"total_users": len(users), "non_compliant_users": users},
+        "encryption": ["vol-1"],
+        "cloudtrail": {"cloudtrail_enabled": cloudtrail_enabled, "active_trails": ["main"] if cloudtrail_enabled else [],
+                       "inactive_trails": [] if cloudtrail_enabled else ["main"], "total_trails": 1},
+        "login_attempts": {
+            "failed_login_count": failed_logins, "failed_logins": [{"user": "bob"}] * failed_logins,
+            "period_hours": 24, "untracked_failures": 1,
+            "brute_force_suspects": {"users": [], "source_ips": [], "threshold": 10, "window_minutes": 5.0},
+            "note": "Checking last 24 hours of CloudTrail events",
+        },
+        "changes": {"encryption": changes},
+        "check_timings": {"mfa_iam": 1.0},
+        "check_errors": {},
+        "resource_regions": {},
+        "records": FindingRecords(),
+    }
+
+
+def test_fields_merge_by_meaning():
+    merged = merge_account_findings({
+        "111111111111": account_findings(True, 2, ["alice"], {"added": ["vol-1"], "removed": [], "unchanged_count": 3}),
+        "222222222222": account_findings(False, 1, ["bob", "carol"],
+                                         {"added": [], "removed": ["vol-9"], "unchanged_count": 4}),
+    })
+
+    assert merged["mfa_iam"] == {
+        "total_users": 3, "non_compliant_users": ["111111111111/alice", "222222222222/bob", "222222222222/carol"]}
+    assert merged["encryption"] == ["vol-1", "vol-1"]
+
+    cloudtrail = merged["cloudtrail"]
+    assert cloudtrail["cloudtrail_enabled"] is False
+    assert cloudtrail["enabled_by_account"] == {"111111111111": True, "222222222222": False}
+    assert cloudtrail["total_trails"] == 2 and cloudtrail["inactive_trails"] == ["main"]
+
+    logins = merged["login_attempts"]
+    assert logins["failed_login_count"] == 3 and logins["untracked_failures"] == 2
+    assert logins["period_hours"] == 24
+    assert logins["brute_force_suspects"]["threshold"] == 10
+    assert logins["brute_force_suspects"]["window_minutes"] == 5.0
+    assert logins["note"] == "Checking last 24 hours of CloudTrail events"
+    assert [login["AccountId"] for login in logins["failed_logins"]] == ["111111111111"] * 2 + ["222222222222"]
+
+    assert merged["changes"] == {"encryption": {"added": ["vol-1"], "removed": ["vol-9"], "unchanged_count": 7}}
+
+
+def test_cloudtrail_enabled_in_every_account():
+    merged = merge_account_findings({
+        account_id: account_findings(True, 0, [], {"added": [], "removed": [], "unchanged_count": 0})
+        for account_id in ("111111111111", "222222222222")
+    })
+    assert merged["cloudtrail"]["cloudtrail_enabled"] is True
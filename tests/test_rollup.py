@@ -0,0 +1,174 @@
+"""
+Rollups of the stored daily reports, streamed and from the rollup cache.
+"""
+
+import json
+from datetime import date
+
+import pytest
+from rollup_benchmark import InMemoryBucket
+
+from reporting import rollup_cache
+from reporting.report_generator import daily_report_key, generate_daily_report
+from reporting.report_rollup import CHECK_FAILED, generate_rollup_report
+from reporting.rollup_cache import RollupCache
+
+BUCKET = "reports"
+
+
+def metrics(users, volumes, mfa_error=None):
+    return {
+        "mfa_iam": {"total_users": 0 if mfa_error else 10, "non_compliant_users": [] if mfa_error else users},
+        "encryption": volumes,
+        "exposure": {"public_ec2_IPs": [], "public_s3_buckets": []},
+        "security_groups": [],
+        "check_errors": {"mfa_iam": mfa_error} if mfa_error else {},
+    }
+
+
+def store(bucket, days):
+    """Stores the daily reports of {day: metrics}."""
+    for day, day_metrics in days.items():
+        bucket.put(daily_report_key(day), json.dumps(generate_daily_report(day_metrics)).encode("utf-8"))
+    return bucket
+
+
+@pytest.fixture(params=["stream", "cache"])
+def reports(request, standin, monkeypatch):
+    """Stores daily reports ({day: metrics}) in a bucket the rollups read, with or without the cache."""
+    monkeypatch.setenv('ROLLUP_CACHE', 'true' if request.param == "cache" else 'false')
+    monkeypatch.setattr(rollup_cache, '_warm_cache', None)
+    bucket = InMemoryBucket()
+    bucket.install(standin)
+    return lambda days: store(bucket, days)
+
+
+@pytest.fixture
+def cached(standin, monkeypatch):
+    """A bucket of daily reports read through the rollup cache, starting cold."""
+    monkeypatch.setenv('ROLLUP_CACHE', 'true')
+    monkeypatch.setattr(rollup_cache, '_warm_cache', None)
+    bucket = InMemoryBucket()
+    bucket.install(standin)
+    return bucket
+
+
+def test_failed_check_day_is_not_an_all_clear(reports):
+    reports({
+        "2025-11-25": metrics(["alice", "bob"], ["vol-1"]),
+        "2025-11-26": metrics([], ["vol-1"], mfa_error="AccessDenied"),
+    })
+    rollup = generate_rollup_report(BUCKET, end_date="2025-11-26", days=2)
+
+    assert rollup["daily_counts"]["2025-11-26"] == {
+        "encryption": 1, "public_ec2_IPs": 0, "public_s3_buckets": 0, "security_groups": 0}
+    assert rollup["failed_days"] == {"mfa_iam": ["2025-11-26"]}
+    alice = rollup["resources"]["mfa_iam"]["alice"]
+    assert alice["open"] is True and alice["days_seen"] == 1
+    assert rollup["resources"]["encryption"]["vol-1"]["days_seen"] == 2
+    assert rollup["summary"]["iam"]["total_users_last_observed"] == 10
+    assert rollup["summary"]["iam"]["unique_non_compliant_users_count"] == 2
+
+
+def test_finding_gone_after_a_failed_day_is_resolved(reports):
+    reports({
+        "2025-11-25": metrics(["alice", "bob"], []),
+        "2025-11-26": metrics([], [], mfa_error="AccessDenied"),
+        "2025-11-27": metrics(["alice"], []),
+    })
+    resources = generate_rollup_report(BUCKET, end_date="2025-11-27", days=3)["resources"]["mfa_iam"]
+    assert resources["alice"]["open"] is True and resources["alice"]["days_open"] == 3
+    assert resources["bob"]["open"] is False
+
+
+def test_cached_rollup_matches_the_streamed_one(cached, monkeypatch):
+    store(cached, {
+        "2025-11-25": metrics(["alice", "bob"], ["vol-1"]),
+        "2025-11-26": metrics(["bob"], ["vol-1", "vol-2"]),
+        "2025-11-27": metrics(["carol"], [], mfa_error="AccessDenied"),
+    })
+    from_cache = generate_rollup_report(BUCKET, end_date="2025-11-27", days=3)
+    monkeypatch.setenv('ROLLUP_CACHE', 'false')
+    streamed = generate_rollup_report(BUCKET, end_date="2025-11-27", days=3)
+
+    for field in ("summary", "daily_counts", "failed_days", "resources", "missing_days"):
+        assert from_cache[field] == streamed[field]
+
+
+def test_unchanged_reports_are_not_read_again(cached, standin, monkeypatch):
+    store(cached, {"2025-11-26": metrics(["alice"], []), "2025-11-27": metrics(["alice", "bob"], [])})
+    generate_rollup_report(BUCKET, end_date="2025-11-27", days=2)
+    assert standin.call_counts[('s3', 'GetObject')] == 2
+
+    standin.reset_counts()
+    generate_rollup_report(BUCKET, end_date="2025-11-27", days=2)
+    assert standin.call_counts[('s3', 'GetObject')] == 0
+    assert standin.call_counts[('s3', 'ListObjectsV2')] == 1
+
+    # A cold container validates the persisted cache the same way
+    monkeypatch.setattr(rollup_cache, '_warm_cache', None)
+    generate_rollup_report(BUCKET, end_date="2025-11-27", days=2)
+    assert standin.call_counts[('s3', 'GetObject')] == 0
+
+
+def test_rewritten_report_is_read_again(cached, standin):
+    store(cached, {"2025-11-26": metrics(["alice"], []), "2025-11-27": metrics(["alice"], [])})
+    generate_rollup_report(BUCKET, end_date="2025-11-27", days=2)
+
+    store(cached, {"2025-11-27": metrics(["alice", "bob"], [])})
+    standin.reset_counts()
+    rollup = generate_rollup_report(BUCKET, end_date="2025-11-27", days=2)
+
+    assert standin.call_counts[('s3', 'GetObject')] == 1
+    assert rollup["daily_counts"]["2025-11-27"]["mfa_iam"] == 2
+    assert rollup["resources"]["mfa_iam"]["bob"]["first_seen"] == "2025-11-27"
+
+
+def test_deleted_report_is_dropped_from_the_cache(cached):
+    store(cached, {"2025-11-26": metrics(["alice"], []), "2025-11-27": metrics(["bob"], [])})
+    generate_rollup_report(BUCKET, end_date="2025-11-27", days=2)
+
+    key = daily_report_key("2025-11-26")
+    del cached.objects[key], cached.etags[key]
+    rollup = generate_rollup_report(BUCKET, end_date="2025-11-27", days=2)
+
+    assert rollup["missing_days"] == ["2025-11-26"]
+    assert list(rollup["daily_counts"]) == ["2025-11-27"]
+    assert list(rollup["resources"]["mfa_iam"]) == ["bob"]
+    assert "2025-11-26" not in rollup_cache.load_rollup_cache().days
+
+
+def test_compact_evicts_old_days_and_renumbers_keys():
+    cache = RollupCache()
+    cache.set_day("2024-01-01", '"old"', {"encryption": ["vol-old-1", "vol-old-2", "vol-old-3"]}, 10)
+    cache.set_day("2025-11-27", '"new"', {"encryption": ["vol-1"], "mfa_iam": CHECK_FAILED}, 12)
+    cache.compact(retention_days=30, today=date(2025, 11, 27))
+
+    assert list(cache.days) == ["2025-11-27"]
+    assert cache.keys["encryption"] == ["vol-1"]
+    assert cache.days["2025-11-27"]["bitmaps"]["encryption"] == 1
+
+    # Persisted and reloaded, the compacted cache merges to the same rollup
+    reloaded = RollupCache(cache.to_dict())
+    assert reloaded.merge(["2025-11-27"]) == cache.merge(["2025-11-27"])
+    summary, daily_counts, resources, failed_days = reloaded.merge(["2025-11-27"])
+    assert list(resources["encryption"]) == ["vol-1"]
+    assert failed_days == {"mfa_iam": ["2025-11-27"]}
+    assert "mfa_iam" not in daily_counts["2025-11-27"]
+
+
+def test_compact_keeps_key_numbers_while_most_are_used():
+    cache = RollupCache()
+    cache.set_day("2024-01-01", None, {"encryption": ["vol-old"]})
+    cache.set_day("2025-11-27", None, {"encryption": ["vol-1", "vol-2"]})
+    cache.compact(retention_days=30, today=date(2025, 11, 27))
+
+    assert cache.keys["encryption"] == ["vol-old", "vol-1", "vol-2"]
+    assert cache.days["2025-11-27"]["bitmaps"]["encryption"] == 0b110
+
+
+def test_cache_of_an_older_version_is_discarded():
+    cache = RollupCache({"version": 1, "keys": {"encryption": ["vol-1"]},
+                         "days": {"2025-11-27": {"etag": '"x"', "bitmaps": {"encryption": "AQ=="}}}})
+    assert cache.days == {}
+    assert cache.keys["encryption"] == []
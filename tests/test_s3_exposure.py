@@ -0,0 +1,162 @@
+"""
+S3 exposure: every Block Public Access / ACL / policy status combination.
+"""
+
+import contextvars
+
+import pytest
+
+from metrics_collector import metrics_collector
+from metrics_collector.checkpoint import MISSING, ScanCheckpoint
+from metrics_collector.s3_exposure import NO_PUBLIC_ACCESS_BLOCK, bucket_exposure, probe_bucket_exposure
+from metrics_collector.scan_state import ScanSnapshot
+from utils.aws_helpers import AdaptiveThrottle, get_boto3_client
+
+PUBLIC_GRANT = {'Grantee': {'Type': 'Group', 'URI': 'http://acs.amazonaws.com/groups/global/AllUsers'},
+                'Permission': 'READ'}
+AUTHENTICATED_GRANT = {'Grantee': {'Type': 'Group', 'URI': 'http://acs.amazonaws.com/groups/global/AuthenticatedUsers'},
+                       'Permission': 'READ'}
+OWNER_GRANT = {'Grantee': {'Type': 'CanonicalUser', 'ID': 'owner'}, 'Permission': 'FULL_CONTROL'}
+
+
+def error(code):
+    return {'Error': {'Code': code, 'Message': code}}
+
+
+def block(*flags):
+    return dict(NO_PUBLIC_ACCESS_BLOCK, **{flag: True for flag in flags})
+
+
+@pytest.fixture
+def bucket(standin):
+    """
+    A bucket whose configuration the test sets: "block" (flags, or an error code),
+    "grants" and "policy" (True/False for the policy status, or an error code).
+    """
+    config = {"block": (), "grants": [OWNER_GRANT], "policy": 'NoSuchBucketPolicy'}
+
+    def public_access_block(params):
+        if isinstance(config["block"], str):
+            return error(config["block"])
+        return {'PublicAccessBlockConfiguration': block(*config["block"])}
+
+    def policy_status(params):
+        if isinstance(config["policy"], str):
+            return error(config["policy"])
+        return {'PolicyStatus': {'IsPublic': config["policy"]}}
+
+    standin.on('GetPublicAccessBlock', public_access_block)
+    standin.on('GetBucketAcl', lambda params: {'Grants': config["grants"]})
+    standin.on('GetBucketPolicyStatus', policy_status)
+    return config
+
+
+def probe(account_block=None):
+    return probe_bucket_exposure("bucket", get_boto3_client('s3'), AdaptiveThrottle(), account_block)
+
+
+def find_public_buckets(names, checkpoint, snapshot, partial_errors):
+    """Probes the buckets as the exposure check of a run would."""
+    def run():
+        metrics_collector._scan_account.set("111111111111")
+        metrics_collector._scan_checkpoint.set(checkpoint)
+        metrics_collector._scan_snapshot.set(snapshot)
+        metrics_collector._partial_errors.set(partial_errors)
+        metrics_collector._current_check.set("exposure")
+        return metrics_collector.find_public_buckets(names, account_block=block())
+    return contextvars.copy_context().run(run)
+
+
+def calls(standin):
+    return {operation: count for (_, operation), count in standin.call_counts.items()}
+
+
+@pytest.mark.parametrize("account_block, bucket_block, grants, policy, exposure, probed", [
+    # Nothing blocked: a public ACL wins before the policy is read
+    ((), (), [PUBLIC_GRANT], True, "acl", ['GetBucketAcl']),
+    ((), (), [AUTHENTICATED_GRANT], False, "acl", ['GetBucketAcl']),
+    ((), (), [OWNER_GRANT], True, "policy", ['GetBucketAcl', 'GetBucketPolicyStatus']),
+    ((), (), [OWNER_GRANT], False, None, ['GetBucketAcl', 'GetBucketPolicyStatus']),
+    ((), (), [OWNER_GRANT], 'NoSuchBucketPolicy', None, ['GetBucketAcl', 'GetBucketPolicyStatus']),
+    ((), 'NoSuchPublicAccessBlockConfiguration', [PUBLIC_GRANT], False, "acl", ['GetBucketAcl']),
+    # An unreadable bucket configuration blocks nothing
+    ((), 'AccessDenied', [OWNER_GRANT], True, "policy", ['GetBucketAcl', 'GetBucketPolicyStatus']),
+    # IgnorePublicAcls (account or bucket): the ACL is never read
+    (("IgnorePublicAcls",), (), [PUBLIC_GRANT], False, None, ['GetBucketPolicyStatus']),
+    (("IgnorePublicAcls",), (), [PUBLIC_GRANT], True, "policy", ['GetBucketPolicyStatus']),
+    ((), ("IgnorePublicAcls",), [PUBLIC_GRANT], False, None, ['GetBucketPolicyStatus']),
+    # RestrictPublicBuckets (account or bucket): the policy status is never read
+    (("RestrictPublicBuckets",), (), [PUBLIC_GRANT], True, "acl", ['GetBucketAcl']),
+    ((), ("RestrictPublicBuckets",), [OWNER_GRANT], True, None, ['GetBucketAcl']),
+    # Both, in any combination: private after the bucket's own settings
+    ((), ("IgnorePublicAcls", "RestrictPublicBuckets"), [PUBLIC_GRANT], True, None, []),
+    (("IgnorePublicAcls",), ("RestrictPublicBuckets",), [PUBLIC_GRANT], True, None, []),
+    (("IgnorePublicAcls", "RestrictPublicBuckets"), (), [PUBLIC_GRANT], True, None, []),
+    # BlockPublicAcls/BlockPublicPolicy only stop new public grants and policies
+    ((), ("BlockPublicAcls", "BlockPublicPolicy"), [PUBLIC_GRANT], True, "acl", ['GetBucketAcl']),
+])
+def test_exposure_combinations(standin, bucket, account_block, bucket_block, grants, policy, exposure, probed):
+    bucket.update(block=bucket_block, grants=grants, policy=policy)
+
+    assert probe(block(*account_block)) == exposure
+    assert calls(standin) == dict.fromkeys(['GetPublicAccessBlock'] + probed, 1)
+
+
+@pytest.mark.parametrize("operation", ['GetBucketAcl', 'GetBucketPolicyStatus'])
+def test_unreadable_acl_or_policy_status_raises(standin, bucket, operation):
+    standin.on(operation, lambda params: error('AccessDenied'))
+
+    with pytest.raises(Exception) as raised:
+        probe()
+    assert raised.value.response['Error']['Code'] == 'AccessDenied'
+
+
+def test_policy_status_error_is_not_cached(standin, bucket):
+    bucket.update(policy='AccessDenied')
+    s3_client = get_boto3_client('s3')
+    for _ in range(2):
+        with pytest.raises(Exception):
+            bucket_exposure("bucket", s3_client, AdaptiveThrottle(), account_id="111111111111")
+    assert standin.call_counts[('s3', 'GetBucketPolicyStatus')] == 2
+
+    bucket.update(policy=True)
+    assert bucket_exposure("bucket", s3_client, AdaptiveThrottle(), account_id="111111111111") == "policy"
+    assert bucket_exposure("bucket", s3_client, AdaptiveThrottle(), account_id="111111111111") == "policy"
+    assert standin.call_counts[('s3', 'GetBucketPolicyStatus')] == 3
+
+
+def test_unprobed_bucket_is_not_checkpointed_or_snapshotted(standin):
+    standin.on('GetBucketAcl', lambda params: {'Grants': [OWNER_GRANT]})
+    standin.on('GetBucketPolicyStatus', lambda params: (
+        error('AccessDenied') if params['Bucket'] == "denied" else {'PolicyStatus': {'IsPublic': True}}))
+    checkpoint, snapshot, partial_errors = ScanCheckpoint(), ScanSnapshot(), {}
+
+    assert find_public_buckets(["open", "denied"], checkpoint, snapshot, partial_errors) == ["open"]
+    assert checkpoint.probe_result('bucket', "open", '') is True
+    assert checkpoint.probe_result('bucket', "denied", '') is MISSING
+    assert set(snapshot.probes['bucket']) == {"open"}
+
+
+def test_unprobed_bucket_is_a_partial_error_not_private(standin):
+    standin.on('GetBucketAcl', lambda params: {'Grants': [OWNER_GRANT]})
+    standin.on('GetBucketPolicyStatus', lambda params: (
+        error('AccessDenied') if params['Bucket'] == "denied" else {'PolicyStatus': {'IsPublic': False}}))
+    previous = ScanSnapshot()
+    previous.diff({"exposure": {"public_ec2_IPs": [], "public_s3_buckets": ["denied"]}})
+    snapshot, partial_errors = ScanSnapshot(previous.to_dict()), {}
+
+    assert find_public_buckets(["private", "denied"], None, snapshot, partial_errors) == []
+    assert list(partial_errors["exposure"]["buckets"]) == ["denied"]
+    assert "AccessDenied" in partial_errors["exposure"]["buckets"]["denied"]
+
+    # The public finding from the previous scan isn't resolved by the failed probe
+    changes = snapshot.diff({"exposure": {"public_ec2_IPs": [], "public_s3_buckets": []}})
+    assert changes["public_s3_buckets"]["removed"] == []
+    assert changes["public_s3_buckets"]["unobserved_count"] == 1
+
+
+def test_every_probe_failing_fails_the_check(standin):
+    standin.on('GetBucketAcl', lambda params: error('AccessDenied'))
+    with pytest.raises(Exception) as raised:
+        find_public_buckets(["one", "two"], None, None, {})
+    assert raised.value.response['Error']['Code'] == 'AccessDenied'
@@ -0,0 +1,79 @@
+"""
+Multi-region scans: a region that fails is reported, not read as free of findings.
+"""
+
+import pytest
+from synthetic_estate import SyntheticEstate
+
+from metrics_collector.metrics_collector import collect_security_metrics
+from reporting.report_generator import generate_daily_report
+from utils.aws_helpers import security_metric_batch
+from utils.inventory_cache import clear_inventory_cache
+from utils.rules_engine import evaluate_rules
+
+REGIONS = ["us-east-1", "eu-west-1"]
+
+
+@pytest.fixture
+def estate(standin, monkeypatch):
+    monkeypatch.setenv('SCAN_REGIONS', ",".join(REGIONS))
+    monkeypatch.setenv('IAM_RATE_LIMIT', '100000')
+    SyntheticEstate(instances=100, volumes=100, security_groups=20, buckets=10, users=10,
+                    regions=REGIONS).install(standin)
+    return standin
+
+
+def fail_region(standin, operation, region):
+    """Makes the operation fail in one region."""
+    handler = standin.handlers[operation]
+    standin.on(operation, lambda params: (
+        {'Error': {'Code': 'UnauthorizedOperation', 'Message': 'Region disabled'}}
+        if standin.current_region() == region else handler(params)))
+
+
+def scan():
+    clear_inventory_cache()
+    return collect_security_metrics(resumable=False, incremental=True)
+
+
+def test_failed_region_is_a_partial_error(estate):
+    full = scan()
+    fail_region(estate, 'DescribeVolumes', "eu-west-1")
+    findings = scan()
+
+    assert findings["check_errors"] == {}
+    assert list(findings["partial_errors"]) == ["encryption"]
+    assert list(findings["partial_errors"]["encryption"]["regions"]) == ["eu-west-1"]
+    in_us_east = [volume for volume in full["encryption"] if full["resource_regions"][volume] == "us-east-1"]
+    assert 0 < len(in_us_east) < len(full["encryption"])
+    assert findings["encryption"] == in_us_east
+
+    # Its findings in the failed region are unobserved, not resolved
+    assert findings["changes"]["encryption"] == {
+        "added": [], "removed": [], "unchanged_count": len(in_us_east),
+        "unobserved_count": len(full["encryption"]) - len(in_us_east)}
+
+
+def test_failed_region_is_reported_everywhere(estate):
+    fail_region(estate, 'DescribeVolumes', "eu-west-1")
+    findings = scan()
+
+    result = next(result for result in evaluate_rules(findings) if result.rule.id == "encryption")
+    assert result.partial and result.skipped == {"regions": ["eu-west-1"]}
+    assert "regions not evaluated: eu-west-1" in result.alert(findings)["message"]
+
+    check_errors = {tuple(d['Value'] for d in datum.get('Dimensions', [])): datum['Value']
+                    for datum in security_metric_batch(findings).datums() if datum['MetricName'] == 'CheckErrors'}
+    assert check_errors[()] == 1 and check_errors[('encryption',)] == 1
+
+    section = generate_daily_report(findings)["summary"]["encryption"]
+    assert section["status"] == "partial" and section["skipped"] == {"regions": ["eu-west-1"]}
+    assert section["unencrypted_volumes_count"] == len(findings["encryption"]) > 0
+
+
+def test_every_region_failing_fails_the_check(estate):
+    for region in REGIONS:
+        fail_region(estate, 'DescribeVolumes', region)
+    findings = scan()
+    assert "encryption" in findings["check_errors"]
+    assert "encryption" not in findings["partial_errors"]
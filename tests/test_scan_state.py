@@ -0,0 +1,124 @@
+"""
+Scan snapshots: diffs only report changes for the resources a run evaluated.
+"""
+
+import contextvars
+
+from metrics_collector import metrics_collector
+from metrics_collector.scan_state import ScanSnapshot
+from utils.inventory_cache import begin_inventory_run
+
+
+def findings(volumes, users=(), resource_regions=None):
+    return {
+        "encryption": list(volumes),
+        "mfa_iam": {"total_users": len(users), "non_compliant_users": list(users)},
+        "resource_regions": resource_regions or {},
+    }
+
+
+def saved(snapshot):
+    """The snapshot the next run loads."""
+    return ScanSnapshot(snapshot.to_dict())
+
+
+def test_first_scan_reports_every_finding_as_added():
+    changes = ScanSnapshot().diff(findings(["vol-1", "vol-2"]))
+    assert changes["encryption"] == {"added": ["vol-1", "vol-2"], "removed": [], "unchanged_count": 0,
+                                     "unobserved_count": 0}
+
+
+def test_diff_against_the_previous_scan():
+    first = ScanSnapshot()
+    first.diff(findings(["vol-1", "vol-2"], ["alice"]))
+
+    changes = saved(first).diff(findings(["vol-2", "vol-3"], ["alice"]))
+    assert changes["encryption"] == {"added": ["vol-3"], "removed": ["vol-1"], "unchanged_count": 1,
+                                     "unobserved_count": 0}
+    assert changes["mfa_iam"]["unchanged_count"] == 1
+
+
+def test_failed_check_keeps_its_previous_findings():
+    first = ScanSnapshot()
+    first.diff(findings(["vol-1"], ["alice"]))
+
+    second = saved(first)
+    changes = second.diff(findings([], ["alice"]), failed_checks=["encryption"])
+    assert "encryption" not in changes
+    assert second.findings["encryption"] == ["vol-1"]
+
+    # The next successful scan diffs against the findings from before the failure
+    assert saved(second).diff(findings([]))["encryption"]["removed"] == ["vol-1"]
+
+
+def test_skipped_resource_is_carried_forward_not_removed():
+    first = ScanSnapshot()
+    first.diff(findings([], ["alice", "bob"]))
+
+    second = saved(first)
+    second.skip("mfa_iam", "bob")
+    changes = second.diff(findings([], ["carol"]))
+    assert changes["mfa_iam"] == {"added": ["carol"], "removed": ["alice"], "unchanged_count": 0,
+                                  "unobserved_count": 1}
+    assert sorted(second.findings["mfa_iam"]) == ["bob", "carol"]
+
+    # Evaluated again and compliant: now it is resolved
+    assert saved(second).diff(findings([], ["carol"]))["mfa_iam"]["removed"] == ["bob"]
+
+
+def test_skipped_region_is_carried_forward_not_removed():
+    regions = {"vol-1": "us-east-1", "vol-2": "eu-west-1", "vol-3": "eu-west-1"}
+    first = ScanSnapshot()
+    first.diff(findings(["vol-1", "vol-2", "vol-3"], resource_regions=regions))
+
+    # eu-west-1 fails: only the us-east-1 finding can be resolved
+    second = saved(first)
+    second.skip_region("encryption", "eu-west-1")
+    changes = second.diff(findings([], resource_regions={}))
+    assert changes["encryption"] == {"added": [], "removed": ["vol-1"], "unchanged_count": 0, "unobserved_count": 2}
+
+    # The carried-forward findings keep their region for the run after
+    third = saved(second)
+    third.skip_region("encryption", "eu-west-1")
+    assert third.diff(findings([]))["encryption"]["unobserved_count"] == 2
+    assert saved(third).diff(findings(["vol-3"], resource_regions=regions))["encryption"] == {
+        "added": [], "removed": ["vol-2"], "unchanged_count": 1, "unobserved_count": 0}
+
+
+def test_skipped_region_of_another_check_is_diffed():
+    first = ScanSnapshot()
+    first.diff(findings(["vol-1"], resource_regions={"vol-1": "eu-west-1"}))
+
+    second = saved(first)
+    second.skip_region("security_groups", "eu-west-1")
+    assert second.diff(findings([]))["encryption"]["removed"] == ["vol-1"]
+
+
+def test_user_deleted_mid_scan_is_not_reported_resolved(standin, monkeypatch):
+    monkeypatch.setenv('IAM_RATE_LIMIT', '1000')
+    users = ["alice", "bob"]
+    deleted = set()
+    standin.on('ListUsers', lambda params: {'Users': [
+        {'UserName': name, 'UserId': f"AIDA{name.upper()}", 'Path': '/', 'Arn': f"arn:aws:iam::111111111111:user/{name}",
+         'CreateDate': '2024-01-01T00:00:00Z'} for name in users]})
+    standin.on('GetAccountSummary', lambda params: {'SummaryMap': {'Users': len(users)}})
+    standin.on('ListMFADevices', lambda params: (
+        {'Error': {'Code': 'NoSuchEntity', 'Message': 'The user cannot be found.'}}
+        if params['UserName'] in deleted else {'MFADevices': []}))
+
+    def scan(snapshot):
+        def run():
+            begin_inventory_run()
+            metrics_collector._scan_account.set("111111111111")
+            metrics_collector._scan_snapshot.set(snapshot)
+            return metrics_collector.check_mfa_iam("per_user")
+        result = contextvars.copy_context().run(run)
+        return snapshot.diff({"mfa_iam": result})["mfa_iam"]
+
+    first = ScanSnapshot()
+    scan(first)
+
+    deleted.add("bob")
+    second = saved(first)
+    assert scan(second) == {"added": [], "removed": [], "unchanged_count": 1, "unobserved_count": 1}
+    assert second.probes["user"].keys() == {"alice"}
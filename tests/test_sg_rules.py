@@ -0,0 +1,28 @@
+"""
+Security group rules: the internet-facing prefix limits apply as soon as they change.
+"""
+
+from metrics_collector.sg_rules import is_internet_cidr
+
+
+def test_prefix_limit_changes_take_effect(monkeypatch):
+    monkeypatch.delenv('SG_MAX_OPEN_PREFIX_V4', raising=False)
+    assert is_internet_cidr("0.0.0.0/0")
+    assert not is_internet_cidr("203.0.113.0/24")
+    assert not is_internet_cidr("10.0.0.0/8")
+
+    monkeypatch.setenv('SG_MAX_OPEN_PREFIX_V4', '24')
+    assert is_internet_cidr("203.0.113.0/24")
+    assert not is_internet_cidr("10.0.0.0/8")
+
+    monkeypatch.setenv('SG_MAX_OPEN_PREFIX_V4', '0')
+    assert not is_internet_cidr("0.0.0.0/1")
+    assert is_internet_cidr("0.0.0.0/0")
+
+
+def test_ipv6_uses_its_own_limit(monkeypatch):
+    monkeypatch.setenv('SG_MAX_OPEN_PREFIX_V4', '32')
+    monkeypatch.setenv('SG_MAX_OPEN_PREFIX_V6', '16')
+    assert is_internet_cidr("::/0")
+    assert not is_internet_cidr("2001:db8::/32")
+    assert not is_internet_cidr("fc00::/7")